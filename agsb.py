@@ -15,9 +15,29 @@ import platform
 from datetime import datetime
 import uuid
 from pathlib import Path
-import urllib.request
+import urllib.parse
+import http.client
 import ssl
 import tempfile
+import queue
+import tarfile
+import threading
+import hashlib
+import fcntl
+import io
+import select
+import ctypes
+import signal
+import shlex
+import atexit
+import bisect
+import mmap
+import gzip
+from collections import Counter, deque
+import unicodedata
+import warnings
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # 全局变量
 INSTALL_DIR = Path.home() / ".agsb"  # 用户主目录下的隐藏文件夹，避免root权限
@@ -27,44 +47,589 @@ ARGO_PID_FILE = INSTALL_DIR / "sbargopid.log"
 LIST_FILE = INSTALL_DIR / "list.txt"
 LOG_FILE = INSTALL_DIR / "argo.log"
 DEBUG_LOG = INSTALL_DIR / "python_debug.log"
+SUPERVISOR_PID_FILE = INSTALL_DIR / "supervisor.pid"
+SUPERVISOR_STATE_FILE = INSTALL_DIR / "supervisor.json"  # 守护进程及子进程状态 (重启次数、启动时间)
+SUPERVISOR_LOG = INSTALL_DIR / "supervisor.log"
+CONTROL_SOCKET = INSTALL_DIR / "agsb.sock"  # 守护进程的控制接口 (UNIX socket，每行一个命令，返回一行JSON)
+
+# 并发下载状态
+DOWNLOAD_ABORT = threading.Event()  # 任一下载任务失败时置位，通知其他任务尽快退出
+PRINT_LOCK = threading.Lock()       # 多线程输出进度时避免行交错
+
+# 下载参数
+CONNECT_TIMEOUT = 10   # 建立连接超时(秒)
+READ_TIMEOUT = 30      # 单次读取超时(秒)
+DOWNLOAD_RETRIES = 5   # 中断后最多续传次数
+
+# GitHub 下载镜像(前缀形式)，可通过环境变量 AGSB_MIRRORS 以逗号分隔覆盖
+GITHUB_MIRRORS = [m.strip() for m in os.environ.get("AGSB_MIRRORS", "https://github.91chi.fun/").split(",") if m.strip()]
+MIRROR_TRUST_TTFB = 1.5  # 上次选中的镜像首字节时间在此范围内(秒)则直接使用，不再竞速
+MIRROR_LOCK = threading.Lock()
+
+# 守护进程参数
+RESTART_BACKOFF = (1, 60)  # 子进程退出后重启等待的初始/最大时间(秒)，连续崩溃时翻倍
+RESTART_STABLE = 60        # 子进程运行超过此时间(秒)视为稳定，重置重启等待
+RESTART_LIMIT = (5, 300)   # 300秒内最多重启5次，超过后不再重启该进程
+
+# 服务就绪检测
+TUNNEL_TIMEOUT = float(os.environ.get("AGSB_TUNNEL_TIMEOUT", "30"))  # 等待临时域名的总时限(秒)
+LOG_POLL_INTERVAL = 0.1  # 无 inotify 时轮询日志的间隔(秒)
+READY_TIMEOUT = 15  # 等待 sing-box 就绪的时限(秒)
+READY_BACKOFF = (0.005, 0.2)  # 就绪探测的初始/最大重试间隔(秒)，每次翻倍
+METRICS_WAIT = 3  # cloudflared 指标端口在此时间(秒)内无法连接则改为跟踪日志
+TUNNEL_DOMAIN_RE = re.compile(rb'https://([a-zA-Z0-9\-]+\.trycloudflare\.com)')
+
+# 日志轮转: 当前段写满后压缩为 xxx.1.gz，旧段依次后移，超出段数或磁盘预算的最旧段删除
+LOG_SEGMENT_BYTES = int(os.environ.get("AGSB_LOG_SEGMENT_KB", "1024")) * 1024  # 每段大小
+LOG_BUDGET_BYTES = int(os.environ.get("AGSB_LOG_BUDGET_MB", "8")) * 1024 * 1024  # 每个日志 (含压缩段) 占用的磁盘上限
+LOG_SEGMENTS = 5       # 每个日志最多保留的压缩段数
+LOG_TAIL_LINES = 200   # 守护进程在内存中保留的最近日志行数
+LOG_READ_BLOCK = 64 * 1024  # 从文件末尾向前读取日志的块大小
+SAMPLE_INTERVAL = float(os.environ.get("AGSB_SAMPLE_INTERVAL", "2"))  # 资源采样间隔(秒)
+SAMPLE_HISTORY = 300  # 每个组件在内存中保留的样本数 (默认间隔下为最近10分钟)
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+# sing-box 日志分析 (logs stats): 从上次处理到的位置继续，汇总写入 SB_STATS_FILE
+SB_STATS_FILE = INSTALL_DIR / "sb-stats.json"
+STATS_CHUNK_BYTES = 4 * 1024 * 1024  # 每次读取的块大小
+STATS_MINUTES = 1440                 # 保留最近24小时的每分钟计数
+STATS_DESTINATIONS = 1000            # 目标地址计数表的上限，超出后只保留计数最多的部分
+# +0800 2024-05-01 10:00:00 INFO [3839205829 0ms] inbound/vmess[vmess-in]: inbound connection to www.google.com:443
+# 正则均以字面量开头，由正则引擎快速定位，不逐行执行Python代码
+SB_TIME_RE = re.compile(rb'(?:[+-]\d{4} )?(\d{4}-\d\d-\d\d \d\d:\d\d):\d\d ')
+SB_CONNECTION = b": inbound connection to "
+SB_DESTINATION_RE = re.compile(rb': inbound connection to (\S+)')
+SB_ERROR_RE = re.compile(rb' (?:ERROR|WARN|FATAL) ([^\n]*)')
+ANSI_RE = re.compile(rb'\x1b\[[0-9;]*m')
+# 错误分类: 按顺序匹配，第一个命中的类别生效
+SB_ERROR_CLASSES = (
+    ("dial_timeout", re.compile(rb'i/o timeout|timed? ?out|deadline exceeded')),
+    ("dns", re.compile(rb'no such host|lookup |dns', re.I)),
+    ("eof", re.compile(rb'\bEOF\b')),
+    ("reset", re.compile(rb'connection reset')),
+    ("refused", re.compile(rb'connection refused')),
+)
+
+# 调试日志 (python_debug.log，JSON lines)
+LOG_LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+LOG_LEVEL = LOG_LEVELS.get(os.environ.get("AGSB_LOG_LEVEL", "debug").lower(), 10)  # 低于此级别的记录不写入
+LOG_FLUSH_INTERVAL = 1.0  # 后台线程写入间隔(秒)
+LOG_BUFFER_LINES = 256    # 缓冲的行数达到此值时立即写入
+
+# 安装阶段计时 (Chrome trace-event 格式，可在 chrome://tracing 或 Perfetto 中打开)
+PROFILE_EVENTS = []       # 仅在 PROFILE_ENABLED 时记录，避免守护进程等长期运行的进程无限累积
+PROFILE_ENABLED = False
+PROFILE_LOCK = threading.Lock()
+PROFILE_FILE = INSTALL_DIR / "install-trace.json"
+
+# 离线安装包
+HYSTERIA_VERSION = "v2.6.1"     # 与 nginx-hysteria2.py 使用的版本一致
+BUNDLE_ARCHES = ["amd64", "arm64"]  # bundle create 默认打包的架构
 
 # 网络请求函数
+# HTTP连接池: 按 (协议, 主机, 端口) 保留 keep-alive 空闲连接，所有请求共用一个SSL上下文
+SSL_CONTEXT = ssl.create_default_context()
+SSL_CONTEXT.check_hostname = False  # 忽略SSL证书验证
+SSL_CONTEXT.verify_mode = ssl.CERT_NONE
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+HTTP_POOL = {}
+HTTP_POOL_LOCK = threading.Lock()
+HTTP_POOL_SIZE = 4    # 每个主机最多保留的空闲连接数
+HTTP_RETRIES = 2      # 连接失败时的重试次数
+
+# 从连接池借出的连接: close() 时若响应已读完且服务器允许保持连接，则放回连接池
+class PooledConnection:
+    def __init__(self, key, conn, reused):
+        self.key = key
+        self.conn = conn
+        self.reused = reused
+        self.response = None
+    
+    def close(self):
+        if self.conn is None:
+            return
+        response = self.response
+        if response is not None and response.isclosed() and not response.will_close:
+            with HTTP_POOL_LOCK:
+                idle = HTTP_POOL.setdefault(self.key, [])
+                if len(idle) < HTTP_POOL_SIZE:
+                    idle.append(self.conn)
+                    self.conn = None
+                    return
+        self.conn.close()
+        self.conn = None
+
+# 借出一个连接: 优先复用空闲连接，否则新建连接
+def pool_connection(parts, timeout=None):
+    key = (parts.scheme, parts.hostname, parts.port)
+    conn = None
+    with HTTP_POOL_LOCK:
+        if HTTP_POOL.get(key):
+            conn = HTTP_POOL[key].pop()
+    reused = conn is not None
+    if not reused:
+        if parts.scheme == "https":
+            conn = http.client.HTTPSConnection(parts.hostname, parts.port, timeout=CONNECT_TIMEOUT, context=SSL_CONTEXT)
+        else:
+            conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=CONNECT_TIMEOUT)
+        conn.connect()
+    conn.sock.settimeout(timeout or READ_TIMEOUT)
+    return PooledConnection(key, conn, reused)
+
+# 发送请求并跟随重定向，返回 (连接, 响应)；读完响应后调用 连接.close() 归还连接池
+# 复用的空闲连接已被服务器关闭时直接换新连接重发，其他连接错误最多重试 retries 次
+def http_open(method, url, headers=None, body=None, max_redirects=5, retries=HTTP_RETRIES, timeout=None):
+    request_headers = {'User-Agent': USER_AGENT}
+    request_headers.update(headers or {})
+    for redirects in range(max_redirects + 1):
+        parts = urllib.parse.urlsplit(url)
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        attempt = 0
+        while True:
+            conn = None
+            try:
+                conn = pool_connection(parts, timeout)
+                conn.conn.request(method, path, body=body, headers=request_headers)
+                response = conn.conn.getresponse()
+                break
+            except (OSError, http.client.HTTPException):
+                if conn:
+                    conn.close()
+                    if conn.reused:
+                        continue
+                attempt += 1
+                if attempt > retries:
+                    raise
+                time.sleep(min(2 ** attempt, 10))
+        conn.response = response
+        if method == "HEAD":
+            response.read()
+        if response.status in (301, 302, 303, 307, 308) and redirects < max_redirects:
+            location = response.getheader("Location")
+            response.read()
+            conn.close()
+            if not location:
+                raise Exception(f"HTTP {response.status} 缺少跳转地址")
+            url = urllib.parse.urljoin(url, location)
+            if response.status == 303:
+                method, body = "GET", None
+            continue
+        return conn, response
+
+# 发送请求并读取完整响应，返回 (状态码, 响应头, 响应体)
+def http_request(method, url, headers=None, body=None, max_redirects=5, retries=HTTP_RETRIES, timeout=None):
+    conn, response = http_open(method, url, headers, body, max_redirects, retries, timeout)
+    try:
+        return response.status, response.headers, response.read()
+    finally:
+        conn.close()
+
 def http_get(url, timeout=10):
     try:
-        # 创建一个上下文来忽略SSL证书验证
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        
-        req = urllib.request.Request(url, headers=headers)
-        with urllib.request.urlopen(req, context=ctx, timeout=timeout) as response:
-            return response.read().decode('utf-8')
+        status, _, data = http_request("GET", url, timeout=timeout)
+        if status != 200:
+            raise Exception(f"HTTP {status}")
+        return data.decode('utf-8')
     except Exception as e:
         print(f"HTTP请求失败: {url}, 错误: {e}")
         return None
 
-def download_file(url, target_path, mode='wb'):
+# 可续传下载: 先写入 .part 文件，中断后用 Range 从断点续传，指数退避重试
+def download_file(url, target_path, label=None):
+    part_path = f"{target_path}.part"
+    meta_path = f"{part_path}.json"  # 记录 .part 对应的URL和校验标识(ETag/Last-Modified)
+    
     try:
-        # 创建一个上下文来忽略SSL证书验证
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        meta = {}
+    
+    attempt = 0
+    session_bytes = 0
+    ttfb = None
+    start_time = time.time()
+    while True:
+        attempt_start = time.time()
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        validator = meta.get("etag") or meta.get("last_modified")
+        # 只有确认是同一个文件时才续传，否则从头下载
+        if offset and meta.get("url") != url and not validator:
+            offset = 0
+        request_headers = {}
+        if offset:
+            request_headers['Range'] = f"bytes={offset}-"
+            if validator:
+                request_headers['If-Range'] = validator
         
-        req = urllib.request.Request(url, headers=headers)
-        with urllib.request.urlopen(req, context=ctx) as response, open(target_path, mode) as out_file:
-            shutil.copyfileobj(response, out_file)
+        conn = None
+        try:
+            # 续传由本函数按退避策略重试，连接层不再重试
+            conn, response = http_open("GET", url, request_headers, retries=0)
+            if response.status == 416 and offset:
+                # .part 已经是完整文件
+                total = int((response.getheader('Content-Range') or '*/0').rsplit('/', 1)[-1] or 0)
+                if total == offset:
+                    break
+                os.remove(part_path)
+                raise Exception("续传位置无效，重新下载")
+            if response.status == 200:
+                offset = 0  # 服务器不支持续传或文件已变化
+            elif response.status != 206:
+                raise Exception(f"HTTP {response.status} {response.reason}")
+            
+            meta = {
+                "url": url,
+                "etag": response.getheader('ETag'),
+                "last_modified": response.getheader('Last-Modified'),
+            }
+            with open(meta_path, 'w') as f:
+                json.dump(meta, f)
+            
+            length = int(response.getheader('Content-Length') or 0)
+            total = offset + length if length else 0
+            done = offset
+            reported = done
+            last_report = time.time()
+            with open(part_path, 'ab' if offset else 'wb') as out_file:
+                while True:
+                    # 其他下载任务失败时立即中止
+                    if DOWNLOAD_ABORT.is_set():
+                        raise RuntimeError("下载已取消")
+                    chunk = response.read(64 * 1024)
+                    if not chunk:
+                        break
+                    if ttfb is None:
+                        ttfb = time.time() - attempt_start
+                    out_file.write(chunk)
+                    done += len(chunk)
+                    session_bytes += len(chunk)
+                    if label and time.time() - last_report >= 1:
+                        report_progress(label, done, total, session_bytes / (time.time() - start_time))
+                        reported = done
+                        last_report = time.time()
+            if total and done < total:
+                raise Exception(f"连接提前关闭 ({done}/{total} 字节)")
+            if label and reported != done:
+                report_progress(label, done, total, session_bytes / max(time.time() - start_time, 0.001))
+            break
+        except Exception as e:
+            if DOWNLOAD_ABORT.is_set():
+                print(f"下载文件失败: {url}, 错误: {e}")
+                return False
+            attempt += 1
+            if attempt > DOWNLOAD_RETRIES:
+                print(f"下载文件失败: {url}, 错误: {e}")
+                get_logger("download").error(f"下载失败 (已重试 {DOWNLOAD_RETRIES} 次): {url}", url=url, error=str(e))
+                record_download(url, session_bytes, ttfb, time.time() - start_time, ok=False, label=label)
+                return False
+            delay = min(2 ** attempt, 30)
+            resume_at = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            print(f"下载中断: {e}，{delay}秒后从 {resume_at} 字节处续传 (重试 {attempt}/{DOWNLOAD_RETRIES})")
+            time.sleep(delay)
+        finally:
+            if conn:
+                conn.close()
+    
+    os.replace(part_path, str(target_path))
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    elapsed = max(time.time() - start_time, 0.001)
+    get_logger("download").info(f"下载完成: {url}", url=url, bytes=session_bytes, seconds=round(elapsed, 3))
+    record_download(url, session_bytes, ttfb, elapsed, ok=True, label=label)
+    return True
+
+# 记录一次下载 (地址、下载源、字节数、首字节时间、耗时、吞吐量) 到下载历史
+def record_download(url, size, ttfb, duration, ok, label=None):
+    entry = {
+        "time": int(time.time()),
+        "label": label,
+        "url": url,
+        "source": urllib.parse.urlsplit(url).hostname,
+        "bytes": size,
+        "ttfb": round(ttfb, 3) if ttfb is not None else None,
+        "duration": round(duration, 3),
+        "speed": int(size / max(duration, 0.001)),
+        "ok": ok,
+    }
+    try:
+        with HISTORY_LOCK:
+            HISTORY_FILE.parent.mkdir(parents=True, exist_ok=True)
+            with open(str(HISTORY_FILE), 'a') as f:
+                f.write(json.dumps(entry) + "\n")
+            # 超出上限一倍时只保留最近的记录
+            with open(str(HISTORY_FILE), 'r') as f:
+                lines = f.readlines()
+            if len(lines) > HISTORY_MAX * 2:
+                tmp_file = f"{HISTORY_FILE}.{os.getpid()}.tmp"
+                with open(tmp_file, 'w') as f:
+                    f.writelines(lines[-HISTORY_MAX:])
+                os.replace(tmp_file, str(HISTORY_FILE))
+    except OSError as e:
+        get_logger("download").warning("写入下载历史失败", error=str(e))
+
+# 读取下载历史，按时间顺序返回
+def load_download_history():
+    history = []
+    try:
+        with open(str(HISTORY_FILE), 'r') as f:
+            for line in f:
+                try:
+                    history.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return history
+
+# 按下载历史给各下载源打分: 最近几次成功下载的吞吐量中位数，最近连续失败的下载源记为0
+def source_scores(history):
+    by_source = {}
+    for entry in history:
+        by_source.setdefault(entry["source"], []).append(entry)
+    scores = {}
+    for source, entries in by_source.items():
+        recent = entries[-HISTORY_RECENT:]
+        if not any(e["ok"] for e in recent[-3:]):
+            scores[source] = 0
+            continue
+        speeds = sorted(e["speed"] for e in recent if e["ok"] and e["bytes"] >= HISTORY_MIN_BYTES)
+        if speeds:
+            scores[source] = speeds[len(speeds) // 2]
+    return scores
+
+# 生成候选下载地址: 原始地址 + 各镜像地址 (仅GitHub地址有镜像)
+def mirror_candidates(url):
+    if urllib.parse.urlsplit(url).hostname != "github.com":
+        return [url]
+    return [url] + [prefix + url for prefix in GITHUB_MIRRORS]
+
+# 读取JSON状态文件，不存在或损坏时返回空字典
+def read_json(path):
+    try:
+        with open(str(path), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+# 原子写入JSON状态文件
+def write_json(path, data):
+    try:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_file, str(path))
+    except OSError as e:
+        get_logger("state").warning(f"写入 {path} 失败", path=str(path), error=str(e))
+
+# 读取/保存各域名上次选中的镜像
+def load_mirror_state():
+    return read_json(MIRROR_STATE_FILE)
+
+def remember_mirror(host, prefix):
+    with MIRROR_LOCK:
+        state = load_mirror_state()
+        if state.get(host) != prefix:
+            state[host] = prefix
+            write_json(MIRROR_STATE_FILE, state)
+
+# 获取GitHub最新发布信息: 缓存未过期时直接使用，过期后用 ETag/Last-Modified 做条件请求
+# (304响应不消耗API配额)，API不可用时使用过期的缓存
+def github_latest_release(repo):
+    with RELEASE_LOCK:
+        entry = read_json(RELEASE_CACHE_FILE).get(repo)
+    now = time.time()
+    if entry and now - entry["checked"] < RELEASE_TTL:
+        return entry["release"]
+    
+    headers = {'Accept': 'application/vnd.github+json'}
+    if entry and entry.get("etag"):
+        headers['If-None-Match'] = entry["etag"]
+    if entry and entry.get("last_modified"):
+        headers['If-Modified-Since'] = entry["last_modified"]
+    
+    try:
+        conn, response = http_open("GET", f"https://api.github.com/repos/{repo}/releases/latest", headers)
+        try:
+            if response.status == 304 and entry:
+                get_logger("release").debug(f"{repo} 发布信息未变化 (304)", repo=repo)
+            elif response.status == 200:
+                data = json.loads(response.read().decode('utf-8'))
+                entry = {
+                    "release": {
+                        "tag_name": data.get("tag_name"),
+                        "published_at": data.get("published_at"),
+                        "assets": [{"name": a.get("name"), "size": a.get("size"), "url": a.get("browser_download_url")} for a in data.get("assets", [])],
+                    },
+                    "etag": response.getheader('ETag'),
+                    "last_modified": response.getheader('Last-Modified'),
+                }
+            else:
+                raise Exception(f"HTTP {response.status} {response.reason}")
+        finally:
+            conn.close()
+    except Exception as e:
+        if entry:
+            print(f"GitHub API 不可用，使用 {(now - entry['checked']) / 60:.0f} 分钟前缓存的 {repo} 发布信息: {e}")
+            return entry["release"]
+        print(f"获取 {repo} 发布信息失败: {e}")
+        return None
+    
+    entry["checked"] = now
+    with RELEASE_LOCK:
+        cache = read_json(RELEASE_CACHE_FILE)
+        cache[repo] = entry
+        write_json(RELEASE_CACHE_FILE, cache)
+    return entry["release"]
+
+# 探测地址的首字节时间(TTFB)，只请求第一个字节
+def probe_url(url):
+    start_time = time.time()
+    conn, response = http_open("GET", url, {'Range': 'bytes=0-0'}, retries=0)
+    try:
+        if response.status not in (200, 206):
+            raise Exception(f"HTTP {response.status} {response.reason}")
+        response.read(1)
+        return time.time() - start_time
+    finally:
+        conn.close()
+
+# 并行探测所有候选地址，返回最先响应成功的 (地址, 首字节时间)；
+# 探测线程为守护线程，选出结果后不再等待其余较慢的地址
+def race_urls(urls):
+    results = queue.Queue()
+    
+    def probe(url):
+        try:
+            results.put((url, probe_url(url)))
+        except Exception as e:
+            get_logger("mirror").debug(f"镜像探测失败: {url}", url=url, error=str(e))
+            results.put((url, None))
+    
+    for url in urls:
+        threading.Thread(target=probe, args=(url,), daemon=True).start()
+    deadline = time.time() + CONNECT_TIMEOUT + READ_TIMEOUT
+    for _ in urls:
+        try:
+            url, ttfb = results.get(timeout=max(deadline - time.time(), 0.1))
+        except queue.Empty:
+            break
+        if ttfb is not None:
+            return url, ttfb
+    return None, None
+
+# 对原始地址和镜像排序: 最快的下载源在前，其余作为备用
+def rank_sources(url, label=None):
+    host = urllib.parse.urlsplit(url).hostname
+    candidates = mirror_candidates(url)
+    if len(candidates) == 1:
+        return candidates
+    
+    # 按历史吞吐量排序，没有历史记录的下载源排在有成功记录的之后
+    scores = source_scores(load_download_history())
+    candidates.sort(key=lambda c: -scores.get(urllib.parse.urlsplit(c).hostname, 0))
+    
+    winner, ttfb = None, None
+    # 历史上最快的下载源(没有历史时用上次选中的镜像)仍然够快就直接使用
+    if scores and max(scores.values()) > 0:
+        preferred_url = candidates[0]
+    else:
+        preferred = load_mirror_state().get(host)
+        preferred_url = preferred + url if preferred is not None else None
+    if preferred_url in candidates:
+        try:
+            ttfb = probe_url(preferred_url)
+            if ttfb <= MIRROR_TRUST_TTFB:
+                winner = preferred_url
+        except Exception as e:
+            get_logger("mirror").warning("优先下载源不可用", host=urllib.parse.urlsplit(preferred_url).hostname, error=str(e))
+    if not winner:
+        winner, ttfb = race_urls(candidates)
+    if not winner:
+        return candidates
+    print(f"[{label or host}] 选用下载源: {urllib.parse.urlsplit(winner).hostname} (首字节 {ttfb * 1000:.0f}ms)")
+    return [winner] + [c for c in candidates if c != winner]
+
+# 记住成功的下载源，供下次优先使用
+def remember_source(url, source):
+    if len(mirror_candidates(url)) > 1:
+        remember_mirror(urllib.parse.urlsplit(url).hostname, source[:len(source) - len(url)])
+
+# 从最快的下载源下载，失败时依次尝试其余地址
+def download_with_mirrors(url, target_path, label=None):
+    sources = rank_sources(url, label)
+    for source in sources:
+        if download_file(source, target_path, label=label):
+            remember_source(url, source)
+            return True
+        if DOWNLOAD_ABORT.is_set():
+            return False
+        if source != sources[-1]:
+            print("下载失败，尝试下一个下载源")
+    return False
+
+# 包装HTTP响应: 统计进度、响应中止信号，供 tarfile 流式读取
+class ProgressReader:
+    def __init__(self, response, label):
+        self.response = response
+        self.label = label
+        self.total = int(response.getheader('Content-Length') or 0)
+        self.done = 0
+        self.start_time = time.time()
+        self.last_report = self.start_time
+    
+    def read(self, size=-1):
+        if DOWNLOAD_ABORT.is_set():
+            raise RuntimeError("下载已取消")
+        chunk = self.response.read(size)
+        self.done += len(chunk)
+        if self.label and time.time() - self.last_report >= 1:
+            report_progress(self.label, self.done, self.total, self.done / (time.time() - self.start_time))
+            self.last_report = time.time()
+        return chunk
+
+# 从tar.gz流中只取出指定文件，先写临时文件再原子替换到目标路径
+def extract_member(fileobj, member_name, target_path):
+    tmp_path = f"{target_path}.{os.getpid()}.tmp"
+    try:
+        with tarfile.open(fileobj=fileobj, mode="r|gz") as tar:
+            for member in tar:
+                if member.isfile() and os.path.basename(member.name) == member_name:
+                    with tar.extractfile(member) as src, open(tmp_path, 'wb') as dst:
+                        shutil.copyfileobj(src, dst, 1024 * 1024)
+                    os.chmod(tmp_path, 0o755)
+                    os.replace(tmp_path, str(target_path))
+                    return
+        raise Exception(f"压缩包中未找到 {member_name}")
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+# 边下载边解压: 直接从HTTP响应中提取单个文件，不落盘压缩包
+def stream_extract(url, member_name, target_path, label=None):
+    conn = None
+    reader = None
+    start_time = time.time()
+    try:
+        conn, response = http_open("GET", url, retries=0)
+        if response.status != 200:
+            raise Exception(f"HTTP {response.status} {response.reason}")
+        reader = ProgressReader(response, label)
+        extract_member(reader, member_name, target_path)
+        if label:
+            report_progress(label, reader.done, reader.total, reader.done / max(time.time() - reader.start_time, 0.001))
+        record_download(url, reader.done, reader.start_time - start_time, time.time() - start_time, ok=True, label=label)
         return True
     except Exception as e:
-        print(f"下载文件失败: {url}, 错误: {e}")
+        print(f"流式下载解压失败: {url}, 错误: {e}")
+        if not DOWNLOAD_ABORT.is_set():
+            record_download(url, reader.done if reader else 0, None, time.time() - start_time, ok=False, label=label)
         return False
+    finally:
+        if conn:
+            conn.close()
 
 # 脚本信息
 def print_info():
@@ -82,28 +647,318 @@ def print_usage():
     print("\033[33m使用方法:\033[0m")
     print("  \033[36mpython3 agsb.py\033[0m              - 安装并启动服务")
     print("  \033[36mpython3 agsb.py install\033[0m      - 安装服务")
+    print("  \033[36mpython3 agsb.py install --bundle FILE\033[0m - 使用离线安装包安装")
+    print("  \033[36mpython3 agsb.py install --profile FILE\033[0m - 指定安装阶段 trace 文件 (默认 ~/.agsb/install-trace.json)")
+    print("  \033[36mpython3 agsb.py bundle create [FILE] [--arch amd64,arm64]\033[0m - 制作离线安装包")
     print("  \033[36mpython3 agsb.py status\033[0m       - 查看服务状态和节点信息")
+    print("  \033[36mpython3 agsb.py status --json|--prometheus\033[0m - 输出机器可读的状态")
     print("  \033[36mpython3 agsb.py cat\033[0m          - 查看单行节点列表")
+    print("  \033[36mpython3 agsb.py downloads stats\033[0m - 查看下载历史统计")
     print("  \033[36mpython3 agsb.py update\033[0m       - 更新脚本")
+    print("  \033[36mpython3 agsb.py upgrade-binaries\033[0m - 升级sing-box/cloudflared (保留UUID和端口)")
+    print("  \033[36mpython3 agsb.py prefetch [enable|disable]\033[0m - 预取新版本 / 开启或关闭定时预取")
+    print("  \033[36mpython3 agsb.py supervise [-d|stop]\033[0m - 由守护进程运行并自动重启服务 (-d 后台运行)")
+    print("  \033[36mpython3 agsb.py top [--interval 秒]\033[0m - 实时查看各组件的CPU、内存、文件描述符和线程数 (守护进程运行时为刷新间隔)")
+    print("  \033[36mpython3 agsb.py ctl [status|links|domain|reload|metrics|samples|tail NAME N]\033[0m - 查询守护进程控制接口 (JSON)")
+    print("  \033[36mpython3 agsb.py logs [sb|argo|debug|supervisor] [N] [--grep 正则] [--follow]\033[0m - 查看日志最后N行 (含已轮转的压缩段)")
+    print("  \033[36mpython3 agsb.py logs stats [--reset] [--json|--quiet]\033[0m - 增量统计 sing-box 连接数、错误分类和访问最多的目标")
     print("  \033[36mpython3 agsb.py del\033[0m          - 卸载服务")
     print()
 
-# 写入日志函数
-def write_debug_log(message):
+# 记录一个阶段的开始时间和耗时，并发下载时各线程的阶段分开显示
+@contextmanager
+def phase(name, **args):
+    start_time = time.time()
     try:
-        if not os.path.exists(str(INSTALL_DIR)):
-            os.makedirs(str(INSTALL_DIR), exist_ok=True)
-        
-        with open(str(DEBUG_LOG), 'a', encoding='utf-8') as f:
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            f.write(f"[{timestamp}] {message}\n")
-    except Exception as e:
-        print(f"写入日志失败: {e}")
+        yield
+    finally:
+        if PROFILE_ENABLED:
+            with PROFILE_LOCK:
+                PROFILE_EVENTS.append({"name": name, "cat": "install", "ph": "X", "pid": os.getpid(),
+                                       "tid": threading.get_native_id(), "ts": int(start_time * 1e6),
+                                       "dur": int((time.time() - start_time) * 1e6), "args": args})
+
+# 输出各阶段时间线，并写入 trace 文件 (可跨机器、跨次对比)
+def write_profile(trace_path):
+    with PROFILE_LOCK:
+        events = sorted(PROFILE_EVENTS, key=lambda e: e["ts"])
+    if not events:
+        return
+    origin = events[0]["ts"]
+    total = max(e["ts"] + e["dur"] for e in events) - origin
+    threads = {tid: index for index, tid in enumerate(dict.fromkeys(e["tid"] for e in events))}
+    print("\033[36m╭───────────────────────────────────────────────────────────────╮\033[0m")
+    print("\033[36m│                \033[33m✨ 安装阶段耗时 ✨                        \033[36m│\033[0m")
+    print("\033[36m├───────────────────────────────────────────────────────────────┤\033[0m")
+    for event in events:
+        start, duration = (event["ts"] - origin) / 1e6, event["dur"] / 1e6
+        offset = int((event["ts"] - origin) * 30 / total) if total else 0
+        bar = " " * offset + "█" * max(1, int(event["dur"] * 30 / total) if total else 1)
+        lane = f"[{threads[event['tid']]}]" if len(threads) > 1 else ""
+        # 中文字符占两列, 按显示宽度补齐
+        width = sum(2 if unicodedata.east_asian_width(c) in "WF" else 1 for c in event["name"])
+        name = event["name"] + " " * max(0, 22 - width)
+        print(f"\033[36m│ \033[0m{start:7.2f}s {duration:7.2f}s {lane:<3} {name} \033[32m{bar}\033[0m")
+    print(f"\033[36m│ \033[32m总耗时: \033[0m{total / 1e6:.2f}s   \033[32mtrace: \033[0m{trace_path}")
+    print("\033[36m╰───────────────────────────────────────────────────────────────╯\033[0m")
+    try:
+        write_json(Path(trace_path), {"traceEvents": events, "displayTimeUnit": "ms",
+                                      "otherData": {"script": "agsb.py", "host": socket.gethostname(),
+                                                    "machine": platform.machine(), "date": datetime.now().isoformat()}})
+    except OSError as e:
+        print(f"写入trace文件失败: {e}")
+
+# 调试日志缓冲区: 日志行先写入内存，由后台线程定期 (或缓冲区满时) 批量追加到 DEBUG_LOG，退出前再写一次
+class DebugLogBuffer:
+    def __init__(self):
+        self.lines = []
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()  # 保证批次按顺序写入
+        self.wake = threading.Event()
+        self.owner = None  # 启动写入线程的进程；fork 出的子进程需要重新启动线程
+    
+    # fork 时写入线程可能正持有锁，子进程中重新创建锁；父进程尚未写入的行由父进程负责写入
+    def after_fork(self):
+        self.lines = []
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.owner = None
+    
+    def append(self, line):
+        with self.lock:
+            self.lines.append(line)
+            count = len(self.lines)
+            if self.owner != os.getpid():
+                self.owner = os.getpid()
+                threading.Thread(target=self.run, daemon=True).start()
+        if count >= LOG_BUFFER_LINES:
+            self.wake.set()
+    
+    def run(self):
+        while True:
+            self.wake.wait(LOG_FLUSH_INTERVAL)
+            self.wake.clear()
+            self.flush()
+    
+    def flush(self):
+        with self.write_lock:
+            with self.lock:
+                lines, self.lines = self.lines, []
+            if not lines:
+                return
+            try:
+                os.makedirs(str(INSTALL_DIR), exist_ok=True)
+                with open(str(DEBUG_LOG), 'a', encoding='utf-8') as f:
+                    f.write("".join(lines))
+                    full = f.tell() >= LOG_SEGMENT_BYTES
+                if full:
+                    rotate_log(DEBUG_LOG)
+            except OSError as e:
+                print(f"写入日志失败: {e}")
+
+DEBUG_LOG_BUFFER = DebugLogBuffer()
+atexit.register(DEBUG_LOG_BUFFER.flush)
+
+# 结构化日志: 每条记录为一行JSON (时间、级别、模块、消息及附加字段)，低于 LOG_LEVEL 的记录直接丢弃
+class Logger:
+    def __init__(self, module, **context):
+        self.module = module
+        self.context = context
+    
+    # 返回附带固定字段的子日志器，例如 get_logger("supervisor").bind(service="sing-box")
+    def bind(self, **fields):
+        return Logger(self.module, **self.context, **fields)
+    
+    def log(self, level, message, **fields):
+        if LOG_LEVELS[level] < LOG_LEVEL:
+            return
+        record = {"ts": datetime.now().isoformat(timespec='milliseconds'), "level": level,
+                  "module": self.module, "pid": os.getpid(), "msg": message, **self.context, **fields}
+        DEBUG_LOG_BUFFER.append(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+    
+    def debug(self, message, **fields):
+        self.log("debug", message, **fields)
+    
+    def info(self, message, **fields):
+        self.log("info", message, **fields)
+    
+    def warning(self, message, **fields):
+        self.log("warning", message, **fields)
+    
+    def error(self, message, **fields):
+        self.log("error", message, **fields)
+
+LOGGERS = {}
+
+# 按模块名获取日志器 (同名共用一个实例)
+def get_logger(module):
+    logger = LOGGERS.get(module)
+    if logger is None:
+        logger = LOGGERS.setdefault(module, Logger(module))
+    return logger
+
+# 轮转日志: path 压缩为 path.1.gz，原有的 path.N.gz 后移为 path.N+1.gz；
+# 超出 LOG_SEGMENTS 或磁盘预算 (为新的当前段预留一段空间) 的最旧段被删除
+def rotate_log(path, segments=LOG_SEGMENTS, budget=LOG_BUDGET_BYTES):
+    path = Path(path)
+    try:
+        if path.stat().st_size == 0:
+            return
+    except OSError:
+        return
+    archived = [path.with_name(f"{path.name}.{i}.gz") for i in range(1, segments + 1)]
+    for extra in path.parent.glob(f"{path.name}.*.gz"):
+        if extra not in archived:
+            extra.unlink()
+    if archived[-1].exists():
+        archived[-1].unlink()
+    for i in range(segments - 1, 0, -1):
+        if archived[i - 1].exists():
+            os.replace(str(archived[i - 1]), str(archived[i]))
+    # 先移走再压缩，调用方可以立即重建当前段
+    raw = path.with_name(f"{path.name}.rotating")
+    os.replace(str(path), str(raw))
+    try:
+        with open(str(raw), 'rb') as src, gzip.open(str(archived[0]) + ".tmp", 'wb', compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(str(archived[0]) + ".tmp", str(archived[0]))
+    finally:
+        raw.unlink()
+    existing = [p for p in archived if p.exists()]
+    total = sum(p.stat().st_size for p in existing)
+    while existing and total + LOG_SEGMENT_BYTES > budget:
+        oldest = existing.pop()
+        total -= oldest.stat().st_size
+        oldest.unlink()
+
+# 按大小轮转的日志文件，由管理进程 (守护进程或 logpipe) 持有；
+# sticky 匹配的行 (如临时域名) 会在每个新段开头重写，轮转后仍能从当前段查到
+class RotatingLog:
+    def __init__(self, path, sticky=None, segment_bytes=LOG_SEGMENT_BYTES):
+        self.path = Path(path)
+        self.sticky = sticky
+        self.segment_bytes = segment_bytes
+        self.sticky_lines = []
+        self.tail = deque(maxlen=LOG_TAIL_LINES)
+        self.lock = threading.Lock()
+        rotate_log(self.path)  # 上一次运行的日志压缩保留，不再直接清空
+        self.file = open(str(self.path), 'wb')
+        self.size = 0
+    
+    def write(self, line):
+        with self.lock:
+            self.tail.append(line)
+            if self.sticky and self.sticky.search(line):
+                self.sticky_lines = [line]
+            try:
+                if self.size and self.size + len(line) > self.segment_bytes:
+                    self.file.close()
+                    rotate_log(self.path)
+                    self.file = open(str(self.path), 'wb')
+                    self.size = 0
+                    for sticky_line in self.sticky_lines:
+                        self.file.write(sticky_line)
+                        self.size += len(sticky_line)
+                self.file.write(line)
+                self.file.flush()
+                self.size += len(line)
+            except OSError:
+                pass  # 磁盘写满时丢弃该行 (仍保留在内存中)，不能阻塞子进程的输出
+    
+    def lines(self, count=LOG_TAIL_LINES):
+        with self.lock:
+            return [line.decode(errors='replace').rstrip("\n") for line in list(self.tail)[-count:]]
+    
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+# 从文件末尾按块向前读取，返回最后 count 行；耗时只与读取的行数有关，与文件大小无关
+def tail_file(path, count):
+    if count <= 0:
+        return []
+    with open(str(path), 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        data = b""
+        while position > 0 and data.count(b"\n") <= count:
+            step = min(LOG_READ_BLOCK, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    return [line.decode(errors='replace') for line in data.splitlines()[-count:]]
+
+# 在日志中查找 pattern (bytes 正则) 的最后一个匹配: 从文件末尾开始，搜索窗口逐次加倍，直到找到或覆盖整个文件
+def last_match(path, pattern):
+    try:
+        with open(str(path), 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            window = LOG_READ_BLOCK
+            while True:
+                start = max(0, len(data) - window)
+                start = data.find(b"\n", start) + 1 if start else 0  # 从完整的行开始匹配
+                matches = list(pattern.finditer(data, start))
+                if matches or start == 0:
+                    # 匹配对象引用了映射区，关闭前在复制出的匹配文本上重新匹配
+                    return pattern.match(data[matches[-1].start():matches[-1].end()]) if matches else None
+                window *= 2
+    except (OSError, ValueError):  # 文件不存在或为空 (mmap 不能映射空文件)
+        return None
+
+# 返回文件中匹配 pattern 的行 (最多最后 count 行)，通过 mmap 由正则引擎直接扫描文件
+def grep_file(path, pattern, count):
+    lines = deque(maxlen=count)
+    try:
+        with open(str(path), 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            position = 0
+            while True:
+                match = pattern.search(data, position)
+                if not match:
+                    break
+                start = data.rfind(b"\n", 0, match.start()) + 1
+                end = data.find(b"\n", match.end())
+                end = len(data) if end < 0 else end
+                lines.append(data[start:end].decode(errors='replace'))
+                position = end + 1
+    except (OSError, ValueError):
+        pass
+    return list(lines)
+
+# 读取日志最后 count 行 (可按 pattern 过滤): 当前段从末尾读取或用 mmap 搜索，不足时继续读取压缩段 (每段大小有上限)
+def log_tail(path, count, pattern=None):
+    path = Path(path)
+    if count <= 0:
+        return []
+    try:
+        lines = grep_file(path, pattern, count) if pattern else tail_file(path, count)
+    except OSError:
+        lines = []
+    for segment in [path.with_name(f"{path.name}.{i}.gz") for i in range(1, LOG_SEGMENTS + 1)]:
+        if len(lines) >= count:
+            break
+        try:
+            with gzip.open(str(segment), 'rb') as f:
+                older = f.read().splitlines()
+        except (OSError, EOFError):
+            continue
+        if pattern:
+            older = [line for line in older if pattern.search(line)]
+        lines = [line.decode(errors='replace') for line in older[-(count - len(lines)):]] + lines
+    return lines[-count:]
+
+# 日志管道: 启动脚本把子进程输出通过管道交给本函数，按大小轮转写入 path，直到管道关闭
+def log_pipe(path):
+    # 与子进程一同收到的 SIGHUP/SIGINT 不应先结束读取端，否则子进程写管道会失败
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    log = RotatingLog(path, sticky=TUNNEL_DOMAIN_RE if Path(path).name == LOG_FILE.name else None)
+    for line in iter(sys.stdin.buffer.readline, b""):
+        log.write(line)
+    log.close()
 
 # 下载二进制文件
 def download_binary(name, download_url, target_path):
     print(f"正在下载 {name}...")
-    success = download_file(download_url, target_path)
+    success = download_with_mirrors(download_url, target_path, label=name)
     if success:
         print(f"{name} 下载成功!")
         os.chmod(target_path, 0o755)  # 设置可执行权限
@@ -112,6 +967,400 @@ def download_binary(name, download_url, target_path):
         print(f"{name} 下载失败!")
         return False
 
+# 共享二进制缓存: 按 工具/版本/架构 建立索引，文件内容按SHA-256存放，重装时不再重复下载
+# 多用户主机可通过 AGSB_CACHE_DIR 指向同一个共享目录
+CACHE_DIR = Path(os.environ.get("AGSB_CACHE_DIR") or Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "agsb")
+CACHE_MAX_BYTES = int(os.environ.get("AGSB_CACHE_MAX_MB", "512")) * 1024 * 1024
+MIRROR_STATE_FILE = CACHE_DIR / "mirrors.json"  # 各域名上次选中的镜像，卸载后保留
+HISTORY_FILE = CACHE_DIR / "downloads.jsonl"  # 下载历史，每行一条JSON记录
+HISTORY_MAX = 500             # 下载历史最多保留的记录数
+HISTORY_RECENT = 10           # 为下载源打分时参考的最近记录数
+HISTORY_MIN_BYTES = 256 * 1024  # 小于此大小的下载不参与吞吐量统计
+HISTORY_LOCK = threading.Lock()
+RELEASE_CACHE_FILE = CACHE_DIR / "releases.json"  # GitHub发布信息缓存
+RELEASE_TTL = int(os.environ.get("AGSB_RELEASE_TTL", "3600"))  # 发布信息缓存有效期(秒)
+RELEASE_LOCK = threading.Lock()
+STAGED_FILE = CACHE_DIR / "staged.json"  # 后台预取并校验过的新版本 (二进制存放在缓存中)
+PREFETCH_MAX_AGE = 24 * 3600  # 预取结果在此时间内有效，升级时不再查询最新版本
+
+# 计算文件的SHA-256
+def file_sha256(path):
+    sha = hashlib.sha256()
+    with open(str(path), 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+# 加锁读写缓存索引，避免多个进程同时安装时互相覆盖
+@contextmanager
+def cache_index():
+    (CACHE_DIR / "objects").mkdir(parents=True, exist_ok=True)
+    with open(str(CACHE_DIR / ".lock"), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        index_file = CACHE_DIR / "index.json"
+        try:
+            with open(str(index_file), 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        yield index
+        tmp_file = f"{index_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_file, str(index_file))
+
+# 硬链接(跨文件系统时复制)文件到目标路径，先写临时文件再原子替换
+def link_or_copy(src, target_path):
+    tmp_path = f"{target_path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(str(src), tmp_path)
+    except OSError:
+        shutil.copy2(str(src), tmp_path)
+    os.chmod(tmp_path, 0o755)
+    os.replace(tmp_path, str(target_path))
+
+# 按最近使用时间淘汰缓存，直到总大小不超过上限
+def cache_evict(index, keep_key):
+    total = sum(entry["size"] for entry in {e["sha256"]: e for e in index.values()}.values())
+    for key in sorted(index, key=lambda k: index[k]["atime"]):
+        if total <= CACHE_MAX_BYTES:
+            break
+        if key == keep_key:
+            continue
+        digest = index.pop(key)["sha256"]
+        if not any(e["sha256"] == digest for e in index.values()):
+            obj_path = CACHE_DIR / "objects" / digest
+            if obj_path.exists():
+                total -= os.path.getsize(str(obj_path))
+                os.remove(str(obj_path))
+        get_logger("cache").info("缓存淘汰", key=key)
+
+# 从缓存安装二进制文件，命中并校验通过返回True
+def cache_fetch(tool, version, arch, target_path):
+    if not version:
+        return False
+    key = f"{tool}/{version}/{arch}"
+    try:
+        with cache_index() as index:
+            entry = index.get(key)
+            if not entry:
+                return False
+            obj_path = CACHE_DIR / "objects" / entry["sha256"]
+            if not obj_path.exists() or file_sha256(obj_path) != entry["sha256"]:
+                get_logger("cache").warning("缓存文件缺失或校验失败，丢弃", key=key)
+                index.pop(key)
+                if obj_path.exists():
+                    os.remove(str(obj_path))
+                return False
+            entry["atime"] = time.time()
+            link_or_copy(obj_path, target_path)
+        print(f"{tool} {version} 已从缓存安装")
+        get_logger("cache").debug("缓存命中", key=key, target=str(target_path))
+        return True
+    except Exception as e:
+        get_logger("cache").warning("读取缓存失败", key=key, error=str(e))
+        return False
+
+# 将新下载的二进制文件存入缓存
+def cache_store(tool, version, arch, src_path):
+    if not version:
+        return
+    key = f"{tool}/{version}/{arch}"
+    try:
+        digest = file_sha256(src_path)
+        with cache_index() as index:
+            obj_path = CACHE_DIR / "objects" / digest
+            if not obj_path.exists():
+                link_or_copy(src_path, obj_path)
+            index[key] = {"sha256": digest, "size": os.path.getsize(str(obj_path)), "atime": time.time()}
+            cache_evict(index, key)
+        get_logger("cache").debug("已缓存", key=key, sha256=digest)
+    except Exception as e:
+        get_logger("cache").warning("写入缓存失败", key=key, error=str(e))
+
+# 通过 releases/latest 的跳转地址获取最新版本标签 (不占用GitHub API配额)
+def resolve_latest_tag(repo):
+    try:
+        _, headers, _ = http_request("HEAD", f"https://github.com/{repo}/releases/latest", max_redirects=0)
+        location = headers.get("Location") or ""
+        tag = location.rstrip('/').rsplit('/', 1)[-1]
+        return tag if "/tag/" in location and tag else None
+    except Exception as e:
+        get_logger("release").warning(f"获取 {repo} 最新版本标签失败", repo=repo, error=str(e))
+        return None
+
+# 打印下载进度和速度
+def report_progress(label, done, total, speed):
+    rate = f"{speed / 1024 / 1024:.2f}MB/s" if speed >= 1024 * 1024 else f"{speed / 1024:.0f}KB/s"
+    with PRINT_LOCK:
+        if total:
+            print(f"[{label}] {done * 100 // total}% ({done / 1024 / 1024:.1f}/{total / 1024 / 1024:.1f}MB) {rate}")
+        else:
+            print(f"[{label}] 已下载 {done / 1024 / 1024:.1f}MB {rate}")
+
+# 获取sing-box最新版本号
+def fetch_singbox_version():
+    print("获取sing-box最新版本号...")
+    release = github_latest_release("SagerNet/sing-box")
+    if release and release.get("tag_name"):
+        sbcore = release["tag_name"].lstrip("v")
+        print(f"sing-box 最新版本: {sbcore}")
+    else:
+        sbcore = "1.6.0"  # 默认版本，仅在从未成功获取过发布信息时使用
+        print(f"无法获取最新版本，使用默认版本: {sbcore}")
+    return sbcore
+
+# 获取sing-box: 查询版本、下载压缩包并解压
+def fetch_singbox(arch, singbox_path, sbcore=None):
+    if not sbcore:
+        with phase("sing-box 版本查询"):
+            sbcore = fetch_singbox_version()
+    with phase("sing-box 缓存查找"):
+        if cache_fetch("sing-box", sbcore, arch, singbox_path):
+            return True
+    sbname = f"sing-box-{sbcore}-linux-{arch}"
+    singbox_url = f"https://github.com/SagerNet/sing-box/releases/download/v{sbcore}/{sbname}.tar.gz"
+    
+    print(f"下载sing-box版本: {sbcore}")
+    get_logger("download").debug("下载链接", tool="sing-box", url=singbox_url)
+    
+    # 边下载边解压，只写出 sing-box 文件
+    with phase("sing-box 下载解压"):
+        extracted = False
+        for source in rank_sources(singbox_url, label="sing-box"):
+            if stream_extract(source, "sing-box", singbox_path, label="sing-box"):
+                remember_source(singbox_url, source)
+                extracted = True
+                break
+            if DOWNLOAD_ABORT.is_set():
+                return False
+    if not extracted:
+        # 流式下载无法断点续传，全部失败时退回到可续传下载压缩包再解压
+        print("sing-box 流式下载失败，改用可续传下载")
+        tar_path = f"{singbox_path}.tar.gz"  # 放在目标文件旁: 多个架构并发获取 (bundle create) 时互不干扰
+        with phase("sing-box 续传下载"):
+            downloaded = download_with_mirrors(singbox_url, tar_path, label="sing-box")
+        if not downloaded:
+            print("sing-box 下载失败")
+            return False
+        try:
+            print("正在解压sing-box...")
+            with phase("sing-box 解压"), open(tar_path, 'rb') as f:
+                extract_member(f, "sing-box", singbox_path)
+            os.remove(tar_path)
+        except Exception as e:
+            print(f"解压sing-box失败: {e}")
+            return False
+    cache_store("sing-box", sbcore, arch, singbox_path)
+    return True
+
+# 获取cloudflared
+def fetch_cloudflared(arch, cloudflared_path, cfcore=None):
+    # 解析出具体版本号，便于按版本缓存
+    if not cfcore:
+        with phase("cloudflared 版本查询"):
+            cfcore = resolve_latest_tag("cloudflare/cloudflared")
+    with phase("cloudflared 缓存查找"):
+        if cache_fetch("cloudflared", cfcore, arch, cloudflared_path):
+            return True
+    release_path = f"download/{cfcore}" if cfcore else "latest/download"
+    cloudflared_url = f"https://github.com/cloudflare/cloudflared/releases/{release_path}/cloudflared-linux-{arch}"
+    
+    print("下载cloudflared...")
+    get_logger("download").debug("下载链接", tool="cloudflared", url=cloudflared_url)
+    
+    with phase("cloudflared 下载"):
+        downloaded = download_binary("cloudflared", cloudflared_url, cloudflared_path)
+    if not downloaded:
+        return False
+    cache_store("cloudflared", cfcore, arch, cloudflared_path)
+    return True
+
+# 获取hysteria (仅用于制作离线安装包，缓存键与 nginx-hysteria2.py 一致)
+def fetch_hysteria(arch, hysteria_path, version=HYSTERIA_VERSION):
+    if cache_fetch("hysteria", version, f"linux-{arch}", hysteria_path):
+        return True
+    hyarch = "arm" if arch == "armv7" else arch
+    hysteria_url = f"https://github.com/apernet/hysteria/releases/download/app/{version}/hysteria-linux-{hyarch}"
+    if not download_binary("hysteria", hysteria_url, hysteria_path):
+        return False
+    cache_store("hysteria", version, f"linux-{arch}", hysteria_path)
+    return True
+
+# 并发获取所有二进制文件，任一失败立即退出安装
+def acquire_binaries(arch):
+    tasks = {}
+    singbox_path = str(INSTALL_DIR / "sing-box")
+    if not os.path.exists(singbox_path):
+        tasks["sing-box"] = (fetch_singbox, arch, singbox_path)
+    cloudflared_path = str(INSTALL_DIR / "cloudflared")
+    if not os.path.exists(cloudflared_path):
+        tasks["cloudflared"] = (fetch_cloudflared, arch, cloudflared_path)
+    if not tasks:
+        return
+    
+    DOWNLOAD_ABORT.clear()
+    start_time = time.time()
+    pool = ThreadPoolExecutor(max_workers=len(tasks))
+    futures = {pool.submit(*task): name for name, task in tasks.items()}
+    for future in as_completed(futures):
+        name = futures[future]
+        try:
+            ok = future.result()
+        except Exception as e:
+            get_logger("install").error(f"{name} 获取出错", tool=name, error=str(e))
+            ok = False
+        if not ok:
+            DOWNLOAD_ABORT.set()
+            pool.shutdown(wait=False)
+            print(f"{name} 获取失败，退出安装")
+            sys.exit(1)
+        print(f"{name} 已就绪 ({time.time() - start_time:.1f}s)")
+    pool.shutdown()
+    get_logger("install").info("二进制文件获取完成", seconds=round(time.time() - start_time, 3))
+
+# 制作离线安装包: 多架构的 sing-box/cloudflared/hysteria 和版本清单打包为一个 tar.gz，
+# 同时生成 sha256sum 格式的校验文件 <bundle>.sha256
+def bundle_create(bundle_path, arches):
+    print("获取版本信息...")
+    versions = {
+        "sing-box": fetch_singbox_version(),
+        "cloudflared": resolve_latest_tag("cloudflare/cloudflared"),
+        "hysteria": HYSTERIA_VERSION,
+    }
+    if not versions["cloudflared"]:
+        print("无法解析cloudflared版本，无法制作离线安装包")
+        sys.exit(1)
+    fetchers = {"sing-box": fetch_singbox, "cloudflared": fetch_cloudflared, "hysteria": fetch_hysteria}
+    
+    work_dir = tempfile.mkdtemp(prefix="agsb-bundle-")
+    try:
+        DOWNLOAD_ABORT.clear()
+        start_time = time.time()
+        files = []
+        pool = ThreadPoolExecutor(max_workers=4)
+        futures = {}
+        for arch in arches:
+            for tool, fetch in fetchers.items():
+                path = os.path.join(work_dir, f"{tool}-{arch}")
+                entry = {"tool": tool, "version": versions[tool], "arch": f"linux-{arch}" if tool == "hysteria" else arch}
+                futures[pool.submit(fetch, arch, path, versions[tool])] = (entry, path)
+        for future in as_completed(futures):
+            entry, path = futures[future]
+            try:
+                ok = future.result()
+            except Exception as e:
+                get_logger("bundle").error(f"{entry['tool']} ({entry['arch']}) 获取出错", tool=entry['tool'], arch=entry['arch'], error=str(e))
+                ok = False
+            if not ok:
+                DOWNLOAD_ABORT.set()
+                pool.shutdown(wait=False)
+                print(f"{entry['tool']} ({entry['arch']}) 获取失败，无法制作离线安装包")
+                sys.exit(1)
+            entry["name"] = f"bin/{entry['tool']}/{entry['version']}/{entry['arch']}/{entry['tool']}"
+            entry["sha256"] = file_sha256(path)
+            entry["size"] = os.path.getsize(path)
+            files.append((entry, path))
+        pool.shutdown()
+        
+        # 清单放在第一个成员，安装时流式读取即可先拿到校验值
+        files.sort(key=lambda f: f[0]["name"])
+        manifest = json.dumps({
+            "format": 1,
+            "created": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "files": [entry for entry, _ in files],
+        }, indent=2).encode('utf-8')
+        tmp_path = f"{bundle_path}.{os.getpid()}.tmp"
+        with tarfile.open(tmp_path, "w:gz") as tar:
+            info = tarfile.TarInfo("manifest.json")
+            info.size = len(manifest)
+            info.mtime = int(time.time())
+            tar.addfile(info, io.BytesIO(manifest))
+            for entry, path in files:
+                tar.add(path, arcname=entry["name"])
+        os.replace(tmp_path, bundle_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    digest = file_sha256(bundle_path)
+    with open(f"{bundle_path}.sha256", 'w') as f:
+        f.write(f"{digest}  {os.path.basename(bundle_path)}\n")
+    print(f"离线安装包已生成: {bundle_path} ({os.path.getsize(bundle_path) / 1024 / 1024:.1f}MB, 耗时 {time.time() - start_time:.1f}s)")
+    for entry, _ in files:
+        print(f"  {entry['tool']:<12} {entry['version']:<12} {entry['arch']}")
+    print(f"SHA-256: {digest}")
+
+# 校验离线安装包: 存在 <bundle>.sha256 时先校验整个文件
+def verify_bundle(bundle_path):
+    checksum_file = f"{bundle_path}.sha256"
+    if not os.path.exists(checksum_file):
+        print(f"未找到 {checksum_file}，仅校验包内各文件的SHA-256")
+        return
+    with open(checksum_file, 'r') as f:
+        expected = f.read().split()[0].lower()
+    if file_sha256(bundle_path) != expected:
+        raise Exception(f"离线安装包校验失败: {bundle_path} 与 {checksum_file} 不匹配")
+
+# 从离线安装包中流式解压所需文件，wanted 为 {(工具, 架构): 目标路径}，逐个校验SHA-256
+def extract_bundle(bundle_path, wanted):
+    verify_bundle(bundle_path)
+    manifest = None
+    pending = dict(wanted)
+    installed = []
+    with open(bundle_path, 'rb') as f, tarfile.open(fileobj=f, mode="r|gz") as tar:
+        for member in tar:
+            if member.name == "manifest.json":
+                with tar.extractfile(member) as src:
+                    manifest = {e["name"]: e for e in json.load(src)["files"]}
+                continue
+            if manifest is None:
+                raise Exception("离线安装包缺少清单文件")
+            entry = manifest.get(member.name)
+            if not entry or (entry["tool"], entry["arch"]) not in pending:
+                continue
+            target_path = pending.pop((entry["tool"], entry["arch"]))
+            tmp_path = f"{target_path}.{os.getpid()}.tmp"
+            sha = hashlib.sha256()
+            try:
+                with tar.extractfile(member) as src, open(tmp_path, 'wb') as dst:
+                    for chunk in iter(lambda: src.read(1024 * 1024), b''):
+                        sha.update(chunk)
+                        dst.write(chunk)
+                if sha.hexdigest() != entry["sha256"]:
+                    raise Exception(f"{member.name} 校验失败")
+                os.chmod(tmp_path, 0o755)
+                os.replace(tmp_path, str(target_path))
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            installed.append(entry)
+            if not pending:
+                break
+    if pending:
+        missing = ", ".join(f"{tool} ({arch})" for tool, arch in pending)
+        raise Exception(f"离线安装包中没有: {missing}")
+    return installed
+
+# 从离线安装包安装 sing-box 与 cloudflared，并存入共享缓存
+def install_from_bundle(bundle_path, arch):
+    start_time = time.time()
+    print(f"使用离线安装包: {bundle_path}")
+    wanted = {
+        ("sing-box", arch): str(INSTALL_DIR / "sing-box"),
+        ("cloudflared", arch): str(INSTALL_DIR / "cloudflared"),
+    }
+    try:
+        installed = extract_bundle(bundle_path, wanted)
+    except Exception as e:
+        print(f"离线安装失败: {e}")
+        sys.exit(1)
+    for entry in installed:
+        cache_store(entry["tool"], entry["version"], entry["arch"], wanted[(entry["tool"], entry["arch"])])
+        print(f"{entry['tool']} {entry['version']} 已从离线安装包安装")
+    get_logger("bundle").info("离线安装包解压完成", seconds=round(time.time() - start_time, 3))
+
 # 生成VMess链接
 def generate_vmess_link(config):
     vmess_obj = {
@@ -136,12 +1385,12 @@ def generate_vmess_link(config):
 
 # 生成链接
 def generate_links(domain, port_vm_ws, uuid_str):
-    write_debug_log(f"生成链接: domain={domain}, port_vm_ws={port_vm_ws}, uuid_str={uuid_str}")
+    get_logger("links").debug("生成链接", domain=domain, port=port_vm_ws, uuid=uuid_str)
     
     # VMess WebSocket 配置
     ws_path = f"/{uuid_str}-vm"  # WebSocket路径和前面保持一致
     ws_path_full = f"{ws_path}?ed=2048" # 添加额外参数
-    write_debug_log(f"WebSocket路径: {ws_path_full}")
+    get_logger("links").debug("WebSocket路径", path=ws_path_full)
     
     hostname = socket.gethostname()
     all_links = []  # 存储所有链接
@@ -438,27 +1687,17 @@ def generate_links(domain, port_vm_ws, uuid_str):
     print("\033[36m│ \033[32m使用 \033[33mpython3 agsb.py del\033[32m 删除节点\033[0m")
     print("\033[36m╰───────────────────────────────────────────────────────────────╯\033[0m")
     
-    write_debug_log(f"链接生成完毕，已保存到: {LIST_FILE}, {all_nodes_file}")
+    get_logger("links").info("链接生成完毕", list_file=str(LIST_FILE), nodes_file=str(all_nodes_file))
     
     return True
 
 # 安装过程
-def install():
-    # 创建安装目录
-    if not os.path.exists(str(INSTALL_DIR)):
-        os.makedirs(str(INSTALL_DIR), exist_ok=True)
-    
-    # 切换到安装目录
-    os.chdir(str(INSTALL_DIR))
-    
-    # 初始化日志
-    write_debug_log("开始安装过程")
-    
-    # 检测系统架构
+# 检测系统架构
+def detect_arch():
     system = platform.system().lower()
     machine = platform.machine().lower()
     
-    write_debug_log(f"检测到系统: {system}, 架构: {machine}")
+    get_logger("install").debug("检测到系统", system=system, machine=machine)
     
     # 判断架构类型
     if system == "linux":
@@ -474,118 +1713,87 @@ def install():
         print("不支持的系统类型: {}".format(system))
         sys.exit(1)
     
-    write_debug_log(f"确定架构类型为: {arch}")
+    get_logger("install").debug("确定架构类型", arch=arch)
+    return arch
+
+def install(bundle_path=None, trace_path=PROFILE_FILE):
+    global PROFILE_ENABLED
+    PROFILE_ENABLED = True
+    # 创建安装目录
+    if not os.path.exists(str(INSTALL_DIR)):
+        os.makedirs(str(INSTALL_DIR), exist_ok=True)
+    
+    # 切换到安装目录
+    os.chdir(str(INSTALL_DIR))
+    
+    # 初始化日志
+    get_logger("install").info("开始安装过程")
     
-    # 获取sing-box最新版本号
     try:
-        print("获取sing-box最新版本号...")
-        version_info = http_get("https://api.github.com/repos/SagerNet/sing-box/releases/latest")
-        if version_info:
-            version_data = json.loads(version_info)
-            sbcore = version_data.get("tag_name", "v1.6.0").lstrip("v")
-            print(f"sing-box 最新版本: {sbcore}")
-        else:
-            sbcore = "1.6.0"  # 默认版本
-            print(f"无法获取最新版本，使用默认版本: {sbcore}")
-    except Exception as e:
-        sbcore = "1.6.0"  # 默认版本
-        print(f"获取最新版本失败，使用默认版本: {sbcore}，错误: {e}")
+        with phase("安装"):
+            install_phases(bundle_path)
+    finally:
+        # 安装失败退出时同样输出已完成阶段的耗时
+        write_profile(trace_path)
+
+# 安装的各个阶段，每个阶段计时
+def install_phases(bundle_path):
+    # 检测系统架构
+    arch = detect_arch()
     
-    # 下载 sing-box
-    singbox_path = str(INSTALL_DIR / "sing-box")
-    if not os.path.exists(singbox_path):
-        sbname = f"sing-box-{sbcore}-linux-{arch}"
-        singbox_url = f"https://github.com/SagerNet/sing-box/releases/download/v{sbcore}/{sbname}.tar.gz"
+    # 并发获取 sing-box 与 cloudflared，指定离线安装包时不访问网络
+    if bundle_path:
+        with phase("离线安装包解压"):
+            install_from_bundle(bundle_path, arch)
+    else:
+        with phase("获取二进制文件"):
+            acquire_binaries(arch)
+    
+    with phase("生成配置"):
+        # 生成配置
+        uuid_str = str(uuid.uuid4())
+        port_vm_ws = random.randint(10000, 65535)  # 随机生成端口
+        metrics_port = random.randint(10000, 65535)  # cloudflared 指标端口
+        while metrics_port == port_vm_ws:
+            metrics_port = random.randint(10000, 65535)
         
-        print(f"下载sing-box版本: {sbcore}")
-        write_debug_log(f"下载链接: {singbox_url}")
+        # 创建配置文件
+        config_data = {
+            "uuid_str": uuid_str,
+            "port_vm_ws": port_vm_ws,
+            "metrics_port": metrics_port,
+            "install_date": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
         
-        # 下载压缩包
-        tar_path = str(INSTALL_DIR / "sing-box.tar.gz")
-        if not download_file(singbox_url, tar_path):
-            print("sing-box 下载失败，尝试使用备用地址")
-            
-            # 尝试使用备用地址
-            backup_url = f"https://github.91chi.fun/https://github.com//SagerNet/sing-box/releases/download/v{sbcore}/{sbname}.tar.gz"
-            if not download_file(backup_url, tar_path):
-                print("sing-box 备用下载也失败，退出安装")
-                sys.exit(1)
+        with open(str(CONFIG_FILE), 'w') as f:
+            json.dump(config_data, f, indent=2)
         
-        # 解压缩
-        try:
-            print("正在解压sing-box...")
-            import tarfile
-            tar = tarfile.open(tar_path)
-            tar.extractall(path=str(INSTALL_DIR))
-            tar.close()
-            
-            # 移动可执行文件
-            shutil.move(str(INSTALL_DIR / sbname / "sing-box"), singbox_path)
-            
-            # 清理解压后的文件
-            if os.path.exists(str(INSTALL_DIR / sbname)):
-                shutil.rmtree(str(INSTALL_DIR / sbname))
-            
-            # 删除压缩包
-            if os.path.exists(tar_path):
-                os.remove(tar_path)
-            
-            # 设置执行权限
-            os.chmod(singbox_path, 0o755)
-        except Exception as e:
-            print(f"解压sing-box失败: {e}")
-            sys.exit(1)
-    
-    # 下载 cloudflared
-    cloudflared_path = str(INSTALL_DIR / "cloudflared")
-    if not os.path.exists(cloudflared_path):
-        cloudflared_url = f"https://github.com/cloudflare/cloudflared/releases/latest/download/cloudflared-linux-{arch}"
+        get_logger("install").info("生成配置文件", path=str(CONFIG_FILE), uuid=uuid_str, port=port_vm_ws)
         
-        print("下载cloudflared...")
-        write_debug_log(f"下载链接: {cloudflared_url}")
+        # 创建 sing-box 配置
+        create_sing_box_config(port_vm_ws, uuid_str)
         
-        if not download_binary("cloudflared", cloudflared_url, cloudflared_path):
-            print("cloudflared 下载失败，尝试使用备用地址")
-            
-            # 尝试使用备用地址
-            backup_url = f"https://github.91chi.fun/https://github.com/cloudflare/cloudflared/releases/latest/download/cloudflared-linux-{arch}"
-            if not download_binary("cloudflared", backup_url, cloudflared_path):
-                print("cloudflared 备用下载也失败，退出安装")
-                sys.exit(1)
-    
-    # 生成配置
-    uuid_str = str(uuid.uuid4())
-    port_vm_ws = random.randint(10000, 65535)  # 随机生成端口
-    
-    # 创建配置文件
-    config_data = {
-        "uuid_str": uuid_str,
-        "port_vm_ws": port_vm_ws,
-        "install_date": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    }
-    
-    with open(str(CONFIG_FILE), 'w') as f:
-        json.dump(config_data, f, indent=2)
-    
-    write_debug_log(f"生成配置文件: {CONFIG_FILE}")
-    write_debug_log(f"UUID: {uuid_str}, 端口: {port_vm_ws}")
-    
-    # 创建 sing-box 配置
-    create_sing_box_config(port_vm_ws, uuid_str)
-    
-    # 创建启动脚本
-    create_startup_script(port_vm_ws)
+        # 创建启动脚本
+        create_startup_script(config_data)
     
     # 设置开机自启动
-    setup_autostart()
+    with phase("设置开机自启动"):
+        setup_autostart()
     
-    # 启动服务
-    start_services()
+    # 启动服务 (设置 AGSB_SUPERVISE=1 时由守护进程启动并看护)
+    with phase("启动服务"):
+        if os.environ.get("AGSB_SUPERVISE") == "1":
+            print("正在启动守护进程...")
+            start_supervisor(refresh_links=False)
+        else:
+            start_services()
     
     # 尝试获取域名和生成链接
-    domain = get_tunnel_domain()
+    with phase("等待隧道域名"):
+        domain = get_tunnel_domain()
     if domain:
-        generate_links(domain, port_vm_ws, uuid_str)
+        with phase("生成节点链接"):
+            generate_links(domain, port_vm_ws, uuid_str)
         
     else:
         print("无法获取tunnel域名，请检查log文件 {}".format(LOG_FILE))
@@ -600,12 +1808,16 @@ def setup_autostart():
         # 过滤掉已有的相关crontab条目
         filtered_lines = []
         for line in lines:
-            if ".agsb/start_sb.sh" not in line and ".agsb/start_cf.sh" not in line:
+            if ".agsb/start_sb.sh" not in line and ".agsb/start_cf.sh" not in line and ".agsb/agsb.py supervise" not in line:
                 filtered_lines.append(line)
         
-        # 添加新的开机自启动条目
-        filtered_lines.append("@reboot {} {}".format(INSTALL_DIR / "start_sb.sh", ">/dev/null 2>&1"))
-        filtered_lines.append("@reboot {} {}".format(INSTALL_DIR / "start_cf.sh", ">/dev/null 2>&1"))
+        # 添加新的开机自启动条目，使用守护进程时由其启动两个服务
+        script_copy = install_script_copy() if os.environ.get("AGSB_SUPERVISE") == "1" else None
+        if script_copy:
+            filtered_lines.append(f"@reboot {sys.executable} {script_copy} supervise -d >/dev/null 2>&1")
+        else:
+            filtered_lines.append("@reboot {} {}".format(INSTALL_DIR / "start_sb.sh", ">/dev/null 2>&1"))
+            filtered_lines.append("@reboot {} {}".format(INSTALL_DIR / "start_cf.sh", ">/dev/null 2>&1"))
         
         new_crontab = '\n'.join(filtered_lines).strip() + '\n'
         crontab_file = tempfile.mktemp()
@@ -616,9 +1828,13 @@ def setup_autostart():
         if os.path.exists(crontab_file):
             os.unlink(crontab_file)
             
-        write_debug_log("已设置开机自启动")
+        get_logger("install").info("已设置开机自启动")
+        
+        # 可选: 定时在后台预取新版本 (安装时设置 AGSB_PREFETCH=1 开启)
+        if os.environ.get("AGSB_PREFETCH") == "1":
+            set_prefetch_cron(True)
     except Exception as e:
-        write_debug_log(f"设置开机自启动失败: {e}")
+        get_logger("install").error("设置开机自启动失败", error=str(e))
         print("设置开机自启动失败，但不影响正常使用")
 
 # 卸载脚本
@@ -627,6 +1843,11 @@ def uninstall():
     
     # 停止服务，使用更温和的方式先
     try:
+        supervisor_pid = running_pid(SUPERVISOR_PID_FILE)
+        if supervisor_pid:
+            print("正在停止守护进程...")
+            stop_process(supervisor_pid, timeout=15)
+        
         print("正在停止sing-box服务...")
         if os.path.exists(str(SB_PID_FILE)):
             with open(str(SB_PID_FILE), 'r') as f:
@@ -645,16 +1866,15 @@ def uninstall():
         time.sleep(1)
         
         # 如果进程还在运行，尝试强制终止
-        sing_box_running = subprocess.run("pgrep -f 'sing-box'", shell=True, stdout=subprocess.PIPE).returncode == 0
-        cloudflared_running = subprocess.run("pgrep -f 'cloudflared'", shell=True, stdout=subprocess.PIPE).returncode == 0
-            
-        if sing_box_running:
-            print("尝试强制终止sing-box进程...")
-            os.system("pkill -9 -f 'sing-box' 2>/dev/null || true")
-        
-        if cloudflared_running:
-            print("尝试强制终止cloudflared进程...")
-            os.system("pkill -9 -f 'cloudflared' 2>/dev/null || true")
+        for name in ("sing-box", "cloudflared"):
+            pids = find_pids(name)
+            if pids:
+                print(f"尝试强制终止{name}进程...")
+                for pid in pids:
+                    try:
+                        os.kill(pid, signal.SIGKILL)
+                    except OSError:
+                        pass
     except Exception as e:
         print("停止服务时出错: {}，但将继续卸载...".format(e))
     
@@ -664,7 +1884,7 @@ def uninstall():
         lines = crontab_list.split('\n')
         filtered_lines = []
         for line in lines:
-            if ".agsb/start_sb.sh" not in line and ".agsb/start_cf.sh" not in line:
+            if not any(entry in line for entry in (".agsb/start_sb.sh", ".agsb/start_cf.sh", ".agsb/agsb.py prefetch", ".agsb/agsb.py supervise")):
                 filtered_lines.append(line)
         
         new_crontab = '\n'.join(filtered_lines).strip() + '\n'
@@ -714,18 +1934,592 @@ def upgrade():
     
     sys.exit(0)
 
+# 运行二进制文件的版本命令，返回其报告的版本号，无法运行时返回None
+def binary_version(name, binary):
+    if not os.path.exists(str(binary)):
+        return None
+    try:
+        output = subprocess.run([str(binary), "version" if name == "sing-box" else "--version"],
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=10).stdout.decode(errors='replace')
+    except Exception as e:
+        get_logger("upgrade").warning(f"读取 {name} 版本失败", tool=name, error=str(e))
+        return None
+    match = re.search(r'version\s+v?(\d+\.\d+(?:\.\d+)?[\w.\-]*)', output)
+    return match.group(1) if match else None
+
+# 读取已安装二进制文件的版本号
+def installed_version(name):
+    return binary_version(name, INSTALL_DIR / name)
+
+# 按程序名查找进程: 读取 /proc/<pid>/cmdline 的 argv[0] 精确匹配 (nginx 等改写了 argv[0] 的进程取冒号前部分)
+def find_pids(name):
+    pids = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit() or int(entry) == os.getpid():
+            continue
+        try:
+            with open(f"/proc/{entry}/cmdline", 'rb') as f:
+                argv0 = f.read().split(b'\0', 1)[0].split(b':', 1)[0]
+        except OSError:
+            continue
+        if os.path.basename(argv0.decode(errors='replace')) == name and process_alive(int(entry)):
+            pids.append(int(entry))
+    return pids
+
+# 解析 /proc/net/{tcp,tcp6,udp,udp6}，返回监听中的 (协议, 端口, socket inode)；TCP 取 LISTEN，UDP 取已绑定未连接
+def listening_sockets():
+    sockets = []
+    for proto in ("tcp", "tcp6", "udp", "udp6"):
+        listen_state = "0A" if proto.startswith("tcp") else "07"
+        try:
+            with open(f"/proc/net/{proto}", 'r') as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    if fields[3] == listen_state:
+                        sockets.append((proto, int(fields[1].rsplit(':', 1)[1], 16), int(fields[9])))
+        except (OSError, StopIteration):
+            continue
+    return sockets
+
+# 返回给定进程打开的 socket inode 到 PID 的映射 (读取 /proc/<pid>/fd)
+def socket_pids(pids):
+    owners = {}
+    for pid in pids:
+        fd_dir = f"/proc/{pid}/fd"
+        try:
+            fds = os.listdir(fd_dir)
+        except OSError:
+            continue
+        for fd in fds:
+            try:
+                target = os.readlink(f"{fd_dir}/{fd}")
+            except OSError:
+                continue
+            if target.startswith("socket:["):
+                owners[int(target[8:-1])] = pid
+    return owners
+
+# 返回给定进程正在监听的 [(协议, 端口)]
+def process_ports(pids):
+    owners = socket_pids(pids)
+    return sorted({(proto, port) for proto, port, inode in listening_sockets() if inode in owners})
+
+# 读取进程的资源占用 (/proc/<pid>/stat、status、fd): 运行时间(秒)、CPU 时间(时钟滴答)、常驻内存(字节)、线程数和打开的文件描述符数量
+def process_stats(pid):
+    with open(f"/proc/{pid}/stat", 'rb') as f:
+        fields = f.read().rsplit(b')', 1)[1].split()
+    with open("/proc/uptime", 'rb') as f:
+        system_uptime = float(f.read().split()[0])
+    rss_bytes = threads = None
+    with open(f"/proc/{pid}/status", 'rb') as f:
+        for line in f:
+            if line.startswith(b"VmRSS:"):
+                rss_bytes = int(line.split()[1]) * 1024
+            elif line.startswith(b"Threads:"):
+                threads = int(line.split()[1])
+    try:
+        open_fds = len(os.listdir(f"/proc/{pid}/fd"))
+    except OSError:
+        open_fds = None
+    return {"uptime": round(system_uptime - int(fields[19]) / CLOCK_TICKS, 2), "cpu_ticks": int(fields[11]) + int(fields[12]),
+            "rss_bytes": rss_bytes, "threads": threads, "open_fds": open_fds}
+
+# 资源采样: 按固定间隔读取各组件进程的 /proc 数据，每个组件最近 history 个样本保存在内存的环形缓冲区中
+# pids_fn 返回 {组件名: [PID, ...]}，同一组件的多个进程合计；CPU 为两次采样之间的占用百分比 (单核为100%)
+class ResourceSampler:
+    def __init__(self, pids_fn, interval=SAMPLE_INTERVAL, history=SAMPLE_HISTORY):
+        self.pids_fn = pids_fn
+        self.interval = interval
+        self.history = history
+        self.samples = {}
+        self.cpu_ticks = {}
+        self.last_time = None
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
+    
+    def sample(self):
+        now = time.monotonic()
+        cpu_ticks = {}
+        records = {}
+        for name, pids in self.pids_fn().items():
+            record = {"time": round(time.time(), 3), "pids": [], "cpu": None, "rss_bytes": None, "threads": None, "open_fds": None}
+            cpu = 0
+            for pid in pids:
+                try:
+                    stats = process_stats(pid)
+                except (OSError, IndexError, ValueError):
+                    continue  # 进程已退出
+                cpu_ticks[pid] = stats["cpu_ticks"]
+                if pid in self.cpu_ticks:
+                    cpu += stats["cpu_ticks"] - self.cpu_ticks[pid]
+                    record["cpu"] = 0.0
+                record["pids"].append(pid)
+                for key in ("rss_bytes", "threads", "open_fds"):
+                    if stats[key] is not None:
+                        record[key] = (record[key] or 0) + stats[key]
+            if record["cpu"] is not None and now > self.last_time:
+                record["cpu"] = round(cpu / CLOCK_TICKS / (now - self.last_time) * 100, 1)
+            records[name] = record
+        with self.lock:
+            for name, record in records.items():
+                self.samples.setdefault(name, deque(maxlen=self.history)).append(record)
+            self.cpu_ticks = cpu_ticks
+            self.last_time = now
+    
+    def snapshot(self):
+        with self.lock:
+            return {name: list(samples) for name, samples in self.samples.items()}
+    
+    def run(self):
+        while True:
+            try:
+                self.sample()
+            except Exception as e:
+                get_logger("sampler").warning(f"资源采样失败: {e}")
+            if self.stopping.wait(self.interval):
+                break
+    
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="sampler", daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(1)
+
+# 将数值序列画成宽度为 width 的迷你折线 (缺失的样本显示为空格)；floor 为纵轴下限，默认取序列最小值
+def sparkline(values, width, floor=None):
+    values = values[-width:]
+    present = [v for v in values if v is not None]
+    if not present:
+        return " " * len(values)
+    low = min(present) if floor is None else floor
+    span = max(present) - low
+    return "".join(" " if v is None else SPARK_CHARS[int((v - low) / span * (len(SPARK_CHARS) - 1)) if span else 0]
+                   for v in values)
+
+# 本机 sing-box、cloudflared 和守护进程的 PID，供资源采样使用
+def managed_pids():
+    pids = {name: [pid] if pid else [] for name, pid in (
+        ("sing-box", running_pid(SB_PID_FILE) or next(iter(find_pids("sing-box")), None)),
+        ("cloudflared", running_pid(ARGO_PID_FILE) or next(iter(find_pids("cloudflared")), None)))}
+    supervisor_pid = running_pid(SUPERVISOR_PID_FILE)
+    if supervisor_pid:
+        pids["supervisor"] = [supervisor_pid]
+    return pids
+
+# 绘制一屏资源视图: 每个组件显示当前值、迷你折线和窗口内峰值
+def render_top(samples, interval, source):
+    columns = shutil.get_terminal_size((80, 24)).columns
+    width = max(10, min(SAMPLE_HISTORY, columns - 36))
+    metrics = (("CPU ", "cpu", lambda v: f"{v:.1f}%", 0), ("RSS ", "rss_bytes", lambda v: f"{v / 1024 / 1024:.1f}MB", None),
+               ("FD  ", "open_fds", str, None), ("线程", "threads", str, None))
+    out = ["\033[H\033[J", f"\033[36magsb top\033[0m  {datetime.now().strftime('%H:%M:%S')}  "
+                            f"采样间隔 {interval:g}s ({source})  最近 {width} 个样本  Ctrl+C 退出", ""]
+    for name, records in samples.items():
+        current = records[-1] if records else {}
+        pids = ",".join(map(str, current.get("pids") or [])) or "未运行"
+        out.append(f"\033[32m{name}\033[0m  PID {pids}")
+        for label, key, fmt, floor in metrics:
+            values = [record[key] for record in records]
+            present = [v for v in values[-width:] if v is not None]
+            value = fmt(current[key]) if current.get(key) is not None else "-"
+            peak = fmt(max(present)) if present else "-"
+            out.append(f"  {label} {value:>9} \033[33m{sparkline(values, width, floor)}\033[0m 峰值 {peak}")
+        out.append("")
+    sys.stdout.write("\n".join(out))
+    sys.stdout.flush()
+
+# 实时资源视图: 守护进程运行时显示它采集的历史 (采样间隔由守护进程决定，interval 为刷新间隔，默认与采样间隔相同)，
+# 否则在本进程中按 interval 采样；Ctrl+C 退出
+def show_top(interval=None):
+    sampler = None
+    try:
+        while True:
+            reply = control_request("samples")
+            if reply and reply.get("ok"):
+                refresh = interval or reply["interval"]
+                render_top(reply["samples"], reply["interval"], f"守护进程采样，每 {refresh:g}s 刷新")
+                time.sleep(refresh)
+                continue
+            if sampler is None:
+                sampler = ResourceSampler(managed_pids, interval or SAMPLE_INTERVAL)
+            sampler.sample()
+            render_top(sampler.snapshot(), sampler.interval, "本地采样")
+            time.sleep(sampler.interval)
+    except KeyboardInterrupt:
+        print()
+
+# 进程是否存在 (已退出但未被回收的僵尸进程视为已退出)
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+        with open(f"/proc/{pid}/stat", 'r') as f:
+            return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except (OSError, IndexError):
+        return False
+
+# 读取PID文件，进程仍在运行时返回PID
+def running_pid(pid_file):
+    try:
+        with open(str(pid_file), 'r') as f:
+            pid = int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+    return pid if process_alive(pid) else None
+
+# 停止进程: 先SIGTERM，超时后SIGKILL
+def stop_process(pid, timeout=5):
+    try:
+        os.kill(pid, 15)
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if not process_alive(pid):
+                return
+            time.sleep(0.05)
+        os.kill(pid, 9)
+    except OSError:
+        pass
+
+# 以毫秒级起步的指数退避重复探测，直到 probe() 成功或到达截止时间
+def wait_until(probe, deadline):
+    delay = READY_BACKOFF[0]
+    while not probe():
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, READY_BACKOFF[1])
+    return True
+
+# 探测本机端口能否建立TCP连接
+def probe_tcp(port):
+    try:
+        socket.create_connection(("127.0.0.1", port), timeout=1).close()
+        return True
+    except OSError:
+        return False
+
+# 发送 WebSocket 握手请求，收到 101 说明 sing-box 的 ws 入站已能处理请求
+def probe_websocket(port, path):
+    request = (f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+               f"Sec-WebSocket-Key: {base64.b64encode(os.urandom(16)).decode()}\r\nSec-WebSocket-Version: 13\r\n\r\n")
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=1) as sock:
+            sock.sendall(request.encode())
+            return sock.recv(1024).startswith(b"HTTP/1.1 101")
+    except OSError:
+        return False
+
+# 分阶段等待 sing-box 就绪: 先等端口可连接，再等 /{uuid}-vm 的 WebSocket 握手成功
+# 返回 (是否就绪, [(阶段, 耗时秒数)])
+def wait_singbox(port, uuid_str, timeout=READY_TIMEOUT):
+    deadline = time.time() + timeout
+    stages = []
+    for stage, probe in (("TCP端口", lambda: probe_tcp(port)),
+                         ("WebSocket握手", lambda: probe_websocket(port, f"/{uuid_str}-vm"))):
+        start_time = time.time()
+        with phase(f"sing-box {stage}"):
+            ready = wait_until(probe, deadline)
+        stages.append((stage, time.time() - start_time))
+        if not ready:
+            get_logger("services").error(f"sing-box 就绪检测失败: {stage}", stage=stage, timeout=timeout)
+            return False, stages
+    return True, stages
+
+# 等待cloudflared注册隧道连接，返回新的临时域名
+def wait_tunnel(timeout=60):
+    deadline = time.time() + timeout
+    domain = metrics_tunnel_domain(timeout, registered=True)
+    if domain is not False:
+        return domain
+    found = {}
+    def on_line(line):
+        domain_match = TUNNEL_DOMAIN_RE.search(line)
+        if domain_match:
+            found["domain"] = domain_match.group(1).decode()
+        elif b"Registered tunnel connection" in line:
+            found["registered"] = True
+        return found.get("registered") and found.get("domain")
+    return watch_log(LOG_FILE, on_line, max(0, deadline - time.time()))
+
+# 升级二进制文件: 只下载有新版本的程序，下载校验后 rename() 原子替换，
+# 只重启受影响的进程，并统计实际中断时间 (UUID、端口保持不变)
+def upgrade_binaries():
+    if not os.path.exists(str(CONFIG_FILE)):
+        print("未找到配置文件，请先安装")
+        sys.exit(1)
+    with open(str(CONFIG_FILE), 'r') as f:
+        config = json.load(f)
+    arch = detect_arch()
+    
+    # 有后台预取的新版本时直接使用，替换时只需从本地缓存取出
+    staged = {name: entry for name, entry in read_json(STAGED_FILE).items()
+              if entry.get("arch") == arch and time.time() - entry.get("time", 0) < PREFETCH_MAX_AGE}
+    if len(staged) >= 2:
+        print("使用后台预取的版本信息")
+        latest = {name: staged[name]["version"] for name in ("sing-box", "cloudflared")}
+    else:
+        print("检查版本...")
+        latest = {"sing-box": fetch_singbox_version(), "cloudflared": resolve_latest_tag("cloudflare/cloudflared")}
+    fetchers = {"sing-box": fetch_singbox, "cloudflared": fetch_cloudflared}
+    tasks = {}
+    for name in ("sing-box", "cloudflared"):
+        current = installed_version(name)
+        if not latest[name]:
+            print(f"{name}: 无法获取最新版本，跳过")
+        elif current == latest[name].lstrip("v"):
+            print(f"{name}: {current} 已是最新版本")
+        else:
+            print(f"{name}: {current or '未知'} -> {latest[name]}")
+            tasks[name] = current
+    if not tasks:
+        return
+    
+    # 新版本先下载到 .new 文件，验证可执行后再替换
+    DOWNLOAD_ABORT.clear()
+    with ThreadPoolExecutor(max_workers=len(tasks)) as pool:
+        futures = {name: pool.submit(fetchers[name], arch, str(INSTALL_DIR / f"{name}.new"), latest[name]) for name in tasks}
+    report = []
+    for name, future in futures.items():
+        new_path = INSTALL_DIR / f"{name}.new"
+        try:
+            ok = future.result() and binary_version(name, new_path) is not None
+        except Exception as e:
+            get_logger("upgrade").error(f"{name} 新版本验证出错", tool=name, error=str(e))
+            ok = False
+        if not ok:
+            print(f"{name} 新版本下载或验证失败，保留当前版本")
+            if os.path.exists(str(new_path)):
+                os.remove(str(new_path))
+            continue
+        
+        pid_file = SB_PID_FILE if name == "sing-box" else ARGO_PID_FILE
+        pid = running_pid(pid_file)
+        os.rename(str(new_path), str(INSTALL_DIR / name))  # 运行中的进程仍使用旧文件，不受影响
+        if not pid:
+            report.append((name, tasks[name], latest[name], None, "未运行，未重启"))
+            continue
+        
+        print(f"重启{name}...")
+        start_time = time.time()
+        supervisor_pid = running_pid(SUPERVISOR_PID_FILE)
+        if supervisor_pid:
+            # 由守护进程立即重启 (SIGUSR1: sing-box, SIGUSR2: cloudflared)，等到新进程启动后再检测
+            os.kill(supervisor_pid, signal.SIGUSR1 if name == "sing-box" else signal.SIGUSR2)
+            wait_until(lambda: running_pid(pid_file) not in (None, pid), time.time() + 15)
+        else:
+            stop_process(pid)
+            if name == "cloudflared":
+                open(str(LOG_FILE), 'w').close()  # 清空旧日志，避免读到旧域名
+            subprocess.run(str(INSTALL_DIR / ("start_sb.sh" if name == "sing-box" else "start_cf.sh")), shell=True)
+        if name == "sing-box":
+            ready = wait_singbox(config["port_vm_ws"], config["uuid_str"])[0]
+            note = "端口已恢复监听" if ready else "等待端口监听超时"
+        else:
+            domain = wait_tunnel()
+            ready = domain is not None
+            note = f"新临时域名: {domain}" if ready else "等待隧道注册超时"
+            if ready:
+                generate_links(domain, config["port_vm_ws"], config["uuid_str"])
+        downtime = time.time() - start_time
+        get_logger("upgrade").info(f"{name} 升级到 {latest[name]}", tool=name, version=latest[name], downtime=round(downtime, 3), note=note)
+        report.append((name, tasks[name], latest[name], downtime if ready else None, note))
+    
+    print("\033[36m╭───────────────────────────────────────────────────────────────╮\033[0m")
+    print("\033[36m│                \033[33m✨ 二进制文件升级结果 ✨                  \033[36m│\033[0m")
+    print("\033[36m├───────────────────────────────────────────────────────────────┤\033[0m")
+    for name, old, new, downtime, note in report:
+        cost = f"中断 {downtime:.2f}s" if downtime is not None else "-"
+        print(f"\033[36m│ \033[32m{name}: \033[0m{old or '未知'} -> {new}  {cost}  {note}")
+    print("\033[36m╰───────────────────────────────────────────────────────────────╯\033[0m")
+
+# 后台预取新版本: 下载并校验可运行后存入共享缓存，记录到 staged.json，
+# 之后 upgrade-binaries 只需从本地缓存取出再 rename()，不再等待网络
+def prefetch_binaries():
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    with open(str(CACHE_DIR / ".prefetch.lock"), 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            print("已有预取任务在运行")
+            return
+        arch = detect_arch()
+        tools = {
+            "sing-box": (fetch_singbox_version, fetch_singbox, arch),
+            "cloudflared": (lambda: resolve_latest_tag("cloudflare/cloudflared"), fetch_cloudflared, arch),
+        }
+        # 仅在已部署 hysteria2 时预取 hysteria，缓存键与 nginx-hysteria2.py 一致
+        if (Path.home() / ".hysteria2").exists():
+            tools["hysteria"] = (lambda: resolve_latest_tag("apernet/hysteria"), fetch_hysteria, f"linux-{arch}")
+        
+        staged = read_json(STAGED_FILE)
+        for name, (latest_version, fetch, cache_arch) in tools.items():
+            version = latest_version()
+            if not version:
+                get_logger("prefetch").warning(f"无法获取 {name} 最新版本", tool=name)
+                continue
+            entry = staged.get(name, {})
+            if entry.get("version") == version and entry.get("arch") == cache_arch:
+                entry["time"] = time.time()
+                continue
+            # 已安装的就是最新版本，只记录版本信息，无需下载
+            if name != "hysteria" and installed_version(name) == version.lstrip("v"):
+                staged[name] = {"version": version, "arch": cache_arch, "time": time.time()}
+                continue
+            staging_path = CACHE_DIR / f"{name}.{os.getpid()}.staging"
+            try:
+                ok = fetch(arch, str(staging_path), version)
+                # hysteria 不在本机运行验证，依赖缓存的SHA-256校验
+                if ok and name != "hysteria" and binary_version(name, staging_path) is None:
+                    ok = False
+                    with cache_index() as index:
+                        index.pop(f"{name}/{version}/{cache_arch}", None)
+            finally:
+                if staging_path.exists():
+                    os.remove(str(staging_path))
+            if ok:
+                staged[name] = {"version": version, "arch": cache_arch, "time": time.time()}
+                print(f"已预取 {name} {version}")
+                get_logger("prefetch").info(f"预取 {name} {version} 完成", tool=name, version=version)
+            else:
+                get_logger("prefetch").error(f"预取 {name} {version} 失败", tool=name, version=version)
+        write_json(STAGED_FILE, staged)
+
+# 将当前脚本复制到安装目录供 crontab 调用，通过管道运行无法定位脚本时返回None
+def install_script_copy():
+    script_copy = INSTALL_DIR / "agsb.py"
+    script_path = Path(__file__).resolve()
+    if not script_path.is_file():
+        print("无法定位脚本文件 (通过管道运行?)，请下载脚本后再运行")
+        return None
+    if script_path != script_copy:
+        shutil.copy2(str(script_path), str(script_copy))
+    return script_copy
+
+# 开启/关闭定时预取 (crontab，每6小时一次，分钟随机以错开请求)
+def set_prefetch_cron(enabled):
+    try:
+        crontab_list = subprocess.check_output("crontab -l 2>/dev/null || echo ''", shell=True).decode()
+        lines = [line for line in crontab_list.split('\n') if ".agsb/agsb.py prefetch" not in line]
+        if enabled:
+            script_copy = install_script_copy()
+            if not script_copy:
+                return False
+            lines.append(f"{random.randint(0, 59)} */6 * * * {sys.executable} {script_copy} prefetch >/dev/null 2>&1")
+        
+        new_crontab = '\n'.join(lines).strip() + '\n'
+        crontab_file = tempfile.mktemp()
+        with open(crontab_file, 'w') as f:
+            f.write(new_crontab)
+        subprocess.call("crontab {}".format(crontab_file), shell=True)
+        if os.path.exists(crontab_file):
+            os.unlink(crontab_file)
+        get_logger("prefetch").info(f"定时预取已{'开启' if enabled else '关闭'}", enabled=enabled)
+        return True
+    except Exception as e:
+        get_logger("prefetch").error("设置定时预取失败", error=str(e))
+        print(f"设置定时预取失败: {e}")
+        return False
+
+# 汇总机器可读的运行状态 (供 status --json / --prometheus 使用)，字段固定，取不到的值为 null
+def status_report():
+    report_start = time.perf_counter()
+    components = {}
+    for name, pid_file in (("sing-box", SB_PID_FILE), ("cloudflared", ARGO_PID_FILE)):
+        check_start = time.perf_counter()
+        pid = running_pid(pid_file) or next(iter(find_pids(name)), None)
+        component = {"up": False, "pid": None, "uptime": None, "rss_bytes": None, "open_fds": None, "listen": []}
+        if pid:
+            try:
+                stats = process_stats(pid)
+                component.update({key: stats[key] for key in ("uptime", "rss_bytes", "open_fds")}, up=True, pid=pid)
+                component["listen"] = [{"proto": proto, "port": port} for proto, port in process_ports([pid])]
+            except (OSError, IndexError, ValueError):
+                pass
+        component["check_ms"] = round((time.perf_counter() - check_start) * 1000, 3)
+        components[name] = component
+    
+    # 当前域名: 固定域名 > 守护进程内存中的临时域名 > argo.log 中最后出现的临时域名
+    check_start = time.perf_counter()
+    domain = None
+    argo_name_file = INSTALL_DIR / "sbargoym.log"
+    if os.path.exists(str(argo_name_file)):
+        with open(str(argo_name_file), 'r') as f:
+            domain = f.read().strip() or None
+    if not domain:
+        domain = (control_request("domain") or {}).get("domain")
+    if not domain and components["cloudflared"]["up"]:
+        match = last_match(LOG_FILE, TUNNEL_DOMAIN_RE)
+        domain = match.group(1).decode() if match else None
+    domain_ms = round((time.perf_counter() - check_start) * 1000, 3)
+    
+    check_start = time.perf_counter()
+    try:
+        with open(str(INSTALL_DIR / "allnodes.txt"), 'r') as f:
+            links = sum(1 for line in f if line.strip())
+    except OSError:
+        links = 0
+    links_ms = round((time.perf_counter() - check_start) * 1000, 3)
+    
+    return {"schema": 1, "host": socket.gethostname(), "time": round(time.time(), 3),
+            "up": all(component["up"] for component in components.values()),
+            "components": components, "domain": domain, "links": links,
+            "checks_ms": {"domain": domain_ms, "links": links_ms},
+            "duration_ms": round((time.perf_counter() - report_start) * 1000, 3)}
+
+# 将状态转换为 Prometheus 文本格式
+def prometheus_metrics(report, prefix="agsb"):
+    lines = [f"# TYPE {prefix}_up gauge", f"{prefix}_up {int(report['up'])}"]
+    gauges = (("component_up", "up"), ("process_uptime_seconds", "uptime"),
+              ("process_resident_memory_bytes", "rss_bytes"), ("process_open_fds", "open_fds"),
+              ("check_duration_seconds", "check_ms"))
+    for metric, key in gauges:
+        lines.append(f"# TYPE {prefix}_{metric} gauge")
+        for name, component in report["components"].items():
+            value = component[key]
+            if value is None:
+                continue
+            if key == "check_ms":
+                value = round(value / 1000, 6)
+            lines.append(f'{prefix}_{metric}{{component="{name}"}} {int(value) if isinstance(value, bool) else value}')
+    lines.append(f"# TYPE {prefix}_listening_port gauge")
+    for name, component in report["components"].items():
+        for sock in component["listen"]:
+            lines.append(f'{prefix}_listening_port{{component="{name}",proto="{sock["proto"]}",port="{sock["port"]}"}} 1')
+    lines.append(f"# TYPE {prefix}_links gauge")
+    lines.append(f"{prefix}_links {report['links']}")
+    if report["domain"]:
+        lines.append(f"# TYPE {prefix}_domain_info gauge")
+        lines.append(f'{prefix}_domain_info{{domain="{report["domain"]}"}} 1')
+    lines.append(f"# TYPE {prefix}_status_duration_seconds gauge")
+    lines.append(f"{prefix}_status_duration_seconds {round(report['duration_ms'] / 1000, 6)}")
+    return "\n".join(lines) + "\n"
+
 # 检查脚本运行状态
 def check_status():
+    # 守护进程运行时直接使用其内存中的状态
+    status = control_request("status")
+    if status:
+        return show_supervised_status(status)
     try:
         # 检查进程是否存在
-        sing_box_running = subprocess.run("pgrep -f 'sing-box'", shell=True, stdout=subprocess.PIPE).returncode == 0
-        cloudflared_running = subprocess.run("pgrep -f 'cloudflared'", shell=True, stdout=subprocess.PIPE).returncode == 0
+        sing_box_pids = find_pids("sing-box")
+        cloudflared_pids = find_pids("cloudflared")
+        sing_box_running = bool(sing_box_pids)
+        cloudflared_running = bool(cloudflared_pids)
         
         if sing_box_running and cloudflared_running and os.path.exists(str(LIST_FILE)):
             print("\033[36m╭───────────────────────────────────────────────────────────────╮\033[0m")
             print("\033[36m│                \033[33m✨ ArgoSB 运行状态 ✨                    \033[36m│\033[0m")
             print("\033[36m├───────────────────────────────────────────────────────────────┤\033[0m")
             print("\033[36m│ \033[32m服务状态: \033[33m正在运行\033[0m")
+            for name, pids in (("sing-box", sing_box_pids), ("cloudflared", cloudflared_pids)):
+                ports = ", ".join(f"{proto}/{port}" for proto, port in process_ports(pids)) or "无"
+                print(f"\033[36m│ \033[32m{name}: \033[0mPID {', '.join(map(str, pids))}, 监听 {ports}")
             
             argo_name_file = INSTALL_DIR / "sbargoym.log"
             if os.path.exists(str(argo_name_file)):
@@ -740,11 +2534,9 @@ def check_status():
             else:
                 # 读取临时域名
                 if os.path.exists(str(LOG_FILE)):
-                    with open(str(LOG_FILE), 'r') as f:
-                        log_content = f.read()
-                    domain_match = re.search(r'https://([a-zA-Z0-9\-]+\.trycloudflare\.com)', log_content)
+                    domain_match = last_match(LOG_FILE, TUNNEL_DOMAIN_RE)
                     if domain_match:
-                        argodomain = domain_match.group(1)
+                        argodomain = domain_match.group(1).decode()
                         print(f"\033[36m│ \033[32mArgo临时域名: \033[0m{argodomain}")
                     else:
                         print("\033[36m│ \033[31mArgo临时域名未生成，请重新安装\033[0m")
@@ -810,10 +2602,8 @@ def check_status():
 
 # 创建sing-box配置
 def create_sing_box_config(port_vm_ws, uuid_str):
-    write_debug_log(f"创建sing-box配置，端口: {port_vm_ws}, UUID: {uuid_str}")
-    
     ws_path = f"/{uuid_str}-vm"  # WebSocket路径
-    write_debug_log(f"WebSocket路径: {ws_path}")
+    get_logger("install").debug("创建sing-box配置", port=port_vm_ws, uuid=uuid_str, path=ws_path)
     
     # 创建配置字符串 - 保持与原始shell脚本一致的格式
     config_str = '''{
@@ -858,82 +2648,756 @@ def create_sing_box_config(port_vm_ws, uuid_str):
     with open(str(sb_config_file), 'w') as f:
         f.write(config_str)
     
-    write_debug_log(f"sing-box配置已写入文件: {sb_config_file}")
+    get_logger("install").debug("sing-box配置已写入", path=str(sb_config_file))
     
     return True
 
+# sing-box 与 cloudflared 的启动参数 (相对安装目录)，启动脚本和守护进程共用
+def service_commands(config):
+    cloudflared = ["./cloudflared", "tunnel", "--url", f"http://localhost:{config['port_vm_ws']}/{config['uuid_str']}-vm?ed=2048",
+                   "--edge-ip-version", "auto", "--no-autoupdate", "--protocol", "http2"]
+    # 指标服务只监听本机，用于直接查询临时域名
+    if config.get("metrics_port"):
+        cloudflared += ["--metrics", f"127.0.0.1:{config['metrics_port']}"]
+    return {"sing-box": ["./sing-box", "run", "-c", "sb.json"], "cloudflared": cloudflared}
+
 # 创建启动脚本
-def create_startup_script(port_vm_ws):
-    # 创建sing-box启动脚本
-    sb_start_script = INSTALL_DIR / "start_sb.sh"
-    with open(str(sb_start_script), 'w') as f:
-        f.write(f'''#!/bin/bash
+def create_startup_script(config):
+    commands = service_commands(config)
+    # 输出经 logpipe 按大小轮转写入日志；脚本副本或 python3 不可用时退回直接重定向
+    if Path(__file__).resolve().is_file():
+        install_script_copy()
+    script_copy = INSTALL_DIR / "agsb.py"
+    for name, log_name, pid_name in (("sing-box", "sb.log", "sbpid.log"), ("cloudflared", "argo.log", "sbargopid.log")):
+        command = shlex.join(commands[name])
+        start_script = INSTALL_DIR / ("start_sb.sh" if name == "sing-box" else "start_cf.sh")
+        with open(str(start_script), 'w') as f:
+            f.write(f'''#!/bin/bash
 cd {INSTALL_DIR}
-./sing-box run -c sb.json > sb.log 2>&1 & echo $! > sbpid.log
+if [ -f {script_copy} ] && command -v python3 >/dev/null 2>&1; then
+  {command} > >(exec python3 {script_copy} logpipe {log_name} >/dev/null 2>&1) 2>&1 & echo $! > {pid_name}
+else
+  {command} > {log_name} 2>&1 & echo $! > {pid_name}
+fi
 ''')
-    os.chmod(str(sb_start_script), 0o755)
+        os.chmod(str(start_script), 0o755)
     
-    # 创建cloudflared启动脚本
-    cf_start_script = INSTALL_DIR / "start_cf.sh"
-    with open(str(cf_start_script), 'w') as f:
-        f.write(f'''#!/bin/bash
-cd {INSTALL_DIR}
-./cloudflared tunnel --url http://localhost:{port_vm_ws}/$(cat config.json | grep -o '"uuid_str":"[^"]*"' | cut -d'"' -f4)-vm?ed=2048 --edge-ip-version auto --no-autoupdate --protocol http2 > argo.log 2>&1 & echo $! > sbargopid.log
-''')
-    os.chmod(str(cf_start_script), 0o755)
-    
-    write_debug_log("启动脚本已创建")
+    get_logger("install").debug("启动脚本已创建")
 
-# 启动服务
+# 启动服务: 先启动 sing-box，确认能完成 WebSocket 握手后再启动 cloudflared，记录各阶段耗时
 def start_services():
+    with open(str(CONFIG_FILE), 'r') as f:
+        config = json.load(f)
+    stages = []
+    
     print("正在启动sing-box服务...")
+    start_time = time.time()
     sb_start_script = INSTALL_DIR / "start_sb.sh"
-    subprocess.run(str(sb_start_script), shell=True)
+    with phase("启动sing-box"):
+        subprocess.run(str(sb_start_script), shell=True)
+    stages.append(("启动sing-box", time.time() - start_time))
+    
+    ready, ready_stages = wait_singbox(config["port_vm_ws"], config["uuid_str"])
+    stages.extend(ready_stages)
+    if not ready:
+        print(f"\033[31msing-box 未能在{READY_TIMEOUT}秒内就绪，请检查 {INSTALL_DIR / 'sb.log'}\033[0m")
     
     print("正在启动cloudflared服务...")
+    start_time = time.time()
     cf_start_script = INSTALL_DIR / "start_cf.sh"
-    subprocess.run(str(cf_start_script), shell=True)
+    with phase("启动cloudflared"):
+        subprocess.run(str(cf_start_script), shell=True)
+    stages.append(("启动cloudflared", time.time() - start_time))
+    
+    summary = ", ".join(f"{stage} {duration * 1000:.0f}ms" for stage, duration in stages)
+    print(f"启动耗时: {summary}")
+    get_logger("services").info("服务已启动", stages={stage: round(duration, 3) for stage, duration in stages})
+    return stages
+
+# 守护进程管理的子进程: 输出经管道写入日志文件，记录启动时间、重启次数和退出码
+class Service:
+    def __init__(self, name, command, log_file, pid_file, sticky=None):
+        self.name = name
+        self.command = command
+        self.log_file = log_file
+        self.pid_file = pid_file
+        self.sticky = sticky
+        self.log = None
+        self.process = None
+        self.pump_thread = None
+        self.state = "stopped"   # running / backoff / failed / stopped
+        self.started = None
+        self.restarts = 0
+        self.restart_times = []  # 最近的重启时间，用于限制重启频率
+        self.backoff = RESTART_BACKOFF[0]
+        self.next_start = 0
+        self.last_exit = None
     
-    print("等待服务启动...")
-    time.sleep(3)  # 等待服务完全启动
+    def start(self):
+        if self.pump_thread:
+            self.pump_thread.join(1)  # 上一个进程的输出写完后再轮转日志文件
+        self.log = RotatingLog(self.log_file, sticky=self.sticky)
+        self.process = subprocess.Popen(self.command, cwd=str(INSTALL_DIR), stdin=subprocess.DEVNULL,
+                                        stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        self.pump_thread = threading.Thread(target=self.pump, args=(self.process.stdout, self.log), daemon=True)
+        self.pump_thread.start()
+        with open(str(self.pid_file), 'w') as f:
+            f.write(str(self.process.pid))
+        self.state = "running"
+        self.started = time.time()
+        get_logger("supervisor").info(f"已启动 {self.name}", service=self.name, child_pid=self.process.pid)
     
-    write_debug_log("服务已启动")
+    # 逐行转存子进程输出，子进程退出后管道关闭，线程随之结束
+    def pump(self, stream, log):
+        with stream:
+            for line in iter(stream.readline, b""):
+                log.write(line)
+        log.close()
+    
+    def stop(self, timeout=5):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        if self.pump_thread:
+            self.pump_thread.join(1)
+        self.state = "stopped"
+    
+    def info(self):
+        running = self.state == "running"
+        return {"state": self.state, "pid": self.process.pid if running else None,
+                "started": self.started, "uptime": time.time() - self.started if running else 0,
+                "restarts": self.restarts, "last_exit": self.last_exit}
 
-# 获取tunnel域名
-def get_tunnel_domain():
-    retry_count = 0
-    domain = None
+# 守护进程: 以子进程方式运行 sing-box 和 cloudflared，退出后按指数退避重启，
+# 超过重启频率上限则放弃；状态写入 supervisor.json
+# 信号: SIGTERM/SIGINT 停止，SIGUSR1/SIGUSR2 立即重启 sing-box/cloudflared，SIGHUP 重启全部
+def supervise(refresh_links=True):
+    with open(str(CONFIG_FILE), 'r') as f:
+        config = json.load(f)
+    lock = open(str(INSTALL_DIR / "supervisor.lock"), 'a')
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        print("守护进程已在运行")
+        return False
+    with open(str(SUPERVISOR_PID_FILE), 'w') as f:
+        f.write(str(os.getpid()))
+    
+    # 接管由启动脚本启动的进程
+    for pid_file in (SB_PID_FILE, ARGO_PID_FILE):
+        pid = running_pid(pid_file)
+        if pid:
+            stop_process(pid)
     
-    while retry_count < 10:
-        if os.path.exists(str(LOG_FILE)):
+    commands = service_commands(config)
+    services = {
+        "sing-box": Service("sing-box", commands["sing-box"], INSTALL_DIR / "sb.log", SB_PID_FILE),
+        "cloudflared": Service("cloudflared", commands["cloudflared"], LOG_FILE, ARGO_PID_FILE, sticky=TUNNEL_DOMAIN_RE),
+    }
+    started = time.time()
+    stopping = threading.Event()
+    restart_requests = set()
+    sampler = ResourceSampler(lambda: {**{name: [service.process.pid] if service.state == "running" else []
+                                          for name, service in services.items()}, "supervisor": [os.getpid()]})
+    control_state = {"domain": None, "links": [], "links_mtime": None, "requests": {}}
+    control_lock = threading.Lock()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    signal.signal(signal.SIGINT, lambda *_: stopping.set())
+    signal.signal(signal.SIGUSR1, lambda *_: restart_requests.add("sing-box"))
+    signal.signal(signal.SIGUSR2, lambda *_: restart_requests.add("cloudflared"))
+    signal.signal(signal.SIGHUP, lambda *_: restart_requests.update(services))
+    
+    def save_state():
+        write_json(SUPERVISOR_STATE_FILE, {"pid": os.getpid(), "started": started,
+                                           "services": {name: service.info() for name, service in services.items()}})
+    
+    # 临时域名随 cloudflared 重启而变化，在后台等待新域名，需要时重新生成节点
+    def update_domain(generate):
+        domain = get_tunnel_domain()
+        with control_lock:
+            control_state["domain"] = domain
+        if domain and generate:
+            generate_links(domain, config["port_vm_ws"], config["uuid_str"])
+    
+    def launch(name):
+        services[name].start()
+        if name == "sing-box":
+            wait_singbox(config["port_vm_ws"], config["uuid_str"])
+        else:
+            with control_lock:
+                control_state["domain"] = None
+            threading.Thread(target=update_domain, args=(refresh_links or services[name].restarts,), daemon=True).start()
+        save_state()
+    
+    # 节点链接保存在内存中，allnodes.txt 被重新生成 (修改时间变化) 时才重新读取
+    def current_links():
+        links_file = INSTALL_DIR / "allnodes.txt"
+        try:
+            mtime = os.stat(str(links_file)).st_mtime
+        except OSError:
+            return []
+        with control_lock:
+            if control_state["links_mtime"] != mtime:
+                with open(str(links_file), 'r') as f:
+                    control_state["links"] = [line for line in f.read().splitlines() if line]
+                control_state["links_mtime"] = mtime
+            return control_state["links"]
+    
+    # 处理控制命令，全部使用内存中的状态
+    def handle_control(command):
+        with control_lock:
+            name = command.split()[0]
+            control_state["requests"][name] = control_state["requests"].get(name, 0) + 1
+            domain = control_state["domain"]
+        if command == "status":
+            return {"ok": True, "supervisor": {"pid": os.getpid(), "uptime": time.time() - started},
+                    "services": {name: service.info() for name, service in services.items()},
+                    "domain": domain, "links": len(current_links())}
+        if command == "links":
+            return {"ok": True, "links": current_links()}
+        if command == "domain":
+            return {"ok": True, "domain": domain}
+        if command == "reload":
+            # 重新读取配置并重启 sing-box (应用 sb.json 的修改)；cloudflared 不重启，临时域名保持不变
+            with open(str(CONFIG_FILE), 'r') as f:
+                config.update(json.load(f))
+            services["sing-box"].command = service_commands(config)["sing-box"]
+            with control_lock:
+                control_state["links_mtime"] = None
+            restart_requests.add("sing-box")
+            return {"ok": True}
+        if command.split()[0] == "tail" and len(command.split()) <= 3:
+            # tail <服务名> [行数]: 最近的日志行，直接取自内存
+            parts = command.split()
+            service = services.get(parts[1] if len(parts) > 1 else "")
+            if not service or not service.log or (len(parts) == 3 and not parts[2].isdigit()):
+                return {"ok": False, "error": f"用法: tail {{{'|'.join(services)}}} [行数]"}
+            return {"ok": True, "lines": service.log.lines(int(parts[2]) if len(parts) == 3 else LOG_TAIL_LINES)}
+        if command == "samples":
+            # 各组件最近的资源样本 (CPU、内存、文件描述符、线程)，供 top 显示
+            return {"ok": True, "interval": sampler.interval, "samples": sampler.snapshot()}
+        if command == "metrics":
+            with control_lock:
+                requests = dict(control_state["requests"])
+            return {"ok": True, "uptime": time.time() - started, "requests": requests,
+                    "services": {name: {"state": service.state, "uptime": service.info()["uptime"], "restarts": service.restarts,
+                                        "last_exit": service.last_exit} for name, service in services.items()}}
+        return {"ok": False, "error": f"未知命令: {command}"}
+    
+    def serve_client(conn):
+        with conn, conn.makefile('rwb') as stream:
+            for line in stream:
+                command = line.decode(errors='replace').strip()
+                if command:
+                    stream.write(json.dumps(handle_control(command), ensure_ascii=False).encode() + b"\n")
+                    stream.flush()
+    
+    def serve_control(server):
+        while not stopping.is_set():
             try:
-                with open(str(LOG_FILE), 'r') as f:
-                    log_content = f.read()
-                
-                domain_match = re.search(r'https://([a-zA-Z0-9\-]+\.trycloudflare\.com)', log_content)
-                if domain_match:
-                    domain = domain_match.group(1)
-                    write_debug_log(f"从日志中提取到域名: {domain}")
-                    print(f"获取到临时域名: {domain}")
-                    return domain
-            except Exception as e:
-                write_debug_log(f"读取日志文件出错: {e}")
-        
-        retry_count += 1
-        print(f"正在等待tunnel域名生成 (尝试 {retry_count}/10)...")
-        time.sleep(3)
+                conn, _ = server.accept()
+            except OSError:
+                break
+            threading.Thread(target=serve_client, args=(conn,), daemon=True).start()
+    
+    if os.path.exists(str(CONTROL_SOCKET)):
+        os.remove(str(CONTROL_SOCKET))  # 上次异常退出留下的 socket 文件
+    control_server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    control_server.bind(str(CONTROL_SOCKET))
+    os.chmod(str(CONTROL_SOCKET), 0o600)
+    control_server.listen(16)
+    threading.Thread(target=serve_control, args=(control_server,), daemon=True).start()
     
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 守护进程已启动 (PID {os.getpid()})")
+    launch("sing-box")
+    launch("cloudflared")
+    sampler.start()
+    try:
+        while not stopping.wait(0.5):
+            now = time.time()
+            rotate_supervisor_log()
+            for name in [n for n in services if n in restart_requests]:
+                restart_requests.discard(name)
+                get_logger("supervisor").info(f"按请求重启 {name}", service=name)
+                services[name].stop()
+                services[name].restarts += 1
+                launch(name)
+            
+            for name, service in services.items():
+                if service.state == "running" and service.process.poll() is not None:
+                    service.last_exit = service.process.returncode
+                    if now - service.started >= RESTART_STABLE:
+                        service.backoff = RESTART_BACKOFF[0]
+                    service.restart_times = [t for t in service.restart_times if now - t < RESTART_LIMIT[1]]
+                    if len(service.restart_times) >= RESTART_LIMIT[0]:
+                        service.state = "failed"
+                        message = f"{name} {RESTART_LIMIT[1]}秒内已重启{RESTART_LIMIT[0]}次，不再重启"
+                    else:
+                        service.state = "backoff"
+                        service.next_start = now + service.backoff
+                        message = f"{name} 已退出 (退出码 {service.last_exit})，{service.backoff}秒后重启"
+                        service.backoff = min(service.backoff * 2, RESTART_BACKOFF[1])
+                    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}")
+                    get_logger("supervisor").warning(message, service=name, exit_code=service.last_exit, state=service.state)
+                    save_state()
+                elif service.state == "backoff" and now >= service.next_start:
+                    service.restart_times.append(now)
+                    service.restarts += 1
+                    launch(name)
+    finally:
+        sampler.stop()
+        control_server.close()
+        if os.path.exists(str(CONTROL_SOCKET)):
+            os.remove(str(CONTROL_SOCKET))
+        for name in ("cloudflared", "sing-box"):
+            services[name].stop()
+        save_state()
+        if os.path.exists(str(SUPERVISOR_PID_FILE)):
+            os.remove(str(SUPERVISOR_PID_FILE))
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 守护进程已停止")
+    return True
+
+# 向守护进程的控制接口发送命令，守护进程未运行时返回None
+def control_request(command, timeout=2):
+    if not os.path.exists(str(CONTROL_SOCKET)):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(str(CONTROL_SOCKET))
+            sock.sendall(command.encode() + b"\n")
+            with sock.makefile('rb') as stream:
+                return json.loads(stream.readline())
+    except (OSError, ValueError):
+        return None
+
+# 按守护进程返回的状态显示运行信息和节点链接
+def show_supervised_status(status):
+    print("\033[36m╭───────────────────────────────────────────────────────────────╮\033[0m")
+    print("\033[36m│                \033[33m✨ ArgoSB 运行状态 ✨                    \033[36m│\033[0m")
+    print("\033[36m├───────────────────────────────────────────────────────────────┤\033[0m")
+    print(f"\033[36m│ \033[32m守护进程: \033[33m正在运行\033[0m (PID {status['supervisor']['pid']}, 已运行 {status['supervisor']['uptime'] / 3600:.1f} 小时)")
+    for name, info in status["services"].items():
+        if info["state"] == "running":
+            print(f"\033[36m│ \033[32m{name}: \033[0mPID {info['pid']}, 已运行 {info['uptime'] / 3600:.1f} 小时, 重启 {info['restarts']} 次")
+        else:
+            print(f"\033[36m│ \033[32m{name}: \033[31m{info['state']}\033[0m (重启 {info['restarts']} 次, 退出码 {info['last_exit']})")
+    print(f"\033[36m│ \033[32mArgo临时域名: \033[0m{status['domain'] or '等待生成'}")
+    links = (control_request("links") or {}).get("links", [])
+    if links:
+        print("\033[36m├───────────────────────────────────────────────────────────────┤\033[0m")
+        print("\033[36m│ \033[33m直接格式节点链接:\033[0m")
+        for link in links:
+            print(link)
+    print("\033[36m╰───────────────────────────────────────────────────────────────╯\033[0m")
+    return all(info["state"] == "running" for info in status["services"].values())
+
+# 在后台启动守护进程 (fork 后脱离终端，输出写入 supervisor.log)
+# 将标准输出和标准错误以追加方式重定向到 path
+def redirect_output(path):
+    sys.stdout.flush()
+    sys.stderr.flush()
+    log_fd = os.open(str(path), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    os.dup2(log_fd, 1)
+    os.dup2(log_fd, 2)
+    os.close(log_fd)
+
+# 后台守护进程的输出写入 supervisor.log: 超过一段大小时轮转并重新打开 (前台运行时输出不是该文件，不做处理)
+def rotate_supervisor_log():
+    try:
+        st = os.fstat(1)
+        if st.st_size < LOG_SEGMENT_BYTES or st.st_ino != os.stat(str(SUPERVISOR_LOG)).st_ino:
+            return
+    except OSError:
+        return
+    sys.stdout.flush()
+    rotate_log(SUPERVISOR_LOG)
+    redirect_output(SUPERVISOR_LOG)
+
+def start_supervisor(refresh_links=True):
+    global PROFILE_ENABLED
+    if running_pid(SUPERVISOR_PID_FILE):
+        print("守护进程已在运行")
+        return
+    DEBUG_LOG_BUFFER.flush()
+    with warnings.catch_warnings():
+        # Python 3.12+ 对多线程进程 fork 发出警告；子进程中的锁由 reset_after_fork 重新创建
+        warnings.simplefilter("ignore", DeprecationWarning)
+        pid = os.fork()
+    if pid:
+        print(f"守护进程已在后台启动 (PID {pid})，日志: {SUPERVISOR_LOG}")
+        return
+    os.setsid()
+    # 安装时开启的阶段计时不带入守护进程，否则每次重启 sing-box 都会累积不再写出的记录
+    PROFILE_ENABLED = False
+    PROFILE_EVENTS.clear()
+    null_fd = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(null_fd, 0)
+    redirect_output(SUPERVISOR_LOG)
+    sys.stdout.reconfigure(line_buffering=True)
+    rotate_supervisor_log()
+    try:
+        supervise(refresh_links)
+    finally:
+        DEBUG_LOG_BUFFER.flush()  # os._exit 不执行 atexit
+        os._exit(0)
+
+# fork 时其他线程 (日志写入、未结束的竞速下载等) 可能正持有模块级的锁，子进程中重新创建；
+# 连接池中的连接与父进程共用 socket，子进程不再复用
+def reset_after_fork():
+    global PRINT_LOCK, MIRROR_LOCK, PROFILE_LOCK, HTTP_POOL, HTTP_POOL_LOCK, HISTORY_LOCK, RELEASE_LOCK, DOWNLOAD_ABORT
+    PRINT_LOCK, MIRROR_LOCK, PROFILE_LOCK = threading.Lock(), threading.Lock(), threading.Lock()
+    HISTORY_LOCK, RELEASE_LOCK = threading.Lock(), threading.Lock()
+    HTTP_POOL, HTTP_POOL_LOCK = {}, threading.Lock()
+    DOWNLOAD_ABORT = threading.Event()
+    DEBUG_LOG_BUFFER.after_fork()
+
+os.register_at_fork(after_in_child=reset_after_fork)
+
+# 创建 inotify 监视 (通过libc)，监视目录以便文件被重建或截断时也能收到通知；不可用时返回None
+def inotify_watch(directory):
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return None
+        # IN_MODIFY | IN_MOVED_TO | IN_CREATE
+        if libc.inotify_add_watch(fd, os.fsencode(str(directory)), 0x002 | 0x080 | 0x100) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
+# 增量跟踪日志: 从 offset 开始读取新行交给 on_line，返回其第一个真值结果，超时返回None；日志轮转时读完旧文件再切换到新文件
+# 有 inotify 时等待文件变化事件，否则以短间隔轮询
+def watch_log(path, on_line, timeout, offset=0):
+    deadline = time.time() + timeout
+    pending = b""
+    f = None
+    fd = inotify_watch(Path(path).parent)
+    try:
+        while True:
+            chunk = b""
+            try:
+                if f is None:
+                    f = open(str(path), 'rb')
+                    f.seek(offset)
+                st = os.stat(str(path))
+                if st.st_ino != os.fstat(f.fileno()).st_ino:
+                    chunk = f.read()  # 日志已轮转: 读完旧文件剩余内容后从头读取新文件
+                    f.close()
+                    f = open(str(path), 'rb')
+                    chunk += f.read()
+                elif st.st_size < f.tell():
+                    f.seek(0)  # 日志被截断，从头读取
+                    pending = b""
+                    chunk = f.read()
+                else:
+                    chunk = f.read()
+            except OSError:
+                pass
+            if chunk:
+                lines = (pending + chunk).split(b"\n")
+                pending = lines.pop()
+                for line in lines:
+                    result = on_line(line)
+                    if result:
+                        return result
+            
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            if fd is None:
+                time.sleep(min(remaining, LOG_POLL_INTERVAL))
+                continue
+            if select.select([fd], [], [], min(remaining, 1.0))[0]:
+                try:
+                    while os.read(fd, 4096):
+                        pass
+                except BlockingIOError:
+                    pass
+    finally:
+        if f is not None:
+            f.close()
+        if fd is not None:
+            os.close(fd)
+
+# 从 cloudflared 本机指标服务查询临时域名 (/quicktunnel)，registered=True 时还要等 /ready 确认隧道已注册
+# 指标服务不可用 (旧的启动脚本、旧版本cloudflared) 时返回False，由调用方改为跟踪日志；超时返回None
+def metrics_tunnel_domain(timeout, registered=False):
+    try:
+        with open(str(CONFIG_FILE), 'r') as f:
+            metrics_port = json.load(f).get("metrics_port")
+        with open(str(INSTALL_DIR / "start_cf.sh"), 'r') as f:
+            if f"--metrics 127.0.0.1:{metrics_port}" not in f.read():
+                return False
+    except (OSError, ValueError):
+        return False
+    
+    base_url = f"http://127.0.0.1:{metrics_port}"
+    start_time = time.time()
+    reachable = False
+    while time.time() - start_time < timeout:
+        try:
+            status, _, body = http_request("GET", f"{base_url}/quicktunnel", retries=0, timeout=1)
+            reachable = True
+            if status == 404:
+                get_logger("tunnel").debug("cloudflared 指标服务不支持 /quicktunnel")
+                return False
+            hostname = json.loads(body.decode()).get("hostname") if status == 200 else None
+            if hostname and (not registered or http_request("GET", f"{base_url}/ready", retries=0, timeout=1)[0] == 200):
+                return hostname
+        except (OSError, ValueError, http.client.HTTPException) as e:
+            if not reachable and time.time() - start_time > METRICS_WAIT:
+                get_logger("tunnel").debug("无法连接 cloudflared 指标服务", error=str(e))
+                return False
+        time.sleep(0.05)
+    return None
+
+# 获取tunnel域名: 优先查询 cloudflared 指标服务，不可用时跟踪 argo.log，域名一出现立即返回
+def get_tunnel_domain(timeout=TUNNEL_TIMEOUT):
+    print("等待tunnel域名生成...")
+    start_time = time.time()
+    domain = metrics_tunnel_domain(timeout)
+    source = "指标服务"
+    if domain is False:
+        def on_line(line):
+            domain_match = TUNNEL_DOMAIN_RE.search(line)
+            return domain_match and domain_match.group(1).decode()
+        domain = watch_log(LOG_FILE, on_line, max(0, timeout - (time.time() - start_time)))
+        source = "日志"
+    if domain:
+        get_logger("tunnel").info(f"从{source}获取到域名", domain=domain, source=source, seconds=round(time.time() - start_time, 3))
+        print(f"获取到临时域名: {domain}")
+    else:
+        get_logger("tunnel").error(f"{timeout:.0f}秒内未在日志中找到域名", timeout=timeout)
+    return domain
+
+# 汇总下载历史: 各下载源的次数、失败数、流量、首字节时间与吞吐量
+def show_download_stats():
+    history = load_download_history()
+    if not history:
+        print(f"暂无下载记录 ({HISTORY_FILE})")
+        return
+    scores = source_scores(history)
+    by_source = {}
+    for entry in history:
+        by_source.setdefault(entry["source"], []).append(entry)
+    
+    print("\033[36m╭───────────────────────────────────────────────────────────────╮\033[0m")
+    print("\033[36m│                \033[33m✨ 下载统计 ✨                          \033[36m│\033[0m")
+    print("\033[36m├───────────────────────────────────────────────────────────────┤\033[0m")
+    print(f"\033[36m│ \033[32m{'下载源':<24}{'次数':>6}{'失败':>6}{'流量':>10}{'首字节':>9}{'中位速度':>12}{'评分':>12}\033[0m")
+    for source, entries in sorted(by_source.items(), key=lambda item: -scores.get(item[0], 0)):
+        ok_entries = [e for e in entries if e["ok"]]
+        speeds = sorted(e["speed"] for e in ok_entries)
+        ttfbs = [e["ttfb"] for e in ok_entries if e["ttfb"] is not None]
+        total_mb = sum(e["bytes"] for e in entries) / 1024 / 1024
+        median = f"{speeds[len(speeds) // 2] / 1024 / 1024:.2f}MB/s" if speeds else "-"
+        ttfb = f"{sum(ttfbs) / len(ttfbs) * 1000:.0f}ms" if ttfbs else "-"
+        score = f"{scores[source] / 1024 / 1024:.2f}MB/s" if source in scores else "-"
+        print(f"\033[36m│ \033[0m{source:<24}{len(entries):>6}{len(entries) - len(ok_entries):>6}{total_mb:>8.1f}MB{ttfb:>9}{median:>12}{score:>12}")
+    print("\033[36m├───────────────────────────────────────────────────────────────┤\033[0m")
+    print("\033[36m│ \033[32m最近下载:\033[0m")
+    for entry in history[-5:]:
+        when = datetime.fromtimestamp(entry["time"]).strftime('%Y-%m-%d %H:%M:%S')
+        result = f"{entry['bytes'] / 1024 / 1024:.1f}MB {entry['duration']:.1f}s {entry['speed'] / 1024 / 1024:.2f}MB/s" if entry["ok"] else "\033[31m失败\033[0m"
+        print(f"\033[36m│ \033[0m{when} {entry.get('label') or '-':<12}{entry['source']:<24}{result}")
+    print("\033[36m╰───────────────────────────────────────────────────────────────╯\033[0m")
+
+# 汇总一段 sing-box 日志 (完整行) 到 stats
+def analyze_sb_chunk(chunk, stats):
+    if b"\x1b[" in chunk:
+        chunk = ANSI_RE.sub(b"", chunk)
+    minutes = stats["minutes"]
+    destinations = stats["destinations"]
+    # 日志按时间顺序写入: 同一分钟的最后一行之后即为下一分钟，按分钟切分后在每段内计数
+    spans = []
+    pos = 0
+    while pos < len(chunk):
+        match = SB_TIME_RE.match(chunk, pos)
+        if not match:
+            pos = chunk.find(b"\n", pos) + 1 or len(chunk)  # 无时间戳的行 (如多行错误信息)
+            continue
+        # 从下一行开始按加倍的步长向后探测，找到一行已不属于这一分钟的位置，只在该范围内查找这一分钟的最后一行
+        # (从块末尾 rfind 的耗时与块大小 × 分钟数成正比，日志稀疏时每行都是新的一分钟)
+        key = match.group(1) + b":"
+        window = match.end() - pos
+        while True:
+            probe = chunk.find(b"\n", pos + window) + 1
+            following = SB_TIME_RE.match(chunk, probe) if probe else None
+            if not following or following.group(1) != match.group(1):
+                break
+            window *= 2
+        last = max(chunk.rfind(key, pos, probe or len(chunk)), pos)
+        end = chunk.find(b"\n", last) + 1 or len(chunk)
+        spans.append((pos, match.group(1).decode()))
+        count = chunk.count(SB_CONNECTION, pos, end)
+        stats["connections"] += count
+        minutes.setdefault(spans[-1][1], [0, 0])[0] += count
+        pos = end
+    starts = [start for start, _ in spans]
+    for host, count in Counter(SB_DESTINATION_RE.findall(chunk)).items():
+        host = host.decode(errors='replace')
+        host = host.rsplit(":", 1)[0].strip("[]") if ":" in host else host
+        destinations[host] = destinations.get(host, 0) + count
+    for match in SB_ERROR_RE.finditer(chunk):
+        kind = next((name for name, pattern in SB_ERROR_CLASSES if pattern.search(match.group(1))), "other")
+        stats["errors"][kind] = stats["errors"].get(kind, 0) + 1
+        index = bisect.bisect_right(starts, match.start()) - 1
+        if index >= 0:
+            minutes[spans[index][1]][1] += 1
+    if len(destinations) > STATS_DESTINATIONS * 2:
+        stats["destinations"] = dict(sorted(destinations.items(), key=lambda item: -item[1])[:STATS_DESTINATIONS])
+
+# 从 offset 开始处理 stream 中的完整行，返回处理到的位置 (不完整的末行留到下次)
+def analyze_sb_stream(stream, offset, stats):
+    pending = b""
+    while True:
+        data = stream.read(STATS_CHUNK_BYTES)
+        if not data:
+            break
+        data = pending + data
+        end = data.rfind(b"\n") + 1
+        pending = data[end:]
+        if end:
+            analyze_sb_chunk(data[:end], stats)
+            offset += end
+            stats["bytes"] += end
+    return offset
+
+# 增量分析 sb.log: 只处理上次之后新增的字节；当前段已被轮转时，先从压缩段中读完上次剩余的部分
+def sb_log_stats(log_path=None, reset=False):
+    log_path = Path(log_path or INSTALL_DIR / "sb.log")
+    stats = None if reset else read_json(SB_STATS_FILE)
+    if not stats or stats.get("version") != 1:
+        stats = {"version": 1, "state": {}, "bytes": 0, "connections": 0, "errors": {}, "destinations": {}, "minutes": {}}
+    state = stats["state"]
+    start_time = time.time()
+    try:
+        current = open(str(log_path), 'rb')
+    except OSError:
+        current = None
+    head = current.read(64) if current else b""
+    known = state.get("head", "").encode('latin-1')
+    
+    # 当前段不再是上次处理的文件 (已轮转或被重写)
+    if known and (not current or os.fstat(current.fileno()).st_ino != state["inode"] or not head.startswith(known)):
+        # 按段首字节找到上次处理的段，从记录的位置读完，再处理之后轮转出的各段
+        archived = [log_path.with_name(f"{log_path.name}.{i}.gz") for i in range(LOG_SEGMENTS, 0, -1)]
+        resume = None
+        for index, segment in enumerate(archived):
+            try:
+                with gzip.open(str(segment), 'rb') as f:
+                    if f.read(len(known)) == known:
+                        resume = index
+                        break
+            except (OSError, EOFError):
+                continue
+        if resume is None:
+            # 上次的段已被删除 (轮转过多) 或被原地重写，只处理上次运行之后轮转出的段
+            stats["gaps"] = stats.get("gaps", 0) + 1
+            archived = [p for p in archived if p.exists() and p.stat().st_mtime > stats.get("updated", 0)]
+        for index, segment in enumerate(archived[resume or 0:]):
+            try:
+                with gzip.open(str(segment), 'rb') as f:
+                    if index == 0 and resume is not None:
+                        f.seek(state["offset"])
+                    analyze_sb_stream(f, 0, stats)
+            except (OSError, EOFError):
+                continue
+        state.clear()
+    
+    if current:
+        with current:
+            if os.fstat(current.fileno()).st_size < state.get("offset", 0):
+                state.clear()  # 文件被截断，从头开始
+            current.seek(state.get("offset", 0))
+            state["offset"] = analyze_sb_stream(current, state.get("offset", 0), stats)
+            state["inode"] = os.fstat(current.fileno()).st_ino
+            state["head"] = head.decode('latin-1')
+    
+    # 只保留最近的分钟计数
+    if len(stats["minutes"]) > STATS_MINUTES:
+        stats["minutes"] = dict(sorted(stats["minutes"].items())[-STATS_MINUTES:])
+    stats["updated"] = time.time()
+    stats["elapsed"] = time.time() - start_time
+    write_json(SB_STATS_FILE, stats)
+    return stats
+
+# 显示 sing-box 日志分析结果
+def show_sb_stats(stats):
+    minutes = sorted(stats["minutes"].items())
+    recent = minutes[-10:]
+    peak = max(minutes, key=lambda item: item[1][0], default=None)
+    print("\033[36m╭───────────────────────────────────────────────────────────────╮\033[0m")
+    print("\033[36m│                \033[33m✨ sing-box 日志统计 ✨                  \033[36m│\033[0m")
+    print("\033[36m├───────────────────────────────────────────────────────────────┤\033[0m")
+    print(f"\033[36m│ \033[32m已处理: \033[0m{stats['bytes'] / 1024 / 1024:.1f}MB   \033[32m本次耗时: \033[0m{stats['elapsed'] * 1000:.0f}ms"
+          + (f"   \033[33m日志缺口: {stats['gaps']}\033[0m" if stats.get("gaps") else ""))
+    total_errors = sum(stats["errors"].values())
+    print(f"\033[36m│ \033[32m连接数: \033[0m{stats['connections']}   \033[32m错误数: \033[0m{total_errors}")
+    if total_errors:
+        print("\033[36m│ \033[32m错误分类: \033[0m" + ", ".join(f"{kind} {count}" for kind, count in sorted(stats["errors"].items(), key=lambda item: -item[1])))
+    print("\033[36m├───────────────────────────────────────────────────────────────┤\033[0m")
+    print("\033[36m│ \033[32m访问最多的目标:\033[0m")
+    for host, count in sorted(stats["destinations"].items(), key=lambda item: -item[1])[:10]:
+        print(f"\033[36m│ \033[0m{count:>8}  {host}")
+    if recent:
+        print("\033[36m├───────────────────────────────────────────────────────────────┤\033[0m")
+        print("\033[36m│ \033[32m最近每分钟 (连接/错误):\033[0m")
+        for minute, (connections, errors) in recent:
+            print(f"\033[36m│ \033[0m{minute}  {connections:>6} / {errors:<6}")
+        print(f"\033[36m│ \033[32m峰值: \033[0m{peak[0]} {peak[1][0]} 个连接/分钟")
+    print("\033[36m╰───────────────────────────────────────────────────────────────╯\033[0m")
+
+# 读取命令行选项的值，如 --bundle FILE
+def option_value(args, name):
+    if name in args:
+        index = args.index(name)
+        if index + 1 < len(args):
+            return args[index + 1]
+        print(f"选项 {name} 缺少参数")
+        sys.exit(1)
     return None
 
 # 主函数
 def main():
-    print_info()
+    # 机器可读输出不打印横幅
+    if not ({"--json", "--prometheus"} & set(sys.argv[2:]) or sys.argv[1:2] in (["ctl"], ["logs"], ["logpipe"], ["top"])):
+        print_info()
     
     # 检查命令行参数
     if len(sys.argv) > 1:
         action = sys.argv[1].lower()
         if action == "install":
-            install()
+            bundle_path = option_value(sys.argv[2:], "--bundle")
+            if bundle_path:
+                bundle_path = os.path.abspath(bundle_path)
+            trace_path = option_value(sys.argv[2:], "--profile")
+            install(bundle_path, os.path.abspath(trace_path) if trace_path else PROFILE_FILE)
+            sys.exit(0)
+        elif action == "downloads":
+            if len(sys.argv) < 3 or sys.argv[2] != "stats":
+                print_usage()
+                sys.exit(1)
+            show_download_stats()
+            sys.exit(0)
+        elif action == "bundle":
+            if len(sys.argv) < 3 or sys.argv[2] != "create":
+                print_usage()
+                sys.exit(1)
+            args = sys.argv[3:]
+            arches = option_value(args, "--arch")
+            if arches:
+                args = args[:args.index("--arch")] + args[args.index("--arch") + 2:]
+            bundle_path = args[0] if args else f"agsb-bundle-{datetime.now().strftime('%Y%m%d')}.tar.gz"
+            bundle_create(os.path.abspath(bundle_path), arches.split(",") if arches else BUNDLE_ARCHES)
             sys.exit(0)
         elif action in ["uninstall", "del", "delete", "remove"]:
             uninstall()
@@ -941,14 +3405,128 @@ def main():
         elif action == "update" or action == "upgrade":
             upgrade()
             sys.exit(0)
+        elif action == "upgrade-binaries":
+            upgrade_binaries()
+            sys.exit(0)
+        elif action == "prefetch":
+            sub = sys.argv[2] if len(sys.argv) > 2 else "run"
+            if sub == "run":
+                prefetch_binaries()
+            elif sub in ("enable", "disable"):
+                if set_prefetch_cron(sub == "enable"):
+                    print(f"定时预取已{'开启' if sub == 'enable' else '关闭'}")
+            else:
+                print_usage()
+                sys.exit(1)
+            sys.exit(0)
+        elif action == "ctl":
+            # 直接查询守护进程控制接口，输出JSON
+            reply = control_request(" ".join(sys.argv[2:]) or "status")
+            if reply is None:
+                print("守护进程未运行")
+                sys.exit(1)
+            print(json.dumps(reply, ensure_ascii=False, indent=2))
+            sys.exit(0 if reply.get("ok") else 1)
+        elif action == "top":
+            # top [--interval 秒]: 实时显示各组件的 CPU、内存、文件描述符和线程数
+            interval = option_value(sys.argv[2:], "--interval")
+            try:
+                interval = float(interval) if interval else None
+            except ValueError:
+                interval = 0
+            if interval is not None and interval <= 0:
+                print_usage()
+                sys.exit(1)
+            show_top(interval)
+            sys.exit(0)
+        elif action == "logpipe":
+            # 由启动脚本调用: 从标准输入读取子进程输出并轮转写入日志
+            if len(sys.argv) < 3:
+                print_usage()
+                sys.exit(1)
+            log_pipe(os.path.abspath(sys.argv[2]))
+            sys.exit(0)
+        elif action == "logs" and sys.argv[2:3] == ["stats"]:
+            # logs stats [--reset] [--json|--quiet]: 增量分析 sb.log，可每分钟由 cron 运行
+            if not INSTALL_DIR.exists():
+                print(f"未找到安装目录 {INSTALL_DIR}")
+                sys.exit(1)
+            lock = open(str(INSTALL_DIR / "sb-stats.lock"), 'a')
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            stats = sb_log_stats(reset="--reset" in sys.argv[3:])
+            if "--json" in sys.argv[3:]:
+                print(json.dumps(stats, ensure_ascii=False))
+            elif "--quiet" not in sys.argv[3:]:
+                show_sb_stats(stats)
+            sys.exit(0)
+        elif action == "logs":
+            # logs [sb|argo|debug|supervisor] [行数] [--grep 正则] [--follow]
+            # 守护进程运行时直接取内存中的最近日志，否则从文件末尾向前读取
+            logs = {"sb": ("sing-box", INSTALL_DIR / "sb.log"), "argo": ("cloudflared", LOG_FILE),
+                    "debug": (None, DEBUG_LOG), "supervisor": (None, SUPERVISOR_LOG)}
+            args = sys.argv[2:]
+            grep = option_value(args, "--grep")
+            if grep is not None:
+                del args[args.index("--grep"):args.index("--grep") + 2]
+            follow = bool({"--follow", "-f"} & set(args))
+            args = [arg for arg in args if arg not in ("--follow", "-f")]
+            name = args[0] if args else "sb"
+            count = args[1] if len(args) > 1 else "50"
+            if name not in logs or not count.isdigit() or len(args) > 2:
+                print_usage()
+                sys.exit(1)
+            try:
+                pattern = re.compile(grep.encode()) if grep is not None else None
+            except re.error as e:
+                print(f"无效的正则表达式: {e}")
+                sys.exit(1)
+            service, path = logs[name]
+            reply = control_request(f"tail {service} {count}") if service and not pattern else None
+            for line in reply["lines"] if reply and reply.get("ok") else log_tail(path, int(count), pattern):
+                print(line)
+            if follow:
+                # 从当前末尾继续输出新增的行，日志轮转后自动切换到新文件
+                def print_line(line):
+                    if not pattern or pattern.search(line):
+                        print(line.decode(errors='replace'), flush=True)
+                try:
+                    watch_log(path, print_line, float("inf"), offset=os.path.getsize(str(path)) if os.path.exists(str(path)) else 0)
+                except KeyboardInterrupt:
+                    pass
+            sys.exit(0)
+        elif action == "supervise":
+            sub = sys.argv[2] if len(sys.argv) > 2 else None
+            if sub == "-d":
+                start_supervisor()
+            elif sub == "stop":
+                supervisor_pid = running_pid(SUPERVISOR_PID_FILE)
+                if supervisor_pid:
+                    stop_process(supervisor_pid, timeout=15)
+                    print("守护进程已停止")
+                else:
+                    print("守护进程未运行")
+            elif sub is None:
+                supervise()
+            else:
+                print_usage()
+                sys.exit(1)
+            sys.exit(0)
         elif action == "status":
-            if not check_status():
+            if "--json" in sys.argv[2:]:
+                print(json.dumps(status_report(), ensure_ascii=False))
+            elif "--prometheus" in sys.argv[2:]:
+                sys.stdout.write(prometheus_metrics(status_report()))
+            elif not check_status():
                 pass
             sys.exit(0)
         elif action == "cat":
             # 新增cat命令，直接输出所有节点
             all_nodes_file = INSTALL_DIR / "allnodes.txt"
-            if os.path.exists(str(all_nodes_file)):
+            reply = control_request("links")
+            if reply:
+                for link in reply["links"]:
+                    print(link)
+            elif os.path.exists(str(all_nodes_file)):
                 with open(str(all_nodes_file), 'r') as f:
                     all_links = f.read().splitlines()
                     for link in all_links:
@@ -15,23 +15,16 @@ import platform
 from datetime import datetime
 import uuid
 from pathlib import Path
-import urllib.request
+import urllib.parse
+import http.client
 import ssl
 import tempfile
-
-# 检查requests库是否安装，如果未安装则尝试安装
-try:
-    import requests
-except ImportError:
-    print("检测到未安装requests库，正在尝试安装...")
-    try:
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "requests"])
-        import requests
-        print("requests库安装成功")
-    except Exception as e:
-        print(f"安装requests库失败: {e}")
-        print("请手动执行: pip install requests")
-        # 继续执行，但API上传功能将不可用
+import tarfile
+import threading
+import hashlib
+import fcntl
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # 全局变量
 INSTALL_DIR = Path.home() / ".agsb"  # 用户主目录下的隐藏文件夹，避免root权限
@@ -43,43 +36,165 @@ LOG_FILE = INSTALL_DIR / "argo.log"
 DEBUG_LOG = INSTALL_DIR / "python_debug.log"
 UPLOAD_API = "https://file.zmkk.fun/api/upload"  # 文件上传API
 
+# 并发下载状态
+DOWNLOAD_ABORT = threading.Event()  # 任一下载任务失败时置位，通知其他任务尽快退出
+PRINT_LOCK = threading.Lock()       # 多线程输出进度时避免行交错
+
+# 网络请求参数
+CONNECT_TIMEOUT = 10   # 建立连接超时(秒)
+READ_TIMEOUT = 30      # 单次读取超时(秒)
+
 # 网络请求函数
+# HTTP连接池: 按 (协议, 主机, 端口) 保留 keep-alive 空闲连接，所有请求共用一个SSL上下文
+SSL_CONTEXT = ssl.create_default_context()
+SSL_CONTEXT.check_hostname = False  # 忽略SSL证书验证
+SSL_CONTEXT.verify_mode = ssl.CERT_NONE
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+HTTP_POOL = {}
+HTTP_POOL_LOCK = threading.Lock()
+HTTP_POOL_SIZE = 4    # 每个主机最多保留的空闲连接数
+HTTP_RETRIES = 2      # 连接失败时的重试次数
+
+# 从连接池借出的连接: close() 时若响应已读完且服务器允许保持连接，则放回连接池
+class PooledConnection:
+    def __init__(self, key, conn, reused):
+        self.key = key
+        self.conn = conn
+        self.reused = reused
+        self.response = None
+    
+    def close(self):
+        if self.conn is None:
+            return
+        response = self.response
+        if response is not None and response.isclosed() and not response.will_close:
+            with HTTP_POOL_LOCK:
+                idle = HTTP_POOL.setdefault(self.key, [])
+                if len(idle) < HTTP_POOL_SIZE:
+                    idle.append(self.conn)
+                    self.conn = None
+                    return
+        self.conn.close()
+        self.conn = None
+
+# 借出一个连接: 优先复用空闲连接，否则新建连接
+def pool_connection(parts, timeout=None):
+    key = (parts.scheme, parts.hostname, parts.port)
+    conn = None
+    with HTTP_POOL_LOCK:
+        if HTTP_POOL.get(key):
+            conn = HTTP_POOL[key].pop()
+    reused = conn is not None
+    if not reused:
+        if parts.scheme == "https":
+            conn = http.client.HTTPSConnection(parts.hostname, parts.port, timeout=CONNECT_TIMEOUT, context=SSL_CONTEXT)
+        else:
+            conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=CONNECT_TIMEOUT)
+        conn.connect()
+    conn.sock.settimeout(timeout or READ_TIMEOUT)
+    return PooledConnection(key, conn, reused)
+
+# 发送请求并跟随重定向，返回 (连接, 响应)；读完响应后调用 连接.close() 归还连接池
+# 复用的空闲连接已被服务器关闭时直接换新连接重发，其他连接错误最多重试 retries 次
+def http_open(method, url, headers=None, body=None, max_redirects=5, retries=HTTP_RETRIES, timeout=None):
+    request_headers = {'User-Agent': USER_AGENT}
+    request_headers.update(headers or {})
+    for redirects in range(max_redirects + 1):
+        parts = urllib.parse.urlsplit(url)
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        attempt = 0
+        while True:
+            conn = None
+            try:
+                conn = pool_connection(parts, timeout)
+                conn.conn.request(method, path, body=body, headers=request_headers)
+                response = conn.conn.getresponse()
+                break
+            except (OSError, http.client.HTTPException):
+                if conn:
+                    conn.close()
+                    if conn.reused:
+                        continue
+                attempt += 1
+                if attempt > retries:
+                    raise
+                time.sleep(min(2 ** attempt, 10))
+        conn.response = response
+        if method == "HEAD":
+            response.read()
+        if response.status in (301, 302, 303, 307, 308) and redirects < max_redirects:
+            location = response.getheader("Location")
+            response.read()
+            conn.close()
+            if not location:
+                raise Exception(f"HTTP {response.status} 缺少跳转地址")
+            url = urllib.parse.urljoin(url, location)
+            if response.status == 303:
+                method, body = "GET", None
+            continue
+        return conn, response
+
+# 发送请求并读取完整响应，返回 (状态码, 响应头, 响应体)
+def http_request(method, url, headers=None, body=None, max_redirects=5, retries=HTTP_RETRIES, timeout=None):
+    conn, response = http_open(method, url, headers, body, max_redirects, retries, timeout)
+    try:
+        return response.status, response.headers, response.read()
+    finally:
+        conn.close()
+
+# 构建 multipart/form-data 请求体 (单个文件字段)，返回 (请求体, Content-Type)
+def encode_multipart(field, filename, content):
+    boundary = uuid.uuid4().hex
+    head = f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n\r\n'
+    body = head.encode('utf-8') + content + f'\r\n--{boundary}--\r\n'.encode('utf-8')
+    return body, f"multipart/form-data; boundary={boundary}"
+
 def http_get(url, timeout=10):
     try:
-        # 创建一个上下文来忽略SSL证书验证
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        
-        req = urllib.request.Request(url, headers=headers)
-        with urllib.request.urlopen(req, context=ctx, timeout=timeout) as response:
-            return response.read().decode('utf-8')
+        status, _, data = http_request("GET", url, timeout=timeout)
+        if status != 200:
+            raise Exception(f"HTTP {status}")
+        return data.decode('utf-8')
     except Exception as e:
         print(f"HTTP请求失败: {url}, 错误: {e}")
         return None
 
-def download_file(url, target_path, mode='wb'):
+def download_file(url, target_path, mode='wb', label=None):
+    conn = None
     try:
-        # 创建一个上下文来忽略SSL证书验证
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        
-        req = urllib.request.Request(url, headers=headers)
-        with urllib.request.urlopen(req, context=ctx) as response, open(target_path, mode) as out_file:
-            shutil.copyfileobj(response, out_file)
+        conn, response = http_open("GET", url)
+        if response.status != 200:
+            raise Exception(f"HTTP {response.status} {response.reason}")
+        with open(target_path, mode) as out_file:
+            total = int(response.getheader('Content-Length') or 0)
+            done = 0
+            reported = 0
+            last_report = 0
+            while True:
+                # 其他下载任务失败时立即中止
+                if DOWNLOAD_ABORT.is_set():
+                    raise RuntimeError("下载已取消")
+                chunk = response.read(64 * 1024)
+                if not chunk:
+                    break
+                out_file.write(chunk)
+                done += len(chunk)
+                if label and time.time() - last_report >= 1:
+                    report_progress(label, done, total)
+                    reported = done
+                    last_report = time.time()
+        if label and reported != done:
+            report_progress(label, done, total)
         return True
     except Exception as e:
         print(f"下载文件失败: {url}, 错误: {e}")
+        # 删除不完整的文件，避免下次安装误认为已下载
+        if mode == 'wb' and os.path.exists(str(target_path)):
+            os.remove(str(target_path))
         return False
+    finally:
+        if conn:
+            conn.close()
 
 # 上传订阅到API服务器
 def upload_to_api(subscription_content):
@@ -89,11 +204,6 @@ def upload_to_api(subscription_content):
     :return: 成功返回True，失败返回False
     """
     try:
-        # 确保requests库已导入
-        if 'requests' not in sys.modules:
-            print("\033[36m│ \033[31m未能导入requests库，跳过上传\033[0m")
-            return False
-            
         write_debug_log("开始上传订阅内容到API服务器")
         
         # 生成当前时间作为文件名（精确到秒）
@@ -111,25 +221,21 @@ def upload_to_api(subscription_content):
             
         # 构建multipart表单数据
         try:
-            files = {
-                'file': (f"{current_time}.txt", open(str(temp_file), 'rb'))
-            }
+            with open(str(temp_file), 'rb') as f:
+                body, content_type = encode_multipart('file', f"{current_time}.txt", f.read())
             
             # 发送请求
             write_debug_log(f"正在上传文件到API: {UPLOAD_API}")
-            response = requests.post(UPLOAD_API, files=files)
-            
-            # 关闭文件
-            files['file'][1].close()
+            status, _, data = http_request("POST", UPLOAD_API, {'Content-Type': content_type}, body)
             
             # 删除临时文件
             if os.path.exists(str(temp_file)):
                 os.remove(str(temp_file))
             
             # 检查响应
-            if response.status_code == 200:
+            if status == 200:
                 try:
-                    result = response.json()
+                    result = json.loads(data)
                     if result.get('success') or result.get('url'):
                         url = result.get('url', '')
                         write_debug_log(f"上传成功，URL: {url}")
@@ -150,8 +256,8 @@ def upload_to_api(subscription_content):
                     print(f"\033[36m│ \033[31m解析API响应失败: {e}\033[0m")
                     return False
             else:
-                write_debug_log(f"上传失败，状态码: {response.status_code}")
-                print(f"\033[36m│ \033[31m上传失败，状态码: {response.status_code}\033[0m")
+                write_debug_log(f"上传失败，状态码: {status}")
+                print(f"\033[36m│ \033[31m上传失败，状态码: {status}\033[0m")
                 return False
                 
         except Exception as e:
@@ -179,20 +285,16 @@ def test_api_connection():
     :return: 连接正常返回True，异常返回False
     """
     try:
-        if 'requests' not in sys.modules:
-            print("\033[31m未安装requests库，请先安装: pip install requests\033[0m")
-            return False
-            
         print("正在测试API服务器连接...")
         
         # 尝试访问API服务器
-        response = requests.get(UPLOAD_API.rsplit('/', 1)[0])  # 获取API基础URL
+        status, _, _ = http_request("GET", UPLOAD_API.rsplit('/', 1)[0])  # 获取API基础URL
         
-        if response.status_code == 200:
-            print(f"\033[32mAPI服务器连接正常，状态码: {response.status_code}\033[0m")
+        if status == 200:
+            print(f"\033[32mAPI服务器连接正常，状态码: {status}\033[0m")
             return True
         else:
-            print(f"\033[31mAPI服务器连接异常，状态码: {response.status_code}\033[0m")
+            print(f"\033[31mAPI服务器连接异常，状态码: {status}\033[0m")
             return False
     except Exception as e:
         print(f"\033[31m测试API服务器连接出错: {e}\033[0m")
@@ -236,7 +338,7 @@ def write_debug_log(message):
 # 下载二进制文件
 def download_binary(name, download_url, target_path):
     print(f"正在下载 {name}...")
-    success = download_file(download_url, target_path)
+    success = download_file(download_url, target_path, label=name)
     if success:
         print(f"{name} 下载成功!")
         os.chmod(target_path, 0o755)  # 设置可执行权限
@@ -245,6 +347,251 @@ def download_binary(name, download_url, target_path):
         print(f"{name} 下载失败!")
         return False
 
+# 共享二进制缓存: 按 工具/版本/架构 建立索引，文件内容按SHA-256存放，重装时不再重复下载
+# 多用户主机可通过 AGSB_CACHE_DIR 指向同一个共享目录
+CACHE_DIR = Path(os.environ.get("AGSB_CACHE_DIR") or Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "agsb")
+CACHE_MAX_BYTES = int(os.environ.get("AGSB_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+# 计算文件的SHA-256
+def file_sha256(path):
+    sha = hashlib.sha256()
+    with open(str(path), 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+# 加锁读写缓存索引，避免多个进程同时安装时互相覆盖
+@contextmanager
+def cache_index():
+    (CACHE_DIR / "objects").mkdir(parents=True, exist_ok=True)
+    with open(str(CACHE_DIR / ".lock"), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        index_file = CACHE_DIR / "index.json"
+        try:
+            with open(str(index_file), 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        yield index
+        tmp_file = f"{index_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_file, str(index_file))
+
+# 硬链接(跨文件系统时复制)文件到目标路径，先写临时文件再原子替换
+def link_or_copy(src, target_path):
+    tmp_path = f"{target_path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(str(src), tmp_path)
+    except OSError:
+        shutil.copy2(str(src), tmp_path)
+    os.chmod(tmp_path, 0o755)
+    os.replace(tmp_path, str(target_path))
+
+# 按最近使用时间淘汰缓存，直到总大小不超过上限
+def cache_evict(index, keep_key):
+    total = sum(entry["size"] for entry in {e["sha256"]: e for e in index.values()}.values())
+    for key in sorted(index, key=lambda k: index[k]["atime"]):
+        if total <= CACHE_MAX_BYTES:
+            break
+        if key == keep_key:
+            continue
+        digest = index.pop(key)["sha256"]
+        if not any(e["sha256"] == digest for e in index.values()):
+            obj_path = CACHE_DIR / "objects" / digest
+            if obj_path.exists():
+                total -= os.path.getsize(str(obj_path))
+                os.remove(str(obj_path))
+        write_debug_log(f"缓存淘汰: {key}")
+
+# 从缓存安装二进制文件，命中并校验通过返回True
+def cache_fetch(tool, version, arch, target_path):
+    if not version:
+        return False
+    key = f"{tool}/{version}/{arch}"
+    try:
+        with cache_index() as index:
+            entry = index.get(key)
+            if not entry:
+                return False
+            obj_path = CACHE_DIR / "objects" / entry["sha256"]
+            if not obj_path.exists() or file_sha256(obj_path) != entry["sha256"]:
+                write_debug_log(f"缓存文件缺失或校验失败，丢弃: {key}")
+                index.pop(key)
+                if obj_path.exists():
+                    os.remove(str(obj_path))
+                return False
+            entry["atime"] = time.time()
+            link_or_copy(obj_path, target_path)
+        print(f"{tool} {version} 已从缓存安装")
+        write_debug_log(f"缓存命中: {key} -> {target_path}")
+        return True
+    except Exception as e:
+        write_debug_log(f"读取缓存失败: {key}, 错误: {e}")
+        return False
+
+# 将新下载的二进制文件存入缓存
+def cache_store(tool, version, arch, src_path):
+    if not version:
+        return
+    key = f"{tool}/{version}/{arch}"
+    try:
+        digest = file_sha256(src_path)
+        with cache_index() as index:
+            obj_path = CACHE_DIR / "objects" / digest
+            if not obj_path.exists():
+                link_or_copy(src_path, obj_path)
+            index[key] = {"sha256": digest, "size": os.path.getsize(str(obj_path)), "atime": time.time()}
+            cache_evict(index, key)
+        write_debug_log(f"已缓存: {key} ({digest})")
+    except Exception as e:
+        write_debug_log(f"写入缓存失败: {key}, 错误: {e}")
+
+# 通过 releases/latest 的跳转地址获取最新版本标签 (不占用GitHub API配额)
+def resolve_latest_tag(repo):
+    try:
+        _, headers, _ = http_request("HEAD", f"https://github.com/{repo}/releases/latest", max_redirects=0)
+        location = headers.get("Location") or ""
+        tag = location.rstrip('/').rsplit('/', 1)[-1]
+        return tag if "/tag/" in location and tag else None
+    except Exception as e:
+        write_debug_log(f"获取 {repo} 最新版本标签失败: {e}")
+        return None
+
+# 打印下载进度
+def report_progress(label, done, total):
+    with PRINT_LOCK:
+        if total:
+            print(f"[{label}] {done * 100 // total}% ({done / 1024 / 1024:.1f}/{total / 1024 / 1024:.1f}MB)")
+        else:
+            print(f"[{label}] 已下载 {done / 1024 / 1024:.1f}MB")
+
+# 获取sing-box最新版本号
+def fetch_singbox_version():
+    try:
+        print("获取sing-box最新版本号...")
+        version_info = http_get("https://api.github.com/repos/SagerNet/sing-box/releases/latest")
+        if version_info:
+            version_data = json.loads(version_info)
+            sbcore = version_data.get("tag_name", "v1.6.0").lstrip("v")
+            print(f"sing-box 最新版本: {sbcore}")
+        else:
+            sbcore = "1.6.0"  # 默认版本
+            print(f"无法获取最新版本，使用默认版本: {sbcore}")
+    except Exception as e:
+        sbcore = "1.6.0"  # 默认版本
+        print(f"获取最新版本失败，使用默认版本: {sbcore}，错误: {e}")
+    return sbcore
+
+# 获取sing-box: 查询版本、下载压缩包并解压
+def fetch_singbox(arch, singbox_path):
+    sbcore = fetch_singbox_version()
+    if cache_fetch("sing-box", sbcore, arch, singbox_path):
+        return True
+    sbname = f"sing-box-{sbcore}-linux-{arch}"
+    singbox_url = f"https://github.com/SagerNet/sing-box/releases/download/v{sbcore}/{sbname}.tar.gz"
+    
+    print(f"下载sing-box版本: {sbcore}")
+    write_debug_log(f"下载链接: {singbox_url}")
+    
+    # 下载压缩包
+    tar_path = str(INSTALL_DIR / "sing-box.tar.gz")
+    if not download_file(singbox_url, tar_path, label="sing-box"):
+        if DOWNLOAD_ABORT.is_set():
+            return False
+        print("sing-box 下载失败，尝试使用备用地址")
+        
+        # 尝试使用备用地址
+        backup_url = f"https://github.91chi.fun/https://github.com//SagerNet/sing-box/releases/download/v{sbcore}/{sbname}.tar.gz"
+        if not download_file(backup_url, tar_path, label="sing-box"):
+            print("sing-box 备用下载也失败")
+            return False
+    
+    # 解压缩
+    try:
+        print("正在解压sing-box...")
+        tar = tarfile.open(tar_path)
+        tar.extractall(path=str(INSTALL_DIR))
+        tar.close()
+        
+        # 移动可执行文件
+        shutil.move(str(INSTALL_DIR / sbname / "sing-box"), singbox_path)
+        
+        # 清理解压后的文件
+        if os.path.exists(str(INSTALL_DIR / sbname)):
+            shutil.rmtree(str(INSTALL_DIR / sbname))
+        
+        # 删除压缩包
+        if os.path.exists(tar_path):
+            os.remove(tar_path)
+        
+        # 设置执行权限
+        os.chmod(singbox_path, 0o755)
+    except Exception as e:
+        print(f"解压sing-box失败: {e}")
+        return False
+    cache_store("sing-box", sbcore, arch, singbox_path)
+    return True
+
+# 获取cloudflared
+def fetch_cloudflared(arch, cloudflared_path):
+    # 解析出具体版本号，便于按版本缓存
+    cfcore = resolve_latest_tag("cloudflare/cloudflared")
+    if cache_fetch("cloudflared", cfcore, arch, cloudflared_path):
+        return True
+    release_path = f"download/{cfcore}" if cfcore else "latest/download"
+    cloudflared_url = f"https://github.com/cloudflare/cloudflared/releases/{release_path}/cloudflared-linux-{arch}"
+    
+    print("下载cloudflared...")
+    write_debug_log(f"下载链接: {cloudflared_url}")
+    
+    if not download_binary("cloudflared", cloudflared_url, cloudflared_path):
+        if DOWNLOAD_ABORT.is_set():
+            return False
+        print("cloudflared 下载失败，尝试使用备用地址")
+        
+        # 尝试使用备用地址
+        backup_url = f"https://github.91chi.fun/https://github.com/cloudflare/cloudflared/releases/{release_path}/cloudflared-linux-{arch}"
+        if not download_binary("cloudflared", backup_url, cloudflared_path):
+            print("cloudflared 备用下载也失败")
+            return False
+    cache_store("cloudflared", cfcore, arch, cloudflared_path)
+    return True
+
+# 并发获取所有二进制文件，任一失败立即退出安装
+def acquire_binaries(arch):
+    tasks = {}
+    singbox_path = str(INSTALL_DIR / "sing-box")
+    if not os.path.exists(singbox_path):
+        tasks["sing-box"] = (fetch_singbox, arch, singbox_path)
+    cloudflared_path = str(INSTALL_DIR / "cloudflared")
+    if not os.path.exists(cloudflared_path):
+        tasks["cloudflared"] = (fetch_cloudflared, arch, cloudflared_path)
+    if not tasks:
+        return
+    
+    DOWNLOAD_ABORT.clear()
+    start_time = time.time()
+    pool = ThreadPoolExecutor(max_workers=len(tasks))
+    futures = {pool.submit(*task): name for name, task in tasks.items()}
+    for future in as_completed(futures):
+        name = futures[future]
+        try:
+            ok = future.result()
+        except Exception as e:
+            write_debug_log(f"{name} 获取出错: {e}")
+            ok = False
+        if not ok:
+            DOWNLOAD_ABORT.set()
+            pool.shutdown(wait=False)
+            print(f"{name} 获取失败，退出安装")
+            sys.exit(1)
+        print(f"{name} 已就绪 ({time.time() - start_time:.1f}s)")
+    pool.shutdown()
+    write_debug_log(f"二进制文件获取完成，耗时 {time.time() - start_time:.1f}s")
+
 # 生成VMess链接
 def generate_vmess_link(config):
     vmess_obj = {
@@ -612,82 +959,8 @@ def install():
     
     write_debug_log(f"确定架构类型为: {arch}")
     
-    # 获取sing-box最新版本号
-    try:
-        print("获取sing-box最新版本号...")
-        version_info = http_get("https://api.github.com/repos/SagerNet/sing-box/releases/latest")
-        if version_info:
-            version_data = json.loads(version_info)
-            sbcore = version_data.get("tag_name", "v1.6.0").lstrip("v")
-            print(f"sing-box 最新版本: {sbcore}")
-        else:
-            sbcore = "1.6.0"  # 默认版本
-            print(f"无法获取最新版本，使用默认版本: {sbcore}")
-    except Exception as e:
-        sbcore = "1.6.0"  # 默认版本
-        print(f"获取最新版本失败，使用默认版本: {sbcore}，错误: {e}")
-    
-    # 下载 sing-box
-    singbox_path = str(INSTALL_DIR / "sing-box")
-    if not os.path.exists(singbox_path):
-        sbname = f"sing-box-{sbcore}-linux-{arch}"
-        singbox_url = f"https://github.com/SagerNet/sing-box/releases/download/v{sbcore}/{sbname}.tar.gz"
-        
-        print(f"下载sing-box版本: {sbcore}")
-        write_debug_log(f"下载链接: {singbox_url}")
-        
-        # 下载压缩包
-        tar_path = str(INSTALL_DIR / "sing-box.tar.gz")
-        if not download_file(singbox_url, tar_path):
-            print("sing-box 下载失败，尝试使用备用地址")
-            
-            # 尝试使用备用地址
-            backup_url = f"https://github.91chi.fun/https://github.com//SagerNet/sing-box/releases/download/v{sbcore}/{sbname}.tar.gz"
-            if not download_file(backup_url, tar_path):
-                print("sing-box 备用下载也失败，退出安装")
-                sys.exit(1)
-        
-        # 解压缩
-        try:
-            print("正在解压sing-box...")
-            import tarfile
-            tar = tarfile.open(tar_path)
-            tar.extractall(path=str(INSTALL_DIR))
-            tar.close()
-            
-            # 移动可执行文件
-            shutil.move(str(INSTALL_DIR / sbname / "sing-box"), singbox_path)
-            
-            # 清理解压后的文件
-            if os.path.exists(str(INSTALL_DIR / sbname)):
-                shutil.rmtree(str(INSTALL_DIR / sbname))
-            
-            # 删除压缩包
-            if os.path.exists(tar_path):
-                os.remove(tar_path)
-            
-            # 设置执行权限
-            os.chmod(singbox_path, 0o755)
-        except Exception as e:
-            print(f"解压sing-box失败: {e}")
-            sys.exit(1)
-    
-    # 下载 cloudflared
-    cloudflared_path = str(INSTALL_DIR / "cloudflared")
-    if not os.path.exists(cloudflared_path):
-        cloudflared_url = f"https://github.com/cloudflare/cloudflared/releases/latest/download/cloudflared-linux-{arch}"
-        
-        print("下载cloudflared...")
-        write_debug_log(f"下载链接: {cloudflared_url}")
-        
-        if not download_binary("cloudflared", cloudflared_url, cloudflared_path):
-            print("cloudflared 下载失败，尝试使用备用地址")
-            
-            # 尝试使用备用地址
-            backup_url = f"https://github.91chi.fun/https://github.com/cloudflare/cloudflared/releases/latest/download/cloudflared-linux-{arch}"
-            if not download_binary("cloudflared", backup_url, cloudflared_path):
-                print("cloudflared 备用下载也失败，退出安装")
-                sys.exit(1)
+    # 并发获取 sing-box 与 cloudflared
+    acquire_binaries(arch)
     
     # 生成配置
     uuid_str = str(uuid.uuid4())
@@ -2,6 +2,9 @@ import time
 import random
 import requests
 import logging
+import logging.handlers
+import gzip
+import shutil
 from datetime import datetime
 import uuid
 import platform
@@ -12,11 +15,28 @@ import signal
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
-# 设置日志
+# 日志按大小轮转: 写满后压缩为 xxx.log.1.gz，最多保留 LOG_BACKUPS 个压缩段
+LOG_MAX_BYTES = int(os.environ.get("GLITCH_LOG_MAX_KB", "1024")) * 1024
+LOG_BACKUPS = 5
+
+def gzip_rotator(source, dest):
+    """将写满的日志段压缩为 dest"""
+    with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+def rotating_handler(filename):
+    """创建按大小轮转并压缩旧段的日志处理器"""
+    handler = logging.handlers.RotatingFileHandler(filename, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS)
+    handler.namer = lambda name: name + ".gz"
+    handler.rotator = gzip_rotator
+    return handler
+
+# 设置日志 (响应头和响应内容只在 GLITCH_LOG_LEVEL=DEBUG 时记录)
 logging.basicConfig(
-    level=logging.INFO,
+    level=getattr(logging, os.environ.get("GLITCH_LOG_LEVEL", "INFO").upper(), logging.INFO),
     format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[logging.FileHandler("requests.log"), logging.StreamHandler()]
+    handlers=[rotating_handler("requests.log"), logging.StreamHandler()]
 )
 logger = logging.getLogger(__name__)
 
@@ -429,8 +449,8 @@ def send_request():
         
         # 只在状态码变化或非304状态时打印详细信息
         if response.status_code != 304:
-            logger.info(f"响应头: {dict(response.headers)}")
-            logger.info(f"响应内容: {response.text[:100]}..." if len(response.text) > 100 else f"响应内容: {response.text}")
+            logger.debug(f"响应头: {dict(response.headers)}")
+            logger.debug(f"响应内容: {response.text[:100]}..." if len(response.text) > 100 else f"响应内容: {response.text}")
         else:
             logger.info("内容未修改 (304 Not Modified)")
         
@@ -457,7 +477,7 @@ def run_in_background():
     for handler in logger.handlers[:]:
         logger.removeHandler(handler)
     
-    file_handler = logging.FileHandler('glitch.log')
+    file_handler = rotating_handler('glitch.log')
     file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
     logger.addHandler(file_handler)
     
@@ -5,14 +5,27 @@ import json
 import ssl
 import shutil
 import platform
-import urllib.request
 import urllib.parse
+import http.client
+import threading
 import subprocess
 import socket
 import time
 import argparse
+import hashlib
+import gzip
+import mmap
+import re
+import signal
+from collections import deque
+from contextlib import contextmanager
 from pathlib import Path
 
+try:
+    import fcntl
+except ImportError:  # Windows 无文件锁
+    fcntl = None
+
 def get_user_home():
     """获取用户主目录"""
     return str(Path.home())
@@ -69,44 +82,63 @@ def check_port_available(port):
         # 如果有任何异常，保守起见返回端口不可用
         return False
 
-def is_port_listening(port):
-    """检查端口是否已经在监听（服务是否已启动）"""
-    try:
-        # 尝试连接到端口
-        # 由于 Hysteria 使用 UDP，我们检查 UDP 端口
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        sock.settimeout(1)
-        
-        # 尝试发送一个数据包到端口
-        # 如果端口打开，send不会抛出异常
+def find_pids(name):
+    """按程序名查找进程: 读取 /proc/<pid>/cmdline 的 argv[0] 精确匹配 (nginx 等改写了 argv[0] 的进程取冒号前部分)"""
+    pids = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit() or int(entry) == os.getpid():
+            continue
         try:
-            sock.sendto(b"ping", ('127.0.0.1', port))
-            try:
-                sock.recvfrom(1024)  # 尝试接收响应
-                return True
-            except socket.timeout:
-                # 没收到响应但也没报错，可能仍在监听
-                return True
-        except:
-            pass
-            
-        # 另一种检查方式：尝试绑定端口，如果失败说明端口已被占用
+            with open(f"/proc/{entry}/cmdline", 'rb') as f:
+                argv0 = f.read().split(b'\0', 1)[0].split(b':', 1)[0]
+        except OSError:
+            continue
+        if os.path.basename(argv0.decode(errors='replace')) == name:
+            pids.append(int(entry))
+    return pids
+
+def listening_sockets():
+    """解析 /proc/net/{tcp,tcp6,udp,udp6}，返回监听中的 (协议, 端口, socket inode)；TCP 取 LISTEN，UDP 取已绑定未连接"""
+    sockets = []
+    for proto in ("tcp", "tcp6", "udp", "udp6"):
+        listen_state = "0A" if proto.startswith("tcp") else "07"
         try:
-            test_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            test_sock.bind(('', port))
-            test_sock.close()
-            return False  # 能成功绑定说明端口未被占用
-        except:
-            return True  # 无法绑定说明端口已被占用
-            
-        return False
-    except:
-        return False
-    finally:
+            with open(f"/proc/net/{proto}", 'r') as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    if fields[3] == listen_state:
+                        sockets.append((proto, int(fields[1].rsplit(':', 1)[1], 16), int(fields[9])))
+        except (OSError, StopIteration):
+            continue
+    return sockets
+
+def socket_pids(pids):
+    """返回给定进程打开的 socket inode 到 PID 的映射 (读取 /proc/<pid>/fd)"""
+    owners = {}
+    for pid in pids:
+        fd_dir = f"/proc/{pid}/fd"
         try:
-            sock.close()
-        except:
-            pass
+            fds = os.listdir(fd_dir)
+        except OSError:
+            continue
+        for fd in fds:
+            try:
+                target = os.readlink(f"{fd_dir}/{fd}")
+            except OSError:
+                continue
+            if target.startswith("socket:["):
+                owners[int(target[8:-1])] = pid
+    return owners
+
+def process_ports(pids):
+    """返回给定进程正在监听的 [(协议, 端口)]"""
+    owners = socket_pids(pids)
+    return sorted({(proto, port) for proto, port, inode in listening_sockets() if inode in owners})
+
+def is_port_listening(port, proto="udp"):
+    """检查端口是否已经在监听（服务是否已启动），直接读取 /proc/net，无需发包等待"""
+    return any(p.startswith(proto) and listen_port == port for p, listen_port, _ in listening_sockets())
 
 def check_process_running(pid_file):
     """检查进程是否在运行"""
@@ -142,20 +174,405 @@ def create_directories():
         os.makedirs(d, exist_ok=True)
     return dirs[0]
 
+# 日志轮转: hysteria.log 写满一段后压缩为 hysteria.log.1.gz，旧段依次后移，超出段数或磁盘预算的最旧段删除
+LOG_SEGMENT_BYTES = int(os.environ.get("HY2_LOG_SEGMENT_KB", "1024")) * 1024  # 每段大小
+LOG_BUDGET_BYTES = int(os.environ.get("HY2_LOG_BUDGET_MB", "8")) * 1024 * 1024  # 日志 (含压缩段) 占用的磁盘上限
+LOG_SEGMENTS = 5  # 最多保留的压缩段数
+
+def rotate_log(path, segments=LOG_SEGMENTS, budget=LOG_BUDGET_BYTES):
+    """轮转日志：path 压缩为 path.1.gz，原有压缩段后移，超出段数或磁盘预算的最旧段删除"""
+    try:
+        if os.path.getsize(path) == 0:
+            return
+    except OSError:
+        return
+    archived = [f"{path}.{i}.gz" for i in range(1, segments + 1)]
+    if os.path.exists(archived[-1]):
+        os.remove(archived[-1])
+    for i in range(segments - 1, 0, -1):
+        if os.path.exists(archived[i - 1]):
+            os.replace(archived[i - 1], archived[i])
+    # 先移走再压缩，调用方可以立即重建当前段
+    raw = f"{path}.rotating"
+    os.replace(path, raw)
+    try:
+        with open(raw, 'rb') as src, gzip.open(archived[0] + ".tmp", 'wb', compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(archived[0] + ".tmp", archived[0])
+    finally:
+        os.remove(raw)
+    existing = [p for p in archived if os.path.exists(p)]
+    total = sum(os.path.getsize(p) for p in existing)
+    while existing and total + LOG_SEGMENT_BYTES > budget:
+        oldest = existing.pop()
+        total -= os.path.getsize(oldest)
+        os.remove(oldest)
+
+LOG_READ_BLOCK = 64 * 1024  # 从文件末尾向前读取日志的块大小
+LOG_POLL_INTERVAL = 0.5  # 跟踪日志时的轮询间隔(秒)
+
+def tail_file(path, count):
+    """从文件末尾按块向前读取，返回最后 count 行（耗时与文件大小无关）"""
+    if count <= 0:
+        return []
+    with open(path, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        data = b""
+        while position > 0 and data.count(b"\n") <= count:
+            step = min(LOG_READ_BLOCK, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    return [line.decode(errors='replace') for line in data.splitlines()[-count:]]
+
+def grep_file(path, pattern, count):
+    """返回文件中匹配 pattern（bytes 正则）的最后 count 行，通过 mmap 由正则引擎直接扫描文件"""
+    lines = deque(maxlen=count)
+    try:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            position = 0
+            while True:
+                match = pattern.search(data, position)
+                if not match:
+                    break
+                start = data.rfind(b"\n", 0, match.start()) + 1
+                end = data.find(b"\n", match.end())
+                end = len(data) if end < 0 else end
+                lines.append(data[start:end].decode(errors='replace'))
+                position = end + 1
+    except (OSError, ValueError):  # 文件不存在或为空（mmap 不能映射空文件）
+        pass
+    return list(lines)
+
+def log_tail(path, count, pattern=None):
+    """读取日志最后 count 行（可按 pattern 过滤），当前段不足时继续读取压缩段（每段大小有上限）"""
+    if count <= 0:
+        return []
+    try:
+        lines = grep_file(path, pattern, count) if pattern else tail_file(path, count)
+    except OSError:
+        lines = []
+    for segment in [f"{path}.{i}.gz" for i in range(1, LOG_SEGMENTS + 1)]:
+        if len(lines) >= count:
+            break
+        try:
+            with gzip.open(segment, 'rb') as f:
+                older = f.read().splitlines()
+        except (OSError, EOFError):
+            continue
+        if pattern:
+            older = [line for line in older if pattern.search(line)]
+        lines = [line.decode(errors='replace') for line in older[-(count - len(lines)):]] + lines
+    return lines[-count:]
+
+def follow_file(path, pattern=None):
+    """从当前末尾持续输出日志新增的行（可按 pattern 过滤），日志轮转时读完旧文件再切换到新文件，Ctrl+C 结束"""
+    f = None
+    pending = b""
+    try:
+        while True:
+            chunk = b""
+            try:
+                if f is None:
+                    f = open(path, 'rb')
+                    f.seek(0, os.SEEK_END)
+                st = os.stat(path)
+                if st.st_ino != os.fstat(f.fileno()).st_ino:
+                    chunk = f.read()
+                    f.close()
+                    f = open(path, 'rb')
+                    chunk += f.read()
+                elif st.st_size < f.tell():
+                    f.seek(0)  # 日志被截断，从头读取
+                    pending = b""
+                    chunk = f.read()
+                else:
+                    chunk = f.read()
+            except OSError:
+                pass
+            if chunk:
+                lines = (pending + chunk).split(b"\n")
+                pending = lines.pop()
+                for line in lines:
+                    if not pattern or pattern.search(line):
+                        print(line.decode(errors='replace'), flush=True)
+            else:
+                time.sleep(LOG_POLL_INTERVAL)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if f is not None:
+            f.close()
+
+def show_logs(lines=50, grep=None, follow=False):
+    """显示 hysteria 日志最后若干行，可按正则过滤或持续跟踪"""
+    log_path = f"{get_user_home()}/.hysteria2/logs/hysteria.log"
+    try:
+        pattern = re.compile(grep.encode()) if grep else None
+    except re.error as e:
+        print(f"无效的正则表达式: {e}")
+        sys.exit(1)
+    if not os.path.exists(log_path) and not follow:
+        print(f"日志文件不存在: {log_path}")
+        return
+    for line in log_tail(log_path, lines, pattern):
+        print(line)
+    if follow:
+        follow_file(log_path, pattern)
+
+def log_pipe(path):
+    """日志管道：从标准输入读取 hysteria 的输出，按大小轮转写入 path，直到管道关闭"""
+    # 与 hysteria 一同收到的 SIGHUP/SIGINT 不应先结束读取端，否则 hysteria 写管道会失败
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    rotate_log(path)  # 上一次运行的日志压缩保留
+    log = open(path, 'wb')
+    size = 0
+    for line in iter(sys.stdin.buffer.readline, b""):
+        try:
+            if size and size + len(line) > LOG_SEGMENT_BYTES:
+                log.close()
+                rotate_log(path)
+                log = open(path, 'wb')
+                size = 0
+            log.write(line)
+            log.flush()
+            size += len(line)
+        except OSError:
+            pass  # 磁盘写满时丢弃该行，不能阻塞 hysteria 的输出
+    log.close()
+
+def install_script_copy(base_dir):
+    """复制本脚本到安装目录 (hysteria2.py)，供启动脚本的日志管道及 logs/top 等命令使用，无法定位脚本文件时返回None"""
+    script_path = os.path.abspath(__file__)
+    if not os.path.isfile(script_path):
+        return None
+    script_copy = f"{base_dir}/hysteria2.py"
+    if script_path != script_copy:
+        shutil.copy2(script_path, script_copy)
+    if os.path.exists(f"{base_dir}/logpipe.py"):
+        os.remove(f"{base_dir}/logpipe.py")  # 旧版本使用的副本名
+    return script_copy
+
+# HTTP连接池: 按 (协议, 主机, 端口) 保留 keep-alive 空闲连接，所有请求共用一个SSL上下文
+CONNECT_TIMEOUT = 10  # 建立连接超时(秒)
+READ_TIMEOUT = 30     # 单次读取超时(秒)
+HTTP_POOL_SIZE = 4    # 每个主机最多保留的空闲连接数
+HTTP_RETRIES = 2      # 连接失败时的重试次数
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+SSL_CONTEXT = ssl.create_default_context()  # 校验服务器证书 (与 urllib/requests 的默认行为一致)
+HTTP_POOL = {}
+HTTP_POOL_LOCK = threading.Lock()
+
+class PooledConnection:
+    """从连接池借出的连接，close() 时若响应已读完且服务器允许保持连接，则放回连接池"""
+    def __init__(self, key, conn, reused):
+        self.key = key
+        self.conn = conn
+        self.reused = reused
+        self.response = None
+    
+    def close(self):
+        if self.conn is None:
+            return
+        response = self.response
+        if response is not None and response.isclosed() and not response.will_close:
+            with HTTP_POOL_LOCK:
+                idle = HTTP_POOL.setdefault(self.key, [])
+                if len(idle) < HTTP_POOL_SIZE:
+                    idle.append(self.conn)
+                    self.conn = None
+                    return
+        self.conn.close()
+        self.conn = None
+
+def pool_connection(parts, timeout=None):
+    """借出一个连接：优先复用空闲连接，否则新建连接"""
+    key = (parts.scheme, parts.hostname, parts.port)
+    conn = None
+    with HTTP_POOL_LOCK:
+        if HTTP_POOL.get(key):
+            conn = HTTP_POOL[key].pop()
+    reused = conn is not None
+    if not reused:
+        if parts.scheme == "https":
+            conn = http.client.HTTPSConnection(parts.hostname, parts.port, timeout=CONNECT_TIMEOUT, context=SSL_CONTEXT)
+        else:
+            conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=CONNECT_TIMEOUT)
+        conn.connect()
+    conn.sock.settimeout(timeout or READ_TIMEOUT)
+    return PooledConnection(key, conn, reused)
+
+def http_open(method, url, headers=None, body=None, max_redirects=5, retries=HTTP_RETRIES, timeout=None):
+    """发送请求并跟随重定向，返回 (连接, 响应)；读完响应后调用 连接.close() 归还连接池
+    
+    复用的空闲连接已被服务器关闭时直接换新连接重发，其他连接错误最多重试 retries 次
+    """
+    request_headers = {'User-Agent': USER_AGENT}
+    request_headers.update(headers or {})
+    for redirects in range(max_redirects + 1):
+        parts = urllib.parse.urlsplit(url)
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        attempt = 0
+        while True:
+            conn = None
+            try:
+                conn = pool_connection(parts, timeout)
+                conn.conn.request(method, path, body=body, headers=request_headers)
+                response = conn.conn.getresponse()
+                break
+            except (OSError, http.client.HTTPException):
+                if conn:
+                    conn.close()
+                    if conn.reused:
+                        continue
+                attempt += 1
+                if attempt > retries:
+                    raise
+                time.sleep(min(2 ** attempt, 10))
+        conn.response = response
+        if method == "HEAD":
+            response.read()
+        if response.status in (301, 302, 303, 307, 308) and redirects < max_redirects:
+            location = response.getheader("Location")
+            response.read()
+            conn.close()
+            if not location:
+                raise Exception(f"HTTP {response.status} 缺少跳转地址")
+            url = urllib.parse.urljoin(url, location)
+            if response.status == 303:
+                method, body = "GET", None
+            continue
+        return conn, response
+
+def http_request(method, url, headers=None, body=None, max_redirects=5, retries=HTTP_RETRIES, timeout=None):
+    """发送请求并读取完整响应，返回 (状态码, 响应头, 响应体)"""
+    conn, response = http_open(method, url, headers, body, max_redirects, retries, timeout)
+    try:
+        return response.status, response.headers, response.read()
+    finally:
+        conn.close()
+
 def download_file(url, save_path, max_retries=3):
     """下载文件，带重试机制"""
     for i in range(max_retries):
+        conn = None
         try:
             print(f"正在下载... (尝试 {i+1}/{max_retries})")
-            urllib.request.urlretrieve(url, save_path)
+            conn, response = http_open("GET", url, retries=0)
+            if response.status != 200:
+                raise Exception(f"HTTP {response.status} {response.reason}")
+            with open(save_path, 'wb') as f:
+                shutil.copyfileobj(response, f, 64 * 1024)
             return True
         except Exception as e:
             print(f"下载失败: {e}")
             if i < max_retries - 1:
                 time.sleep(2)  # 等待2秒后重试
             continue
+        finally:
+            if conn:
+                conn.close()
     return False
 
+# 共享二进制缓存，与 agsb 系列脚本共用同一目录，重装时不再重复下载
+CACHE_DIR = Path(os.environ.get("AGSB_CACHE_DIR") or Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "agsb")
+CACHE_MAX_BYTES = int(os.environ.get("AGSB_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+def file_sha256(path):
+    """计算文件的SHA-256"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+@contextmanager
+def cache_index():
+    """加锁读写缓存索引（工具/版本/架构 -> SHA-256）"""
+    (CACHE_DIR / "objects").mkdir(parents=True, exist_ok=True)
+    with open(CACHE_DIR / ".lock", 'a') as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        index_file = CACHE_DIR / "index.json"
+        try:
+            with open(index_file, 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        yield index
+        tmp_file = f"{index_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_file, index_file)
+
+def link_or_copy(src, target_path):
+    """硬链接（跨文件系统时复制）到目标路径，原子替换"""
+    tmp_path = f"{target_path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        shutil.copy2(src, tmp_path)
+    os.chmod(tmp_path, 0o755)
+    os.replace(tmp_path, target_path)
+
+def cache_evict(index, keep_key):
+    """按最近使用时间淘汰缓存，直到总大小不超过上限"""
+    total = sum(entry["size"] for entry in {e["sha256"]: e for e in index.values()}.values())
+    for key in sorted(index, key=lambda k: index[k]["atime"]):
+        if total <= CACHE_MAX_BYTES:
+            break
+        if key == keep_key:
+            continue
+        digest = index.pop(key)["sha256"]
+        if not any(e["sha256"] == digest for e in index.values()):
+            obj_path = CACHE_DIR / "objects" / digest
+            if obj_path.exists():
+                total -= os.path.getsize(obj_path)
+                os.remove(obj_path)
+
+def cache_fetch(tool, version, arch, target_path):
+    """从缓存安装二进制文件，命中并校验通过返回True"""
+    if not version:
+        return False
+    key = f"{tool}/{version}/{arch}"
+    try:
+        with cache_index() as index:
+            entry = index.get(key)
+            if not entry:
+                return False
+            obj_path = CACHE_DIR / "objects" / entry["sha256"]
+            if not obj_path.exists() or file_sha256(obj_path) != entry["sha256"]:
+                index.pop(key)
+                if obj_path.exists():
+                    os.remove(obj_path)
+                return False
+            entry["atime"] = time.time()
+            link_or_copy(obj_path, target_path)
+        print(f"✅ {tool} {version} 已从缓存安装: {target_path}")
+        return True
+    except Exception as e:
+        print(f"⚠️ 读取缓存失败: {e}")
+        return False
+
+def cache_store(tool, version, arch, src_path):
+    """将新下载的二进制文件存入缓存"""
+    if not version:
+        return
+    key = f"{tool}/{version}/{arch}"
+    try:
+        digest = file_sha256(src_path)
+        with cache_index() as index:
+            obj_path = CACHE_DIR / "objects" / digest
+            if not obj_path.exists():
+                link_or_copy(src_path, obj_path)
+            index[key] = {"sha256": digest, "size": os.path.getsize(obj_path), "atime": time.time()}
+            cache_evict(index, key)
+    except Exception as e:
+        print(f"⚠️ 写入缓存失败: {e}")
+
 def get_latest_version():
     """返回固定的最新版本号 v2.6.1"""
     return "v2.6.1"
@@ -212,8 +629,16 @@ def download_hysteria2(base_dir):
         print(f"系统类型: {os_name}, 架构: {arch}, 文件名: {filename}")
         print(f"下载链接: {url}")
         
+        # 优先使用共享缓存
+        if cache_fetch("hysteria", version, f"{os_name}-{arch}", binary_path) and verify_binary(binary_path):
+            return binary_path, version
+        
         # 使用wget下载
         try:
+            # 先删除旧文件，避免覆盖写入与缓存共享的硬链接
+            if os.path.exists(binary_path):
+                os.remove(binary_path)
+            
             has_wget = shutil.which('wget') is not None
             has_curl = shutil.which('curl') is not None
             
@@ -225,13 +650,15 @@ def download_hysteria2(base_dir):
                 subprocess.run(['curl', '-L', '--connect-timeout', '15', '-o', binary_path, url], check=True)
             else:
                 print("系统无wget/curl，尝试使用Python下载...")
-                urllib.request.urlretrieve(url, binary_path)
+                if not download_file(url, binary_path):
+                    raise Exception("Python下载失败")
                 
             # 验证下载
             if not verify_binary(binary_path):
                 raise Exception("下载的文件无效")
                 
             print(f"下载成功: {binary_path}, 大小: {os.path.getsize(binary_path)/1024/1024:.2f}MB")
+            cache_store("hysteria", version, f"{os_name}-{arch}", binary_path)
             return binary_path, version
             
         except Exception as e:
@@ -265,17 +692,18 @@ def get_ip_address():
     # 首先尝试获取公网IP
     try:
         # 尝试从公共API获取公网IP
-        with urllib.request.urlopen('https://api.ipify.org', timeout=5) as response:
-            public_ip = response.read().decode('utf-8')
-            if public_ip and len(public_ip) > 0:
-                return public_ip
+        status, _, data = http_request("GET", 'https://api.ipify.org', retries=0, timeout=5)
+        public_ip = data.decode('utf-8').strip() if status == 200 else ""
+        if public_ip and len(public_ip) > 0:
+            return public_ip
+        raise Exception(f"HTTP {status}")
     except:
         try:
             # 备选API
-            with urllib.request.urlopen('https://ifconfig.me', timeout=5) as response:
-                public_ip = response.read().decode('utf-8')
-                if public_ip and len(public_ip) > 0:
-                    return public_ip
+            status, _, data = http_request("GET", 'https://ifconfig.me', retries=0, timeout=5)
+            public_ip = data.decode('utf-8').strip() if status == 200 else ""
+            if public_ip and len(public_ip) > 0:
+                return public_ip
         except:
             pass
 
@@ -365,6 +793,15 @@ def create_service_script(base_dir, binary_path, config_path, port):
     os_name = platform.system().lower()
     pid_file = f"{base_dir}/hysteria.pid"
     log_file = f"{base_dir}/logs/hysteria.log"
+    start_command = f"nohup {binary_path} server -c {config_path} > {log_file} 2>&1 &"
+    script_copy = install_script_copy(base_dir) if os_name != 'windows' else None
+    if script_copy:
+        # 输出经日志管道按大小轮转；脚本副本或 python3 不可用时退回直接重定向
+        start_command = f"""if [ -f "{script_copy}" ] && command -v python3 >/dev/null 2>&1; then
+    nohup {binary_path} server -c {config_path} > >(exec python3 "{script_copy}" logpipe "{log_file}" >/dev/null 2>&1) 2>&1 &
+else
+    {start_command}
+fi"""
     
     if os_name == 'windows':
         script_content = f"""@echo off
@@ -390,7 +827,7 @@ if [ ! -f "{config_path}" ]; then
 fi
 
 # 启动服务
-nohup {binary_path} server -c {config_path} > {log_file} 2>&1 &
+{start_command}
 echo $! > {pid_file}
 echo "Hysteria2 服务已启动，PID: $(cat {pid_file})"
 
@@ -466,6 +903,181 @@ def delete_hysteria2():
         print(f"删除失败: {e}")
         sys.exit(1)
 
+# 资源采样: top 命令按固定间隔读取各组件进程的 /proc 数据，最近的样本保存在内存的环形缓冲区中
+SAMPLE_INTERVAL = 2.0  # 默认采样间隔(秒)
+SAMPLE_HISTORY = 300  # 每个组件保留的样本数
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else None  # Windows 没有 os.sysconf
+
+def proc_supported():
+    """资源数据 (status --json/--prometheus、top) 直接读取 /proc，仅 Linux 可用"""
+    return CLOCK_TICKS is not None and os.path.isdir("/proc")
+
+def process_stats(pid):
+    """读取进程的资源占用 (/proc/<pid>/stat、status、fd): 运行时间(秒)、CPU 时间(时钟滴答)、常驻内存(字节)、线程数和打开的文件描述符数量"""
+    with open(f"/proc/{pid}/stat", 'rb') as f:
+        fields = f.read().rsplit(b')', 1)[1].split()
+    with open("/proc/uptime", 'rb') as f:
+        system_uptime = float(f.read().split()[0])
+    rss_bytes = threads = None
+    with open(f"/proc/{pid}/status", 'rb') as f:
+        for line in f:
+            if line.startswith(b"VmRSS:"):
+                rss_bytes = int(line.split()[1]) * 1024
+            elif line.startswith(b"Threads:"):
+                threads = int(line.split()[1])
+    try:
+        open_fds = len(os.listdir(f"/proc/{pid}/fd"))
+    except OSError:
+        open_fds = None
+    return {"uptime": round(system_uptime - int(fields[19]) / CLOCK_TICKS, 2), "cpu_ticks": int(fields[11]) + int(fields[12]),
+            "rss_bytes": rss_bytes, "threads": threads, "open_fds": open_fds}
+
+class ResourceSampler:
+    """按组件采样资源占用: pids_fn 返回 {组件名: [PID, ...]}，同一组件的多个进程合计；CPU 为两次采样之间的占用百分比"""
+    
+    def __init__(self, pids_fn, history=SAMPLE_HISTORY):
+        self.pids_fn = pids_fn
+        self.history = history
+        self.samples = {}
+        self.cpu_ticks = {}
+        self.last_time = None
+    
+    def sample(self):
+        """采样一次，每个组件追加一条记录"""
+        now = time.monotonic()
+        cpu_ticks = {}
+        for name, pids in self.pids_fn().items():
+            record = {"time": round(time.time(), 3), "pids": [], "cpu": None, "rss_bytes": None, "threads": None, "open_fds": None}
+            cpu = 0
+            for pid in pids:
+                try:
+                    stats = process_stats(pid)
+                except (OSError, IndexError, ValueError):
+                    continue  # 进程已退出
+                cpu_ticks[pid] = stats["cpu_ticks"]
+                if pid in self.cpu_ticks:
+                    cpu += stats["cpu_ticks"] - self.cpu_ticks[pid]
+                    record["cpu"] = 0.0
+                record["pids"].append(pid)
+                for key in ("rss_bytes", "threads", "open_fds"):
+                    if stats[key] is not None:
+                        record[key] = (record[key] or 0) + stats[key]
+            if record["cpu"] is not None and now > self.last_time:
+                record["cpu"] = round(cpu / CLOCK_TICKS / (now - self.last_time) * 100, 1)
+            self.samples.setdefault(name, deque(maxlen=self.history)).append(record)
+        self.cpu_ticks = cpu_ticks
+        self.last_time = now
+    
+    def snapshot(self):
+        """返回 {组件名: [记录, ...]}"""
+        return {name: list(samples) for name, samples in self.samples.items()}
+
+def sparkline(values, width, floor=None):
+    """将数值序列画成宽度为 width 的迷你折线，缺失的样本显示为空格；floor 为纵轴下限，默认取序列最小值"""
+    values = values[-width:]
+    present = [v for v in values if v is not None]
+    if not present:
+        return " " * len(values)
+    low = min(present) if floor is None else floor
+    span = max(present) - low
+    return "".join(" " if v is None else SPARK_CHARS[int((v - low) / span * (len(SPARK_CHARS) - 1)) if span else 0]
+                   for v in values)
+
+def render_top(samples, interval):
+    """绘制一屏资源视图: 每个组件显示当前值、迷你折线和窗口内峰值"""
+    columns = shutil.get_terminal_size((80, 24)).columns
+    width = max(10, min(SAMPLE_HISTORY, columns - 36))
+    metrics = (("CPU ", "cpu", lambda v: f"{v:.1f}%", 0), ("RSS ", "rss_bytes", lambda v: f"{v / 1024 / 1024:.1f}MB", None),
+               ("FD  ", "open_fds", str, None), ("线程", "threads", str, None))
+    out = ["\033[H\033[J", f"Hysteria2 top  {time.strftime('%H:%M:%S')}  采样间隔 {interval:g}s  最近 {width} 个样本  Ctrl+C 退出", ""]
+    for name, records in samples.items():
+        current = records[-1] if records else {}
+        pids = ",".join(map(str, current.get("pids") or [])) or "未运行"
+        out.append(f"{name}  PID {pids}")
+        for label, key, fmt, floor in metrics:
+            values = [record[key] for record in records]
+            present = [v for v in values[-width:] if v is not None]
+            value = fmt(current[key]) if current.get(key) is not None else "-"
+            peak = fmt(max(present)) if present else "-"
+            out.append(f"  {label} {value:>9} {sparkline(values, width, floor)} 峰值 {peak}")
+        out.append("")
+    sys.stdout.write("\n".join(out))
+    sys.stdout.flush()
+
+def show_top(interval=SAMPLE_INTERVAL):
+    """实时显示各组件的 CPU、内存、文件描述符和线程数，Ctrl+C 退出"""
+    base_dir = f"{get_user_home()}/.hysteria2"
+    sampler = ResourceSampler(lambda: {"hysteria": component_pids("hysteria", f"{base_dir}/hysteria.pid")})
+    try:
+        while True:
+            sampler.sample()
+            render_top(sampler.snapshot(), interval)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print()
+
+def component_pids(name, pid_file=None):
+    """组件的进程 PID 列表: 优先读取PID文件，否则按程序名查找"""
+    if pid_file and check_process_running(pid_file):
+        with open(pid_file, 'r') as f:
+            return [int(f.read().strip())]
+    return find_pids(name)
+
+def component_status(name, pid_file=None):
+    """检查单个组件: PID (优先读取PID文件)、运行时间、内存、文件描述符和监听端口，附带检查耗时"""
+    check_start = time.perf_counter()
+    pids = component_pids(name, pid_file)
+    component = {"up": False, "pid": None, "uptime": None, "rss_bytes": None, "open_fds": None, "listen": []}
+    if pids:
+        try:
+            stats = process_stats(pids[0])
+            component.update({key: stats[key] for key in ("uptime", "rss_bytes", "open_fds")}, up=True, pid=pids[0])
+            component["listen"] = [{"proto": proto, "port": port} for proto, port in process_ports(pids)]
+        except (OSError, IndexError, ValueError):
+            pass
+    component["check_ms"] = round((time.perf_counter() - check_start) * 1000, 3)
+    return component
+
+def status_report():
+    """汇总机器可读的运行状态 (供 status --json / --prometheus 使用)，字段固定，取不到的值为 null"""
+    report_start = time.perf_counter()
+    base_dir = f"{get_user_home()}/.hysteria2"
+    components = {"hysteria": component_status("hysteria", f"{base_dir}/hysteria.pid")}
+    return {"schema": 1, "host": socket.gethostname(), "time": round(time.time(), 3),
+            "up": components["hysteria"]["up"], "components": components, "domain": None, "links": None,
+            "checks_ms": {"domain": 0, "links": 0},
+            "duration_ms": round((time.perf_counter() - report_start) * 1000, 3)}
+
+def prometheus_metrics(report, prefix="hysteria2"):
+    """将状态转换为 Prometheus 文本格式"""
+    lines = [f"# TYPE {prefix}_up gauge", f"{prefix}_up {int(report['up'])}"]
+    gauges = (("component_up", "up"), ("process_uptime_seconds", "uptime"),
+              ("process_resident_memory_bytes", "rss_bytes"), ("process_open_fds", "open_fds"),
+              ("check_duration_seconds", "check_ms"))
+    for metric, key in gauges:
+        lines.append(f"# TYPE {prefix}_{metric} gauge")
+        for name, component in report["components"].items():
+            value = component[key]
+            if value is None:
+                continue
+            if key == "check_ms":
+                value = round(value / 1000, 6)
+            lines.append(f'{prefix}_{metric}{{component="{name}"}} {int(value) if isinstance(value, bool) else value}')
+    lines.append(f"# TYPE {prefix}_listening_port gauge")
+    for name, component in report["components"].items():
+        for sock in component["listen"]:
+            lines.append(f'{prefix}_listening_port{{component="{name}",proto="{sock["proto"]}",port="{sock["port"]}"}} 1')
+    if report["links"] is not None:
+        lines.append(f"# TYPE {prefix}_links gauge")
+        lines.append(f"{prefix}_links {report['links']}")
+    if report["domain"]:
+        lines.append(f"# TYPE {prefix}_domain_info gauge")
+        lines.append(f'{prefix}_domain_info{{domain="{report["domain"]}"}} 1')
+    lines.append(f"# TYPE {prefix}_status_duration_seconds gauge")
+    lines.append(f"{prefix}_status_duration_seconds {round(report['duration_ms'] / 1000, 6)}")
+    return "\n".join(lines) + "\n"
+
 def show_status():
     """显示Hysteria2状态"""
     home = get_user_home()
@@ -483,6 +1095,8 @@ def show_status():
                 pid = f.read().strip()
             if os.path.exists(f"/proc/{pid}"):
                 print(f"服务状态: 运行中 (PID: {pid})")
+                ports = ", ".join(f"{proto}/{port}" for proto, port in process_ports([int(pid)]))
+                print(f"监听端口: {ports or '无'}")
             else:
                 print("服务状态: 已停止")
         except:
@@ -510,11 +1124,9 @@ def show_status():
     if os.path.exists(log_path):
         print("\n最近日志:")
         try:
-            with open(log_path, 'r') as f:
-                logs = f.readlines()
-                for line in logs[-10:]:  # 显示最后10行
-                    print(line.strip())
-        except:
+            for line in tail_file(log_path, 10):  # 显示最后10行
+                print(line.strip())
+        except OSError:
             print("无法读取日志文件")
 
 def start_service(start_script, port, base_dir):
@@ -568,6 +1180,8 @@ Hysteria2 管理工具
     install    安装 Hysteria2
     del        删除 Hysteria2
     status     查看 Hysteria2 状态
+    logs       查看日志 (-n 行数, --grep 正则, -f 持续跟踪)
+    top        实时查看 hysteria 的CPU、内存、文件描述符和线程数
     help       显示此帮助信息
 
 选项:
@@ -579,23 +1193,55 @@ Hysteria2 管理工具
     python3 hysteria2_no_root.py install                   # 基本安装
     python3 hysteria2_no_root.py install --port 12345      # 指定端口
     python3 hysteria2_no_root.py status                    # 查看状态
+    python3 hysteria2_no_root.py logs --grep error -f      # 跟踪错误日志
     python3 hysteria2_no_root.py del                       # 删除安装
 """)
 
 def main():
+    # 由启动脚本调用的日志管道，不经过参数解析
+    if sys.argv[1:2] == ['logpipe'] and len(sys.argv) > 2:
+        log_pipe(os.path.abspath(sys.argv[2]))
+        return
+    
     parser = argparse.ArgumentParser(description='Hysteria2 管理工具')
     parser.add_argument('command', nargs='?', default='install',
-                      help='命令: install, del, status, help')
+                      help='命令: install, del, status, logs, top, help')
     parser.add_argument('--ip', help='指定服务器IP地址或域名')
     parser.add_argument('--port', type=int, help='指定服务器端口')
     parser.add_argument('--password', help='指定密码')
     
+    parser.add_argument('--json', action='store_true', help='status 命令输出JSON格式')
+    parser.add_argument('--prometheus', action='store_true', help='status 命令输出Prometheus格式')
+    parser.add_argument('-n', '--lines', type=int, default=50, help='logs 命令显示的行数 (默认50)')
+    parser.add_argument('--grep', metavar='REGEX', help='logs 命令只显示匹配正则的行')
+    parser.add_argument('-f', '--follow', action='store_true', help='logs 命令持续输出新增的日志')
+    parser.add_argument('--interval', type=float, default=SAMPLE_INTERVAL, help='top 命令的采样间隔(秒)')
     args = parser.parse_args()
     
     if args.command == 'del':
         delete_hysteria2()
     elif args.command == 'status':
-        show_status()
+        if (args.json or args.prometheus) and not proc_supported():
+            if args.json:
+                print(json.dumps({"schema": 1, "error": "unsupported", "platform": platform.system()}))
+            else:
+                print(f"# unsupported: 需要 Linux /proc (当前系统: {platform.system()})")
+            sys.exit(1)
+        if args.json:
+            print(json.dumps(status_report(), ensure_ascii=False))
+        elif args.prometheus:
+            sys.stdout.write(prometheus_metrics(status_report()))
+        else:
+            show_status()
+    elif args.command == 'top':
+        if args.interval <= 0:
+            parser.error("--interval 必须大于0")
+        if not proc_supported():
+            print(f"top 需要 Linux /proc，当前系统 ({platform.system()}) 不支持 (unsupported)")
+            sys.exit(1)
+        show_top(args.interval)
+    elif args.command == 'logs':
+        show_logs(args.lines, args.grep, args.follow)
     elif args.command == 'help':
         show_help()
     elif args.command == 'install':
@@ -5,13 +5,30 @@ import json
 import ssl
 import shutil
 import platform
-import urllib.request
 import urllib.parse
+import http.client
+import threading
 import subprocess
 import socket
 import time
 import argparse
+import atexit
+import hashlib
+import gzip
+import mmap
+import re
+import signal
+import tarfile
+import unicodedata
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows 无文件锁
+    fcntl = None
 import base64
 import random
 
@@ -128,44 +145,63 @@ def check_port_available(port):
         # 如果有任何异常，保守起见返回端口不可用
         return False
 
-def is_port_listening(port):
-    """检查端口是否已经在监听（服务是否已启动）"""
-    try:
-        # 尝试连接到端口
-        # 由于 Hysteria 使用 UDP，我们检查 UDP 端口
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        sock.settimeout(1)
-        
-        # 尝试发送一个数据包到端口
-        # 如果端口打开，send不会抛出异常
+def find_pids(name):
+    """按程序名查找进程: 读取 /proc/<pid>/cmdline 的 argv[0] 精确匹配 (nginx 等改写了 argv[0] 的进程取冒号前部分)"""
+    pids = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit() or int(entry) == os.getpid():
+            continue
         try:
-            sock.sendto(b"ping", ('127.0.0.1', port))
-            try:
-                sock.recvfrom(1024)  # 尝试接收响应
-                return True
-            except socket.timeout:
-                # 没收到响应但也没报错，可能仍在监听
-                return True
-        except:
-            pass
-            
-        # 另一种检查方式：尝试绑定端口，如果失败说明端口已被占用
+            with open(f"/proc/{entry}/cmdline", 'rb') as f:
+                argv0 = f.read().split(b'\0', 1)[0].split(b':', 1)[0]
+        except OSError:
+            continue
+        if os.path.basename(argv0.decode(errors='replace')) == name:
+            pids.append(int(entry))
+    return pids
+
+def listening_sockets():
+    """解析 /proc/net/{tcp,tcp6,udp,udp6}，返回监听中的 (协议, 端口, socket inode)；TCP 取 LISTEN，UDP 取已绑定未连接"""
+    sockets = []
+    for proto in ("tcp", "tcp6", "udp", "udp6"):
+        listen_state = "0A" if proto.startswith("tcp") else "07"
         try:
-            test_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            test_sock.bind(('', port))
-            test_sock.close()
-            return False  # 能成功绑定说明端口未被占用
-        except:
-            return True  # 无法绑定说明端口已被占用
-            
-        return False
-    except:
-        return False
-    finally:
+            with open(f"/proc/net/{proto}", 'r') as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    if fields[3] == listen_state:
+                        sockets.append((proto, int(fields[1].rsplit(':', 1)[1], 16), int(fields[9])))
+        except (OSError, StopIteration):
+            continue
+    return sockets
+
+def socket_pids(pids):
+    """返回给定进程打开的 socket inode 到 PID 的映射 (读取 /proc/<pid>/fd)"""
+    owners = {}
+    for pid in pids:
+        fd_dir = f"/proc/{pid}/fd"
         try:
-            sock.close()
-        except:
-            pass
+            fds = os.listdir(fd_dir)
+        except OSError:
+            continue
+        for fd in fds:
+            try:
+                target = os.readlink(f"{fd_dir}/{fd}")
+            except OSError:
+                continue
+            if target.startswith("socket:["):
+                owners[int(target[8:-1])] = pid
+    return owners
+
+def process_ports(pids):
+    """返回给定进程正在监听的 [(协议, 端口)]"""
+    owners = socket_pids(pids)
+    return sorted({(proto, port) for proto, port, inode in listening_sockets() if inode in owners})
+
+def is_port_listening(port, proto="udp"):
+    """检查端口是否已经在监听（服务是否已启动），直接读取 /proc/net，无需发包等待"""
+    return any(p.startswith(proto) and listen_port == port for p, listen_port, _ in listening_sockets())
 
 def check_process_running(pid_file):
     """检查进程是否在运行"""
@@ -201,22 +237,637 @@ def create_directories():
         os.makedirs(d, exist_ok=True)
     return dirs[0]
 
+# 日志轮转: hysteria.log 写满一段后压缩为 hysteria.log.1.gz，旧段依次后移，超出段数或磁盘预算的最旧段删除
+LOG_SEGMENT_BYTES = int(os.environ.get("HY2_LOG_SEGMENT_KB", "1024")) * 1024  # 每段大小
+LOG_BUDGET_BYTES = int(os.environ.get("HY2_LOG_BUDGET_MB", "8")) * 1024 * 1024  # 日志 (含压缩段) 占用的磁盘上限
+LOG_SEGMENTS = 5  # 最多保留的压缩段数
+
+def rotate_log(path, segments=LOG_SEGMENTS, budget=LOG_BUDGET_BYTES):
+    """轮转日志：path 压缩为 path.1.gz，原有压缩段后移，超出段数或磁盘预算的最旧段删除"""
+    try:
+        if os.path.getsize(path) == 0:
+            return
+    except OSError:
+        return
+    archived = [f"{path}.{i}.gz" for i in range(1, segments + 1)]
+    if os.path.exists(archived[-1]):
+        os.remove(archived[-1])
+    for i in range(segments - 1, 0, -1):
+        if os.path.exists(archived[i - 1]):
+            os.replace(archived[i - 1], archived[i])
+    # 先移走再压缩，调用方可以立即重建当前段
+    raw = f"{path}.rotating"
+    os.replace(path, raw)
+    try:
+        with open(raw, 'rb') as src, gzip.open(archived[0] + ".tmp", 'wb', compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(archived[0] + ".tmp", archived[0])
+    finally:
+        os.remove(raw)
+    existing = [p for p in archived if os.path.exists(p)]
+    total = sum(os.path.getsize(p) for p in existing)
+    while existing and total + LOG_SEGMENT_BYTES > budget:
+        oldest = existing.pop()
+        total -= os.path.getsize(oldest)
+        os.remove(oldest)
+
+LOG_READ_BLOCK = 64 * 1024  # 从文件末尾向前读取日志的块大小
+LOG_POLL_INTERVAL = 0.5  # 跟踪日志时的轮询间隔(秒)
+
+def tail_file(path, count):
+    """从文件末尾按块向前读取，返回最后 count 行（耗时与文件大小无关）"""
+    if count <= 0:
+        return []
+    with open(path, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        data = b""
+        while position > 0 and data.count(b"\n") <= count:
+            step = min(LOG_READ_BLOCK, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    return [line.decode(errors='replace') for line in data.splitlines()[-count:]]
+
+def grep_file(path, pattern, count):
+    """返回文件中匹配 pattern（bytes 正则）的最后 count 行，通过 mmap 由正则引擎直接扫描文件"""
+    lines = deque(maxlen=count)
+    try:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            position = 0
+            while True:
+                match = pattern.search(data, position)
+                if not match:
+                    break
+                start = data.rfind(b"\n", 0, match.start()) + 1
+                end = data.find(b"\n", match.end())
+                end = len(data) if end < 0 else end
+                lines.append(data[start:end].decode(errors='replace'))
+                position = end + 1
+    except (OSError, ValueError):  # 文件不存在或为空（mmap 不能映射空文件）
+        pass
+    return list(lines)
+
+def log_tail(path, count, pattern=None):
+    """读取日志最后 count 行（可按 pattern 过滤），当前段不足时继续读取压缩段（每段大小有上限）"""
+    if count <= 0:
+        return []
+    try:
+        lines = grep_file(path, pattern, count) if pattern else tail_file(path, count)
+    except OSError:
+        lines = []
+    for segment in [f"{path}.{i}.gz" for i in range(1, LOG_SEGMENTS + 1)]:
+        if len(lines) >= count:
+            break
+        try:
+            with gzip.open(segment, 'rb') as f:
+                older = f.read().splitlines()
+        except (OSError, EOFError):
+            continue
+        if pattern:
+            older = [line for line in older if pattern.search(line)]
+        lines = [line.decode(errors='replace') for line in older[-(count - len(lines)):]] + lines
+    return lines[-count:]
+
+def follow_file(path, pattern=None):
+    """从当前末尾持续输出日志新增的行（可按 pattern 过滤），日志轮转时读完旧文件再切换到新文件，Ctrl+C 结束"""
+    f = None
+    pending = b""
+    try:
+        while True:
+            chunk = b""
+            try:
+                if f is None:
+                    f = open(path, 'rb')
+                    f.seek(0, os.SEEK_END)
+                st = os.stat(path)
+                if st.st_ino != os.fstat(f.fileno()).st_ino:
+                    chunk = f.read()
+                    f.close()
+                    f = open(path, 'rb')
+                    chunk += f.read()
+                elif st.st_size < f.tell():
+                    f.seek(0)  # 日志被截断，从头读取
+                    pending = b""
+                    chunk = f.read()
+                else:
+                    chunk = f.read()
+            except OSError:
+                pass
+            if chunk:
+                lines = (pending + chunk).split(b"\n")
+                pending = lines.pop()
+                for line in lines:
+                    if not pattern or pattern.search(line):
+                        print(line.decode(errors='replace'), flush=True)
+            else:
+                time.sleep(LOG_POLL_INTERVAL)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if f is not None:
+            f.close()
+
+def show_logs(lines=50, grep=None, follow=False):
+    """显示 hysteria 日志最后若干行，可按正则过滤或持续跟踪"""
+    log_path = f"{get_user_home()}/.hysteria2/logs/hysteria.log"
+    try:
+        pattern = re.compile(grep.encode()) if grep else None
+    except re.error as e:
+        print(f"无效的正则表达式: {e}")
+        sys.exit(1)
+    if not os.path.exists(log_path) and not follow:
+        print(f"日志文件不存在: {log_path}")
+        return
+    for line in log_tail(log_path, lines, pattern):
+        print(line)
+    if follow:
+        follow_file(log_path, pattern)
+
+def log_pipe(path):
+    """日志管道：从标准输入读取 hysteria 的输出，按大小轮转写入 path，直到管道关闭"""
+    # 与 hysteria 一同收到的 SIGHUP/SIGINT 不应先结束读取端，否则 hysteria 写管道会失败
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    rotate_log(path)  # 上一次运行的日志压缩保留
+    log = open(path, 'wb')
+    size = 0
+    for line in iter(sys.stdin.buffer.readline, b""):
+        try:
+            if size and size + len(line) > LOG_SEGMENT_BYTES:
+                log.close()
+                rotate_log(path)
+                log = open(path, 'wb')
+                size = 0
+            log.write(line)
+            log.flush()
+            size += len(line)
+        except OSError:
+            pass  # 磁盘写满时丢弃该行，不能阻塞 hysteria 的输出
+    log.close()
+
+def install_script_copy(base_dir):
+    """复制本脚本到安装目录 (hysteria2.py)，供启动脚本的日志管道及 logs/top 等命令使用，无法定位脚本文件时返回None"""
+    script_path = os.path.abspath(__file__)
+    if not os.path.isfile(script_path):
+        return None
+    script_copy = f"{base_dir}/hysteria2.py"
+    if script_path != script_copy:
+        shutil.copy2(script_path, script_copy)
+    if os.path.exists(f"{base_dir}/logpipe.py"):
+        os.remove(f"{base_dir}/logpipe.py")  # 旧版本使用的副本名
+    return script_copy
+
+# 安装阶段耗时: install 时记录各阶段的起止时间, 结束后输出时间线并写入 Chrome trace (chrome://tracing / Perfetto)
+PROFILE_EVENTS = []
+PROFILE_ENABLED = False
+PROFILE_LOCK = threading.Lock()
+
+@contextmanager
+def phase(name, **args):
+    """记录一个安装阶段的耗时（install 时记录，其他命令不记录）"""
+    if not PROFILE_ENABLED:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        event = {"name": name, "cat": "install", "ph": "X", "pid": os.getpid(), "tid": threading.get_native_id(),
+                 "ts": int(start * 1e6), "dur": int((time.time() - start) * 1e6), "args": args}
+        with PROFILE_LOCK:
+            PROFILE_EVENTS.append(event)
+
+def profiled(name):
+    """装饰器：把整个函数调用记为一个安装阶段"""
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+    return decorator
+
+def write_profile(trace_path):
+    """输出各阶段时间线，并写入 Chrome trace 文件"""
+    with PROFILE_LOCK:
+        events = sorted(PROFILE_EVENTS, key=lambda e: e["ts"])
+    if not events:
+        return
+    origin = events[0]["ts"]
+    total = max(e["ts"] + e["dur"] for e in events) - origin
+    print("\n⏱️ 安装阶段耗时:")
+    for event in events:
+        start, duration = (event["ts"] - origin) / 1e6, event["dur"] / 1e6
+        offset = int((event["ts"] - origin) * 30 / total) if total else 0
+        bar = " " * offset + "█" * max(1, int(event["dur"] * 30 / total) if total else 1)
+        width = sum(2 if unicodedata.east_asian_width(c) in "WF" else 1 for c in event["name"])
+        print(f"  {start:7.2f}s {duration:7.2f}s  {event['name']}{' ' * max(0, 20 - width)} {bar}")
+    print(f"  总耗时: {total / 1e6:.2f}s")
+    try:
+        with open(trace_path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms",
+                       "otherData": {"script": os.path.basename(__file__), "host": socket.gethostname(),
+                                     "machine": platform.machine(), "date": time.strftime("%Y-%m-%dT%H:%M:%S")}}, f)
+        print(f"📄 trace文件已保存到：{trace_path}")
+    except OSError as e:
+        print(f"⚠️ 写入trace文件失败: {e}")
+
+# HTTP连接池: 按 (协议, 主机, 端口) 保留 keep-alive 空闲连接，所有请求共用一个SSL上下文
+CONNECT_TIMEOUT = 10  # 建立连接超时(秒)
+READ_TIMEOUT = 30     # 单次读取超时(秒)
+HTTP_POOL_SIZE = 4    # 每个主机最多保留的空闲连接数
+HTTP_RETRIES = 2      # 连接失败时的重试次数
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+SSL_CONTEXT = ssl.create_default_context()  # 校验服务器证书 (与 urllib/requests 的默认行为一致)
+HTTP_POOL = {}
+HTTP_POOL_LOCK = threading.Lock()
+
+class PooledConnection:
+    """从连接池借出的连接，close() 时若响应已读完且服务器允许保持连接，则放回连接池"""
+    def __init__(self, key, conn, reused):
+        self.key = key
+        self.conn = conn
+        self.reused = reused
+        self.response = None
+    
+    def close(self):
+        if self.conn is None:
+            return
+        response = self.response
+        if response is not None and response.isclosed() and not response.will_close:
+            with HTTP_POOL_LOCK:
+                idle = HTTP_POOL.setdefault(self.key, [])
+                if len(idle) < HTTP_POOL_SIZE:
+                    idle.append(self.conn)
+                    self.conn = None
+                    return
+        self.conn.close()
+        self.conn = None
+
+def pool_connection(parts, timeout=None):
+    """借出一个连接：优先复用空闲连接，否则新建连接"""
+    key = (parts.scheme, parts.hostname, parts.port)
+    conn = None
+    with HTTP_POOL_LOCK:
+        if HTTP_POOL.get(key):
+            conn = HTTP_POOL[key].pop()
+    reused = conn is not None
+    if not reused:
+        if parts.scheme == "https":
+            conn = http.client.HTTPSConnection(parts.hostname, parts.port, timeout=CONNECT_TIMEOUT, context=SSL_CONTEXT)
+        else:
+            conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=CONNECT_TIMEOUT)
+        conn.connect()
+    conn.sock.settimeout(timeout or READ_TIMEOUT)
+    return PooledConnection(key, conn, reused)
+
+def http_open(method, url, headers=None, body=None, max_redirects=5, retries=HTTP_RETRIES, timeout=None):
+    """发送请求并跟随重定向，返回 (连接, 响应)；读完响应后调用 连接.close() 归还连接池
+    
+    复用的空闲连接已被服务器关闭时直接换新连接重发，其他连接错误最多重试 retries 次
+    """
+    request_headers = {'User-Agent': USER_AGENT}
+    request_headers.update(headers or {})
+    for redirects in range(max_redirects + 1):
+        parts = urllib.parse.urlsplit(url)
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        attempt = 0
+        while True:
+            conn = None
+            try:
+                conn = pool_connection(parts, timeout)
+                conn.conn.request(method, path, body=body, headers=request_headers)
+                response = conn.conn.getresponse()
+                break
+            except (OSError, http.client.HTTPException):
+                if conn:
+                    conn.close()
+                    if conn.reused:
+                        continue
+                attempt += 1
+                if attempt > retries:
+                    raise
+                time.sleep(min(2 ** attempt, 10))
+        conn.response = response
+        if method == "HEAD":
+            response.read()
+        if response.status in (301, 302, 303, 307, 308) and redirects < max_redirects:
+            location = response.getheader("Location")
+            response.read()
+            conn.close()
+            if not location:
+                raise Exception(f"HTTP {response.status} 缺少跳转地址")
+            url = urllib.parse.urljoin(url, location)
+            if response.status == 303:
+                method, body = "GET", None
+            continue
+        return conn, response
+
+def http_request(method, url, headers=None, body=None, max_redirects=5, retries=HTTP_RETRIES, timeout=None):
+    """发送请求并读取完整响应，返回 (状态码, 响应头, 响应体)"""
+    conn, response = http_open(method, url, headers, body, max_redirects, retries, timeout)
+    try:
+        return response.status, response.headers, response.read()
+    finally:
+        conn.close()
+
 def download_file(url, save_path, max_retries=3):
     """下载文件，带重试机制"""
     for i in range(max_retries):
+        conn = None
         try:
             print(f"正在下载... (尝试 {i+1}/{max_retries})")
-            urllib.request.urlretrieve(url, save_path)
+            conn, response = http_open("GET", url, retries=0)
+            if response.status != 200:
+                raise Exception(f"HTTP {response.status} {response.reason}")
+            with open(save_path, 'wb') as f:
+                shutil.copyfileobj(response, f, 64 * 1024)
             return True
         except Exception as e:
             print(f"下载失败: {e}")
             if i < max_retries - 1:
                 time.sleep(2)  # 等待2秒后重试
             continue
+        finally:
+            if conn:
+                conn.close()
     return False
 
+# 分段并行下载：部分地区GitHub CDN对单连接限速，按字节范围拆分后并发下载
+DOWNLOAD_SEGMENTS = 4                  # 并发分段数
+SEGMENT_MIN_SIZE = 4 * 1024 * 1024     # 小于此大小的文件不分段
+SEGMENT_RETRIES = 3                    # 单个分段中断后的续传次数
+
+def probe_ranges(url):
+    """跟随跳转到最终地址并探测是否支持Range，返回 (最终地址, 文件大小, 校验标识)；不支持时文件大小为None"""
+    for _ in range(5):
+        conn, response = http_open("GET", url, {'Range': 'bytes=0-0'}, max_redirects=0)
+        try:
+            if response.status in (301, 302, 303, 307, 308):
+                url = urllib.parse.urljoin(url, response.getheader("Location") or "")
+                continue
+            if response.status == 206:
+                response.read()
+                content_range = response.getheader('Content-Range') or ''
+                total = content_range.rsplit('/', 1)[-1]
+                validator = response.getheader('ETag') or response.getheader('Last-Modified')
+                return url, int(total) if total.isdigit() else None, validator
+            if response.status == 200:
+                return url, None, None
+            raise Exception(f"HTTP {response.status} {response.reason}")
+        finally:
+            conn.close()
+    raise Exception("重定向次数过多")
+
+def fetch_segment(url, fd, start, end, total, validator, progress):
+    """下载 [start, end] 字节范围并按偏移写入预分配的文件，中断后从已写入位置续传"""
+    offset = start
+    for attempt in range(SEGMENT_RETRIES + 1):
+        conn = None
+        try:
+            headers = {'Range': f"bytes={offset}-{end}"}
+            if validator:
+                headers['If-Range'] = validator
+            conn, response = http_open("GET", url, headers, retries=0)
+            if response.status != 206:
+                raise Exception(f"服务器未按范围返回 (HTTP {response.status})")
+            if not (response.getheader('Content-Range') or '').endswith(f"/{total}"):
+                raise Exception("文件在下载过程中发生变化")
+            while offset <= end:
+                chunk = response.read(min(64 * 1024, end - offset + 1))
+                if not chunk:
+                    raise Exception(f"连接提前关闭 ({offset - start}/{end - start + 1} 字节)")
+                os.pwrite(fd, chunk, offset)
+                offset += len(chunk)
+                progress(len(chunk))
+            return
+        except Exception as e:
+            if attempt == SEGMENT_RETRIES:
+                raise
+            print(f"分段 {start}-{end} 中断: {e}，从 {offset} 字节处续传")
+            time.sleep(min(2 ** attempt, 10))
+        finally:
+            if conn:
+                conn.close()
+
+def segmented_download(url, save_path, segments=DOWNLOAD_SEGMENTS):
+    """分段并行下载到预分配的文件并校验大小，服务器不支持Range或文件较小时退回单连接下载"""
+    try:
+        url, total, validator = probe_ranges(url)
+    except Exception as e:
+        print(f"探测下载地址失败: {e}")
+        return False
+    if not total or total < SEGMENT_MIN_SIZE or segments <= 1:
+        print("服务器不支持分段下载，使用单连接下载")
+        return download_file(url, save_path)
+    
+    part_path = f"{save_path}.part"
+    size = -(-total // segments)
+    ranges = [(start, min(start + size, total) - 1) for start in range(0, total, size)]
+    lock = threading.Lock()
+    state = {"done": 0, "last_report": time.time()}
+    start_time = time.time()
+    
+    def progress(n):
+        with lock:
+            state["done"] += n
+            if time.time() - state["last_report"] >= 1 or state["done"] == total:
+                state["last_report"] = time.time()
+                speed = state["done"] / max(time.time() - start_time, 0.001)
+                print(f"\r下载进度: {state['done'] * 100 // total}% ({state['done'] / 1024 / 1024:.1f}/{total / 1024 / 1024:.1f}MB) {speed / 1024 / 1024:.2f}MB/s", end='', flush=True)
+    
+    print(f"分段下载: {len(ranges)} 个分段，共 {total / 1024 / 1024:.1f}MB")
+    fd = os.open(part_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        # 预分配文件，各分段直接写入各自的偏移位置
+        if hasattr(os, 'posix_fallocate'):
+            os.posix_fallocate(fd, 0, total)
+        else:
+            os.ftruncate(fd, total)
+        with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+            futures = [pool.submit(fetch_segment, url, fd, start, end, total, validator, progress) for start, end in ranges]
+            for future in futures:
+                future.result()
+        os.fsync(fd)
+    except Exception as e:
+        print(f"\n分段下载失败: {e}，改用单连接下载")
+        os.close(fd)
+        os.remove(part_path)
+        return download_file(url, save_path)
+    os.close(fd)
+    print()
+    
+    if state["done"] != total or os.path.getsize(part_path) != total:
+        print(f"分段下载校验失败: {state['done']}/{total} 字节")
+        os.remove(part_path)
+        return False
+    os.replace(part_path, save_path)
+    print(f"分段下载完成: {total / 1024 / 1024:.1f}MB, 耗时 {time.time() - start_time:.1f}s")
+    return True
+
+# 共享二进制缓存，与 agsb 系列脚本共用同一目录，重装时不再重复下载
+CACHE_DIR = Path(os.environ.get("AGSB_CACHE_DIR") or Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "agsb")
+CACHE_MAX_BYTES = int(os.environ.get("AGSB_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+def file_sha256(path):
+    """计算文件的SHA-256"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+@contextmanager
+def cache_index():
+    """加锁读写缓存索引（工具/版本/架构 -> SHA-256）"""
+    (CACHE_DIR / "objects").mkdir(parents=True, exist_ok=True)
+    with open(CACHE_DIR / ".lock", 'a') as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        index_file = CACHE_DIR / "index.json"
+        try:
+            with open(index_file, 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        yield index
+        tmp_file = f"{index_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_file, index_file)
+
+def link_or_copy(src, target_path):
+    """硬链接（跨文件系统时复制）到目标路径，原子替换"""
+    tmp_path = f"{target_path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        shutil.copy2(src, tmp_path)
+    os.chmod(tmp_path, 0o755)
+    os.replace(tmp_path, target_path)
+
+def cache_evict(index, keep_key):
+    """按最近使用时间淘汰缓存，直到总大小不超过上限"""
+    total = sum(entry["size"] for entry in {e["sha256"]: e for e in index.values()}.values())
+    for key in sorted(index, key=lambda k: index[k]["atime"]):
+        if total <= CACHE_MAX_BYTES:
+            break
+        if key == keep_key:
+            continue
+        digest = index.pop(key)["sha256"]
+        if not any(e["sha256"] == digest for e in index.values()):
+            obj_path = CACHE_DIR / "objects" / digest
+            if obj_path.exists():
+                total -= os.path.getsize(obj_path)
+                os.remove(obj_path)
+
+def cache_fetch(tool, version, arch, target_path):
+    """从缓存安装二进制文件，命中并校验通过返回True"""
+    if not version:
+        return False
+    key = f"{tool}/{version}/{arch}"
+    try:
+        with cache_index() as index:
+            entry = index.get(key)
+            if not entry:
+                return False
+            obj_path = CACHE_DIR / "objects" / entry["sha256"]
+            if not obj_path.exists() or file_sha256(obj_path) != entry["sha256"]:
+                index.pop(key)
+                if obj_path.exists():
+                    os.remove(obj_path)
+                return False
+            entry["atime"] = time.time()
+            link_or_copy(obj_path, target_path)
+        print(f"✅ {tool} {version} 已从缓存安装: {target_path}")
+        return True
+    except Exception as e:
+        print(f"⚠️ 读取缓存失败: {e}")
+        return False
+
+def cache_store(tool, version, arch, src_path):
+    """将新下载的二进制文件存入缓存"""
+    if not version:
+        return
+    key = f"{tool}/{version}/{arch}"
+    try:
+        digest = file_sha256(src_path)
+        with cache_index() as index:
+            obj_path = CACHE_DIR / "objects" / digest
+            if not obj_path.exists():
+                link_or_copy(src_path, obj_path)
+            index[key] = {"sha256": digest, "size": os.path.getsize(obj_path), "atime": time.time()}
+            cache_evict(index, key)
+    except Exception as e:
+        print(f"⚠️ 写入缓存失败: {e}")
+
+def verify_bundle(bundle_path):
+    """存在 <bundle>.sha256 时校验整个离线安装包"""
+    checksum_file = f"{bundle_path}.sha256"
+    if not os.path.exists(checksum_file):
+        print(f"⚠️ 未找到 {checksum_file}，仅校验包内各文件的SHA-256")
+        return
+    with open(checksum_file, 'r') as f:
+        expected = f.read().split()[0].lower()
+    if file_sha256(bundle_path) != expected:
+        raise Exception(f"离线安装包校验失败: {bundle_path} 与 {checksum_file} 不匹配")
+
+def extract_bundle(bundle_path, wanted):
+    """从 agsb.py bundle create 生成的离线安装包中流式解压所需文件
+    
+    wanted 为 {(工具, 架构): 目标路径}，每个文件按清单中的SHA-256校验
+    """
+    verify_bundle(bundle_path)
+    manifest = None
+    pending = dict(wanted)
+    installed = []
+    with open(bundle_path, 'rb') as f, tarfile.open(fileobj=f, mode="r|gz") as tar:
+        for member in tar:
+            if member.name == "manifest.json":
+                with tar.extractfile(member) as src:
+                    manifest = {e["name"]: e for e in json.load(src)["files"]}
+                continue
+            if manifest is None:
+                raise Exception("离线安装包缺少清单文件")
+            entry = manifest.get(member.name)
+            if not entry or (entry["tool"], entry["arch"]) not in pending:
+                continue
+            target_path = pending.pop((entry["tool"], entry["arch"]))
+            tmp_path = f"{target_path}.{os.getpid()}.tmp"
+            sha = hashlib.sha256()
+            try:
+                with tar.extractfile(member) as src, open(tmp_path, 'wb') as dst:
+                    for chunk in iter(lambda: src.read(1024 * 1024), b''):
+                        sha.update(chunk)
+                        dst.write(chunk)
+                if sha.hexdigest() != entry["sha256"]:
+                    raise Exception(f"{member.name} 校验失败")
+                os.chmod(tmp_path, 0o755)
+                os.replace(tmp_path, str(target_path))
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            installed.append(entry)
+            if not pending:
+                break
+    if pending:
+        missing = ", ".join(f"{tool} ({arch})" for tool, arch in pending)
+        raise Exception(f"离线安装包中没有: {missing}")
+    return installed
+
+@profiled("查询最新版本")
 def get_latest_version():
-    """返回固定的最新版本号 v2.6.1"""
+    """返回 agsb prefetch 预取并校验过的版本，没有时使用固定版本 v2.6.1"""
+    try:
+        with open(CACHE_DIR / "staged.json", 'r') as f:
+            version = json.load(f).get("hysteria", {}).get("version")
+        if version:
+            return version
+    except (OSError, ValueError, AttributeError):
+        pass
     return "v2.6.1"
 
 def get_download_filename(os_name, arch):
@@ -253,8 +904,22 @@ def verify_binary(binary_path):
     except:
         return False
 
-def download_hysteria2(base_dir):
-    """下载Hysteria2二进制文件，使用简化链接和验证方式"""
+@profiled("获取Hysteria2")
+def download_hysteria2(base_dir, bundle_path=None):
+    """下载Hysteria2二进制文件，使用简化链接和验证方式；指定离线安装包时直接从包中解压"""
+    if bundle_path:
+        os_name, arch = get_system_info()
+        binary_path = f"{base_dir}/hysteria"
+        print(f"使用离线安装包: {bundle_path}")
+        try:
+            entry = extract_bundle(bundle_path, {("hysteria", f"{os_name}-{arch}"): binary_path})[0]
+        except Exception as e:
+            print(f"❌ 离线安装失败: {e}")
+            sys.exit(1)
+        cache_store("hysteria", entry["version"], entry["arch"], binary_path)
+        print(f"✅ Hysteria2 {entry['version']} 已从离线安装包安装: {binary_path}")
+        return binary_path, entry["version"]
+    
     try:
         version = get_latest_version()
         os_name, arch = get_system_info()
@@ -271,26 +936,35 @@ def download_hysteria2(base_dir):
         print(f"系统类型: {os_name}, 架构: {arch}, 文件名: {filename}")
         print(f"下载链接: {url}")
         
-        # 使用wget下载
+        # 优先使用共享缓存
+        if cache_fetch("hysteria", version, f"{os_name}-{arch}", binary_path) and verify_binary(binary_path):
+            return binary_path, version
+        
+        # 分段并行下载，失败时再用wget/curl下载
         try:
+            # 先删除旧文件，避免覆盖写入与缓存共享的硬链接
+            if os.path.exists(binary_path):
+                os.remove(binary_path)
+            
             has_wget = shutil.which('wget') is not None
             has_curl = shutil.which('curl') is not None
             
-            if has_wget:
-                print("使用wget下载...")
-                subprocess.run(['wget', '--tries=3', '--timeout=15', '-O', binary_path, url], check=True)
-            elif has_curl:
-                print("使用curl下载...")
-                subprocess.run(['curl', '-L', '--connect-timeout', '15', '-o', binary_path, url], check=True)
-            else:
-                print("系统无wget/curl，尝试使用Python下载...")
-                urllib.request.urlretrieve(url, binary_path)
+            if not segmented_download(url, binary_path):
+                if has_wget:
+                    print("使用wget下载...")
+                    subprocess.run(['wget', '--tries=3', '--timeout=15', '-O', binary_path, url], check=True)
+                elif has_curl:
+                    print("使用curl下载...")
+                    subprocess.run(['curl', '-L', '--connect-timeout', '15', '-o', binary_path, url], check=True)
+                else:
+                    raise Exception("Python下载失败，且系统无wget/curl")
                 
             # 验证下载
             if not verify_binary(binary_path):
                 raise Exception("下载的文件无效")
                 
             print(f"下载成功: {binary_path}, 大小: {os.path.getsize(binary_path)/1024/1024:.2f}MB")
+            cache_store("hysteria", version, f"{os_name}-{arch}", binary_path)
             return binary_path, version
             
         except Exception as e:
@@ -324,17 +998,18 @@ def get_ip_address():
     # 首先尝试获取公网IP
     try:
         # 尝试从公共API获取公网IP
-        with urllib.request.urlopen('https://api.ipify.org', timeout=5) as response:
-            public_ip = response.read().decode('utf-8')
-            if public_ip and len(public_ip) > 0:
-                return public_ip
+        status, _, data = http_request("GET", 'https://api.ipify.org', retries=0, timeout=5)
+        public_ip = data.decode('utf-8').strip() if status == 200 else ""
+        if public_ip and len(public_ip) > 0:
+            return public_ip
+        raise Exception(f"HTTP {status}")
     except:
         try:
             # 备选API
-            with urllib.request.urlopen('https://ifconfig.me', timeout=5) as response:
-                public_ip = response.read().decode('utf-8')
-                if public_ip and len(public_ip) > 0:
-                    return public_ip
+            status, _, data = http_request("GET", 'https://ifconfig.me', retries=0, timeout=5)
+            public_ip = data.decode('utf-8').strip() if status == 200 else ""
+            if public_ip and len(public_ip) > 0:
+                return public_ip
         except:
             pass
 
@@ -458,6 +1133,7 @@ http {{
         print(f"❌ 配置失败: {e}")
         return False, None
 
+@profiled("创建Web伪装")
 def create_web_masquerade(base_dir):
     """创建Web伪装页面"""
     web_dir = f"{base_dir}/web"
@@ -815,6 +1491,7 @@ Sitemap: /sitemap.xml
     
     return web_dir
 
+@profiled("生成自签名证书")
 def generate_self_signed_cert(base_dir, domain):
     """生成自签名证书"""
     cert_dir = f"{base_dir}/cert"
@@ -847,6 +1524,7 @@ def generate_self_signed_cert(base_dir, domain):
         print(f"生成证书失败: {e}")
         sys.exit(1)
 
+@profiled("申请真实证书")
 def get_real_certificate(base_dir, domain, email="admin@example.com"):
     """使用certbot获取真实的Let's Encrypt证书"""
     cert_dir = f"{base_dir}/cert"
@@ -904,6 +1582,7 @@ def get_real_certificate(base_dir, domain, email="admin@example.com"):
         print("将使用自签名证书作为备选...")
         return None, None
 
+@profiled("生成配置")
 def create_config(base_dir, port, password, cert_path, key_path, domain, enable_web_masquerade=True, custom_web_dir=None, enable_port_hopping=False, obfs_password=None, enable_http3_masquerade=False):
     """创建Hysteria2配置文件（端口跳跃、混淆、HTTP/3伪装）"""
     
@@ -1049,6 +1728,15 @@ def create_service_script(base_dir, binary_path, config_path, port):
     os_name = platform.system().lower()
     pid_file = f"{base_dir}/hysteria.pid"
     log_file = f"{base_dir}/logs/hysteria.log"
+    start_command = f"nohup {binary_path} server -c {config_path} > {log_file} 2>&1 &"
+    script_copy = install_script_copy(base_dir) if os_name != 'windows' else None
+    if script_copy:
+        # 输出经日志管道按大小轮转；脚本副本或 python3 不可用时退回直接重定向
+        start_command = f"""if [ -f "{script_copy}" ] && command -v python3 >/dev/null 2>&1; then
+    nohup {binary_path} server -c {config_path} > >(exec python3 "{script_copy}" logpipe "{log_file}" >/dev/null 2>&1) 2>&1 &
+else
+    {start_command}
+fi"""
     
     if os_name == 'windows':
         script_content = f"""@echo off
@@ -1074,7 +1762,7 @@ if [ ! -f "{config_path}" ]; then
 fi
 
 # 启动服务
-nohup {binary_path} server -c {config_path} > {log_file} 2>&1 &
+{start_command}
 echo $! > {pid_file}
 echo "Hysteria2 服务已启动，PID: $(cat {pid_file})"
 
@@ -1165,18 +1853,15 @@ def delete_hysteria2():
         
         # 查找并停止所有hysteria进程
         try:
-            result = subprocess.run(['pgrep', '-f', 'hysteria'], capture_output=True, text=True)
-            if result.stdout.strip():
-                pids = result.stdout.strip().split('\n')
-                for pid in pids:
+            for pid in map(str, find_pids('hysteria')):
+                try:
+                    subprocess.run(['sudo', 'kill', '-15', pid], check=True)
+                    print(f"✅ 已停止hysteria进程: {pid}")
+                except:
                     try:
-                        subprocess.run(['sudo', 'kill', '-15', pid], check=True)
-                        print(f"✅ 已停止hysteria进程: {pid}")
+                        subprocess.run(['sudo', 'kill', '-9', pid], check=True)
                     except:
-                        try:
-                            subprocess.run(['sudo', 'kill', '-9', pid], check=True)
-                        except:
-                            pass
+                        pass
         except:
             pass
             
@@ -1379,6 +2064,199 @@ def delete_hysteria2():
     
     return True
 
+# 资源采样: top 命令按固定间隔读取各组件进程的 /proc 数据，最近的样本保存在内存的环形缓冲区中
+SAMPLE_INTERVAL = 2.0  # 默认采样间隔(秒)
+SAMPLE_HISTORY = 300  # 每个组件保留的样本数
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else None  # Windows 没有 os.sysconf
+
+def proc_supported():
+    """资源数据 (status --json/--prometheus、top) 直接读取 /proc，仅 Linux 可用"""
+    return CLOCK_TICKS is not None and os.path.isdir("/proc")
+
+def process_stats(pid):
+    """读取进程的资源占用 (/proc/<pid>/stat、status、fd): 运行时间(秒)、CPU 时间(时钟滴答)、常驻内存(字节)、线程数和打开的文件描述符数量"""
+    with open(f"/proc/{pid}/stat", 'rb') as f:
+        fields = f.read().rsplit(b')', 1)[1].split()
+    with open("/proc/uptime", 'rb') as f:
+        system_uptime = float(f.read().split()[0])
+    rss_bytes = threads = None
+    with open(f"/proc/{pid}/status", 'rb') as f:
+        for line in f:
+            if line.startswith(b"VmRSS:"):
+                rss_bytes = int(line.split()[1]) * 1024
+            elif line.startswith(b"Threads:"):
+                threads = int(line.split()[1])
+    try:
+        open_fds = len(os.listdir(f"/proc/{pid}/fd"))
+    except OSError:
+        open_fds = None
+    return {"uptime": round(system_uptime - int(fields[19]) / CLOCK_TICKS, 2), "cpu_ticks": int(fields[11]) + int(fields[12]),
+            "rss_bytes": rss_bytes, "threads": threads, "open_fds": open_fds}
+
+class ResourceSampler:
+    """按组件采样资源占用: pids_fn 返回 {组件名: [PID, ...]}，同一组件的多个进程合计；CPU 为两次采样之间的占用百分比"""
+    
+    def __init__(self, pids_fn, history=SAMPLE_HISTORY):
+        self.pids_fn = pids_fn
+        self.history = history
+        self.samples = {}
+        self.cpu_ticks = {}
+        self.last_time = None
+    
+    def sample(self):
+        """采样一次，每个组件追加一条记录"""
+        now = time.monotonic()
+        cpu_ticks = {}
+        for name, pids in self.pids_fn().items():
+            record = {"time": round(time.time(), 3), "pids": [], "cpu": None, "rss_bytes": None, "threads": None, "open_fds": None}
+            cpu = 0
+            for pid in pids:
+                try:
+                    stats = process_stats(pid)
+                except (OSError, IndexError, ValueError):
+                    continue  # 进程已退出
+                cpu_ticks[pid] = stats["cpu_ticks"]
+                if pid in self.cpu_ticks:
+                    cpu += stats["cpu_ticks"] - self.cpu_ticks[pid]
+                    record["cpu"] = 0.0
+                record["pids"].append(pid)
+                for key in ("rss_bytes", "threads", "open_fds"):
+                    if stats[key] is not None:
+                        record[key] = (record[key] or 0) + stats[key]
+            if record["cpu"] is not None and now > self.last_time:
+                record["cpu"] = round(cpu / CLOCK_TICKS / (now - self.last_time) * 100, 1)
+            self.samples.setdefault(name, deque(maxlen=self.history)).append(record)
+        self.cpu_ticks = cpu_ticks
+        self.last_time = now
+    
+    def snapshot(self):
+        """返回 {组件名: [记录, ...]}"""
+        return {name: list(samples) for name, samples in self.samples.items()}
+
+def sparkline(values, width, floor=None):
+    """将数值序列画成宽度为 width 的迷你折线，缺失的样本显示为空格；floor 为纵轴下限，默认取序列最小值"""
+    values = values[-width:]
+    present = [v for v in values if v is not None]
+    if not present:
+        return " " * len(values)
+    low = min(present) if floor is None else floor
+    span = max(present) - low
+    return "".join(" " if v is None else SPARK_CHARS[int((v - low) / span * (len(SPARK_CHARS) - 1)) if span else 0]
+                   for v in values)
+
+def render_top(samples, interval):
+    """绘制一屏资源视图: 每个组件显示当前值、迷你折线和窗口内峰值"""
+    columns = shutil.get_terminal_size((80, 24)).columns
+    width = max(10, min(SAMPLE_HISTORY, columns - 36))
+    metrics = (("CPU ", "cpu", lambda v: f"{v:.1f}%", 0), ("RSS ", "rss_bytes", lambda v: f"{v / 1024 / 1024:.1f}MB", None),
+               ("FD  ", "open_fds", str, None), ("线程", "threads", str, None))
+    out = ["\033[H\033[J", f"Hysteria2 top  {time.strftime('%H:%M:%S')}  采样间隔 {interval:g}s  最近 {width} 个样本  Ctrl+C 退出", ""]
+    for name, records in samples.items():
+        current = records[-1] if records else {}
+        pids = ",".join(map(str, current.get("pids") or [])) or "未运行"
+        out.append(f"{name}  PID {pids}")
+        for label, key, fmt, floor in metrics:
+            values = [record[key] for record in records]
+            present = [v for v in values[-width:] if v is not None]
+            value = fmt(current[key]) if current.get(key) is not None else "-"
+            peak = fmt(max(present)) if present else "-"
+            out.append(f"  {label} {value:>9} {sparkline(values, width, floor)} 峰值 {peak}")
+        out.append("")
+    sys.stdout.write("\n".join(out))
+    sys.stdout.flush()
+
+def show_top(interval=SAMPLE_INTERVAL):
+    """实时显示各组件的 CPU、内存、文件描述符和线程数，Ctrl+C 退出"""
+    base_dir = f"{get_user_home()}/.hysteria2"
+    sampler = ResourceSampler(lambda: {"hysteria": component_pids("hysteria", f"{base_dir}/hysteria.pid"), "nginx": find_pids("nginx")})
+    try:
+        while True:
+            sampler.sample()
+            render_top(sampler.snapshot(), interval)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print()
+
+def component_pids(name, pid_file=None):
+    """组件的进程 PID 列表: 优先读取PID文件，否则按程序名查找"""
+    if pid_file and check_process_running(pid_file):
+        with open(pid_file, 'r') as f:
+            return [int(f.read().strip())]
+    return find_pids(name)
+
+def component_status(name, pid_file=None):
+    """检查单个组件: PID (优先读取PID文件)、运行时间、内存、文件描述符和监听端口，附带检查耗时"""
+    check_start = time.perf_counter()
+    pids = component_pids(name, pid_file)
+    component = {"up": False, "pid": None, "uptime": None, "rss_bytes": None, "open_fds": None, "listen": []}
+    if pids:
+        try:
+            stats = process_stats(pids[0])
+            component.update({key: stats[key] for key in ("uptime", "rss_bytes", "open_fds")}, up=True, pid=pids[0])
+            component["listen"] = [{"proto": proto, "port": port} for proto, port in process_ports(pids)]
+        except (OSError, IndexError, ValueError):
+            pass
+    component["check_ms"] = round((time.perf_counter() - check_start) * 1000, 3)
+    return component
+
+def status_report():
+    """汇总机器可读的运行状态 (供 status --json / --prometheus 使用)，字段固定，取不到的值为 null"""
+    report_start = time.perf_counter()
+    base_dir = f"{get_user_home()}/.hysteria2"
+    components = {"hysteria": component_status("hysteria", f"{base_dir}/hysteria.pid"),
+                  "nginx": component_status("nginx")}
+    
+    check_start = time.perf_counter()
+    try:
+        with open(f"{base_dir}/global_config.json", 'r', encoding='utf-8') as f:
+            domain = json.load(f).get("server_address")
+    except (OSError, ValueError):
+        domain = None
+    domain_ms = round((time.perf_counter() - check_start) * 1000, 3)
+    
+    check_start = time.perf_counter()
+    try:
+        with open(f"{base_dir}/hysteria2-multi-port-links.txt", 'r', encoding='utf-8') as f:
+            links = sum(1 for line in f if line.startswith("hysteria2://"))
+    except OSError:
+        links = 0
+    links_ms = round((time.perf_counter() - check_start) * 1000, 3)
+    
+    return {"schema": 1, "host": socket.gethostname(), "time": round(time.time(), 3),
+            "up": components["hysteria"]["up"], "components": components, "domain": domain, "links": links,
+            "checks_ms": {"domain": domain_ms, "links": links_ms},
+            "duration_ms": round((time.perf_counter() - report_start) * 1000, 3)}
+
+def prometheus_metrics(report, prefix="hysteria2"):
+    """将状态转换为 Prometheus 文本格式"""
+    lines = [f"# TYPE {prefix}_up gauge", f"{prefix}_up {int(report['up'])}"]
+    gauges = (("component_up", "up"), ("process_uptime_seconds", "uptime"),
+              ("process_resident_memory_bytes", "rss_bytes"), ("process_open_fds", "open_fds"),
+              ("check_duration_seconds", "check_ms"))
+    for metric, key in gauges:
+        lines.append(f"# TYPE {prefix}_{metric} gauge")
+        for name, component in report["components"].items():
+            value = component[key]
+            if value is None:
+                continue
+            if key == "check_ms":
+                value = round(value / 1000, 6)
+            lines.append(f'{prefix}_{metric}{{component="{name}"}} {int(value) if isinstance(value, bool) else value}')
+    lines.append(f"# TYPE {prefix}_listening_port gauge")
+    for name, component in report["components"].items():
+        for sock in component["listen"]:
+            lines.append(f'{prefix}_listening_port{{component="{name}",proto="{sock["proto"]}",port="{sock["port"]}"}} 1')
+    if report["links"] is not None:
+        lines.append(f"# TYPE {prefix}_links gauge")
+        lines.append(f"{prefix}_links {report['links']}")
+    if report["domain"]:
+        lines.append(f"# TYPE {prefix}_domain_info gauge")
+        lines.append(f'{prefix}_domain_info{{domain="{report["domain"]}"}} 1')
+    lines.append(f"# TYPE {prefix}_status_duration_seconds gauge")
+    lines.append(f"{prefix}_status_duration_seconds {round(report['duration_ms'] / 1000, 6)}")
+    return "\n".join(lines) + "\n"
+
 def show_status():
     """显示Hysteria2状态"""
     home = get_user_home()
@@ -1396,6 +2274,8 @@ def show_status():
                 pid = f.read().strip()
             if os.path.exists(f"/proc/{pid}"):
                 print(f"服务状态: 运行中 (PID: {pid})")
+                ports = ", ".join(f"{proto}/{port}" for proto, port in process_ports([int(pid)]))
+                print(f"监听端口: {ports or '无'}")
             else:
                 print("服务状态: 已停止")
         except:
@@ -1423,13 +2303,12 @@ def show_status():
     if os.path.exists(log_path):
         print("\n最近日志:")
         try:
-            with open(log_path, 'r') as f:
-                logs = f.readlines()
-                for line in logs[-10:]:  # 显示最后10行
-                    print(line.strip())
-        except:
+            for line in tail_file(log_path, 10):  # 显示最后10行
+                print(line.strip())
+        except OSError:
             print("无法读取日志文件")
 
+@profiled("启动服务")
 def start_service(start_script, port, base_dir):
     """启动服务并等待服务成功运行"""
     print(f"正在启动 Hysteria2 服务...")
@@ -1487,12 +2366,15 @@ def show_help():
     
     del          删除 Hysteria2
     status       查看 Hysteria2 状态
+    logs         查看日志 (-n 行数, --grep 正则, -f 持续跟踪)
+    top          实时查看 hysteria/nginx 的CPU、内存、文件描述符和线程数
     help         显示此帮助信息
 
 🔧 基础选项:
     --ip IP           指定服务器IP地址
     --port PORT       指定服务器端口 (推荐: 443)
     --password PWD    指定密码
+    --bundle FILE     使用离线安装包安装 (agsb.py bundle create 生成)
 
 🔐 防墙增强选项:
     --domain DOMAIN         指定域名 (推荐用于真实证书)
@@ -1631,6 +2513,7 @@ def create_nginx_masquerade(base_dir, domain, web_dir):
     
     return nginx_conf_file
 
+@profiled("配置nginx")
 def setup_dual_port_masquerade(base_dir, domain, web_dir, cert_path, key_path):
     """设置双端口伪装：TCP用于Web，UDP用于Hysteria2"""
     print("正在设置双端口伪装方案...")
@@ -1830,9 +2713,15 @@ def show_client_setup(config_link, server_address, port, password, use_real_cert
     )
 
 def main():
+    global PROFILE_ENABLED
+    # 由启动脚本调用的日志管道，不经过参数解析
+    if sys.argv[1:2] == ['logpipe'] and len(sys.argv) > 2:
+        log_pipe(os.path.abspath(sys.argv[2]))
+        return
+    
     parser = argparse.ArgumentParser(description='Hysteria2 一键部署工具（防墙增强版）')
     parser.add_argument('command', nargs='?', default='install',
-                      help='命令: install, del, status, help, setup-nginx, client, fix')
+                      help='命令: install, del, status, logs, top, help, setup-nginx, client, fix')
     parser.add_argument('--ip', help='指定服务器IP地址或域名')
     parser.add_argument('--port', type=int, help='指定服务器端口（推荐443）')
     parser.add_argument('--password', help='指定密码')
@@ -1860,14 +2749,44 @@ def main():
                       help='指定端口跳跃范围 (格式: 起始端口-结束端口，如: 28888-29999)')
     parser.add_argument('--enable-bbr', action='store_true',
                       help='启用BBR拥塞控制算法优化网络性能')
-    
-    
+    parser.add_argument('--bundle',
+                      help='使用离线安装包安装 (由 agsb.py bundle create 生成)')
+    
+    
+    parser.add_argument('--json', action='store_true', help='status 命令输出JSON格式')
+    parser.add_argument('--prometheus', action='store_true', help='status 命令输出Prometheus格式')
+    parser.add_argument('-n', '--lines', type=int, default=50, help='logs 命令显示的行数 (默认50)')
+    parser.add_argument('--grep', metavar='REGEX', help='logs 命令只显示匹配正则的行')
+    parser.add_argument('-f', '--follow', action='store_true', help='logs 命令持续输出新增的日志')
+    parser.add_argument('--interval', type=float, default=SAMPLE_INTERVAL, help='top 命令的采样间隔(秒)')
+    parser.add_argument('--profile', metavar='FILE',
+                      help='安装阶段耗时 trace 文件 (默认 ~/.hysteria2/install-trace.json)')
     args = parser.parse_args()
     
     if args.command == 'del':
         delete_hysteria2()
     elif args.command == 'status':
-        show_status()
+        if (args.json or args.prometheus) and not proc_supported():
+            if args.json:
+                print(json.dumps({"schema": 1, "error": "unsupported", "platform": platform.system()}))
+            else:
+                print(f"# unsupported: 需要 Linux /proc (当前系统: {platform.system()})")
+            sys.exit(1)
+        if args.json:
+            print(json.dumps(status_report(), ensure_ascii=False))
+        elif args.prometheus:
+            sys.stdout.write(prometheus_metrics(status_report()))
+        else:
+            show_status()
+    elif args.command == 'top':
+        if args.interval <= 0:
+            parser.error("--interval 必须大于0")
+        if not proc_supported():
+            print(f"top 需要 Linux /proc，当前系统 ({platform.system()}) 不支持 (unsupported)")
+            sys.exit(1)
+        show_top(args.interval)
+    elif args.command == 'logs':
+        show_logs(args.lines, args.grep, args.follow)
     elif args.command == 'help':
         show_help()
 
@@ -2088,6 +3007,13 @@ curl -k https://{domain}  # HTTPS访问
             print(f"❌ nginx重新加载失败: {e}")
             print("请手动检查nginx配置: sudo nginx -t")
     elif args.command == 'install':
+        # 阶段耗时: 无论安装成功或中途退出都输出时间线
+        PROFILE_ENABLED = True
+        atexit.register(write_profile, os.path.abspath(args.profile) if args.profile else f"{get_user_home()}/.hysteria2/install-trace.json")
+        
+        # 离线安装包 (由 agsb.py bundle create 生成)
+        bundle_path = os.path.abspath(args.bundle) if args.bundle else None
+        
         # 简化一键部署
         if args.simple:
             server_address = args.ip if args.ip else get_ip_address()
@@ -2102,7 +3028,8 @@ curl -k https://{domain}  # HTTPS访问
                 domain=args.domain,
                 email=args.email if args.email else "admin@example.com",
                 port_range=args.port_range,
-                enable_bbr=args.enable_bbr
+                enable_bbr=args.enable_bbr,
+                bundle_path=bundle_path
             )
             return
         
@@ -2206,7 +3133,7 @@ curl -k https://{domain}  # HTTPS访问
         base_dir = create_directories()
         
         # 下载Hysteria2
-        binary_path, version = download_hysteria2(base_dir)
+        binary_path, version = download_hysteria2(base_dir, bundle_path)
         
         # 验证二进制文件
         if not verify_binary(binary_path):
@@ -2412,6 +3339,7 @@ SNI: {server_address}
         show_help()
         sys.exit(1)
 
+@profiled("配置端口跳跃")
 def setup_port_hopping_iptables(port_start, port_end, listen_port):
     """配置iptables实现端口跳跃"""
     try:
@@ -2507,7 +3435,7 @@ def setup_port_hopping_iptables(port_start, port_end, listen_port):
         print("端口跳跃功能可能无法正常工作")
         return False
 
-def deploy_hysteria2_complete(server_address, port=443, password="123qwe!@#QWE", enable_real_cert=False, domain=None, email="admin@example.com", port_range=None, enable_bbr=False):
+def deploy_hysteria2_complete(server_address, port=443, password="123qwe!@#QWE", enable_real_cert=False, domain=None, email="admin@example.com", port_range=None, enable_bbr=False, bundle_path=None):
     """
     Hysteria2完整一键部署：端口跳跃 + 混淆 + nginx Web伪装
     """
@@ -2519,7 +3447,7 @@ def deploy_hysteria2_complete(server_address, port=443, password="123qwe!@#QWE",
     print(f"✅ 创建目录：{base_dir}")
     
     # 2. 下载Hysteria2
-    binary_path, version = download_hysteria2(base_dir)
+    binary_path, version = download_hysteria2(base_dir, bundle_path)
     print(f"✅ 下载Hysteria2：{version}")
     
     # 3. 生成混淆密码
@@ -2916,6 +3844,7 @@ http:
         "nginx_success": nginx_success
     }
 
+@profiled("配置nginx")
 def setup_nginx_web_masquerade(base_dir, server_address, web_dir, cert_path, key_path, port):
     """
     配置nginx Web伪装的简化版本
@@ -3010,6 +3939,7 @@ server {{
         print(f"❌ nginx配置失败: {e}")
         return False
 
+@profiled("启用BBR")
 def enable_bbr_optimization():
     """启用BBR拥塞控制算法优化网络性能"""
     try:
@@ -3509,6 +4439,27 @@ show_config_info() {{
     fi
 }}
 
+# 按程序名查找进程PID: 读取 /proc/<pid>/cmdline 的 argv[0] 精确匹配，不调用 pgrep
+find_pids() {{
+    local name="$1" pids="" dir argv0
+    for dir in /proc/[0-9]*; do
+        argv0=""
+        IFS= read -r -d '' argv0 < "$dir/cmdline" 2>/dev/null || [ -n "$argv0" ] || continue
+        argv0="${{argv0%%:*}}"
+        [ "${{argv0##*/}}" = "$name" ] && pids="$pids ${{dir#/proc/}}"
+    done
+    echo $pids
+}}
+
+# 解析 /proc/net 判断端口是否在监听 (TCP 为 LISTEN 状态，UDP 为已绑定)，不调用 netstat
+port_listening() {{
+    local proto="$1" port state
+    port=$(printf ':%04X' "$2")
+    [ "$proto" = "tcp" ] && state="0A" || state="07"
+    awk -v port="$port" -v state="$state" '$4 == state && substr($2, length($2) - 4) == port {{ found = 1 }} END {{ exit !found }}' \\
+        "/proc/net/$proto" "/proc/net/${{proto}}6" 2>/dev/null
+}}
+
 # 查看服务状态
 show_service_status() {{
     echo "╔══════════════════════════════════════════════════════════════════════════════╗"
@@ -3516,15 +4467,16 @@ show_service_status() {{
     echo "╚══════════════════════════════════════════════════════════════════════════════╝"
     
     # 检查Hysteria2进程
-    if pgrep -f "hysteria" > /dev/null; then
+    HYSTERIA_PIDS=$(find_pids hysteria)
+    if [ -n "$HYSTERIA_PIDS" ]; then
         echo "✅ Hysteria2服务: 运行中"
-        echo "   进程ID: $(pgrep -f hysteria)"
+        echo "   进程ID: $HYSTERIA_PIDS"
     else
         echo "❌ Hysteria2服务: 未运行"
     fi
     
     # 检查nginx进程
-    if pgrep -f "nginx" > /dev/null; then
+    if [ -n "$(find_pids nginx)" ]; then
         echo "✅ nginx服务: 运行中"
     else
         echo "❌ nginx服务: 未运行"
@@ -3533,20 +4485,20 @@ show_service_status() {{
     # 检查端口监听
     load_config
     if [ "$PORT" != "N/A" ]; then
-        if netstat -ulnp 2>/dev/null | grep ":$PORT " > /dev/null; then
+        if port_listening udp "$PORT"; then
             echo "✅ UDP端口 $PORT: 监听中"
         else
             echo "❌ UDP端口 $PORT: 未监听"
         fi
     fi
     
-    if netstat -tlnp 2>/dev/null | grep ":443 " > /dev/null; then
+    if port_listening tcp 443; then
         echo "✅ TCP端口 443: 监听中 (nginx)"
     else
         echo "❌ TCP端口 443: 未监听"
     fi
     
-    if netstat -tlnp 2>/dev/null | grep ":8080 " > /dev/null; then
+    if port_listening tcp 8080; then
         echo "✅ TCP端口 8080: 监听中 (配置下载)"
     else
         echo "❌ TCP端口 8080: 未监听"
@@ -3571,7 +4523,7 @@ restart_service() {{
         sleep 3
         
         # 检查服务状态
-        if pgrep -f "hysteria" > /dev/null; then
+        if [ -n "$(find_pids hysteria)" ]; then
             echo "✅ 服务重启成功"
         else
             echo "❌ 服务重启失败"
@@ -3590,14 +4542,38 @@ show_logs() {{
     if [ -f "$BASE_DIR/logs/hysteria.log" ]; then
         echo "📄 显示最新50行日志:"
         echo "----------------------------------------"
-        tail -n 50 "$BASE_DIR/logs/hysteria.log"
+        view_logs -n 50
         echo "----------------------------------------"
-        echo "💡 实时查看日志: tail -f $BASE_DIR/logs/hysteria.log"
+        echo "🔍 输入正则搜索日志 (含已轮转的压缩日志)，输入 f 实时跟踪，直接回车返回:"
+        read -r keyword
+        if [ "$keyword" = "f" ]; then
+            echo "💡 按 Ctrl+C 结束跟踪"
+            trap ':' INT
+            view_logs -n 0 --follow
+            trap - INT
+        elif [ -n "$keyword" ]; then
+            echo "----------------------------------------"
+            view_logs -n 50 --grep "$keyword"
+            echo "----------------------------------------"
+        fi
     else
         echo "❌ 日志文件不存在: $BASE_DIR/logs/hysteria.log"
     fi
 }}
 
+# 读取日志: 优先使用安装目录中的脚本 (从文件末尾读取、支持搜索压缩日志)，不可用时退回 tail/grep
+view_logs() {{
+    if [ -f "$BASE_DIR/hysteria2.py" ] && command -v python3 >/dev/null 2>&1; then
+        python3 "$BASE_DIR/hysteria2.py" logs "$@"
+        return
+    fi
+    case "$*" in
+        *--follow*) tail -n 0 -F "$BASE_DIR/logs/hysteria.log" ;;
+        *--grep*) grep -E -- "${{@: -1}}" "$BASE_DIR/logs/hysteria.log" | tail -n 50 ;;
+        *) tail -n 50 "$BASE_DIR/logs/hysteria.log" ;;
+    esac
+}}
+
 # 删除服务
 delete_service() {{
     echo "⚠️ 确认要删除Hysteria2服务吗？这将删除所有配置和文件！"
@@ -3646,6 +4622,7 @@ show_menu() {{
     echo "4️⃣  重启服务"
     echo "5️⃣  查看日志"
     echo "6️⃣  删除服务"
+    echo "7️⃣  资源监控 (kk top)"
     echo "0️⃣  退出"
     echo ""
     echo "📺 YouTube: https://www.youtube.com/@kejigongxiang"
@@ -3653,10 +4630,28 @@ show_menu() {{
     echo ""
 }}
 
+# 资源监控: 实时显示 hysteria/nginx 的CPU、内存、文件描述符和线程数，Ctrl+C 返回
+show_top() {{
+    if [ -f "$BASE_DIR/hysteria2.py" ] && command -v python3 >/dev/null 2>&1; then
+        trap ':' INT
+        python3 "$BASE_DIR/hysteria2.py" top "$@"
+        trap - INT
+    else
+        echo "❌ 未找到 $BASE_DIR/hysteria2.py，请重新运行安装脚本"
+    fi
+}}
+
+# 命令行模式: kk top [--interval 秒]
+if [ "$1" = "top" ]; then
+    shift
+    show_top "$@"
+    exit 0
+fi
+
 # 主程序
 while true; do
     show_menu
-    echo -n "请输入选项 (0-6): "
+    echo -n "请输入选项 (0-7): "
     read -r choice
     echo ""
     
@@ -3697,12 +4692,15 @@ while true; do
             echo "按任意键返回主菜单..."
             read -r
             ;;
+        7)
+            show_top
+            ;;
         0)
             echo "👋 感谢使用 Hysteria2 管理工具！"
             exit 0
             ;;
         *)
-            echo "❌ 无效选项，请输入 0-6"
+            echo "❌ 无效选项，请输入 0-7"
             echo ""
             echo "按任意键继续..."
             read -r
@@ -3735,6 +4733,7 @@ done
         print(f"⚠️ 保存全局配置失败: {e}")
         return False
 
+@profiled("生成多端口订阅")
 def generate_multi_port_subscription(server_address, password, obfs_password, port_start, port_end, base_dir, num_configs=100):
     """
     生成多端口v2rayN订阅文件
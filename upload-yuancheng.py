@@ -2,14 +2,24 @@
 # -*- coding: utf-8 -*-
 
 import os
+import re
 import sys
+import json
+import shutil
+import fcntl
+import hashlib
+import platform
 import subprocess
 import time
 import threading
 import signal
+import ssl
+import uuid
+import http.client
+import urllib.parse
 from pathlib import Path
-import requests
 from datetime import datetime
+from contextlib import contextmanager
 
 # 配置
 TMATE_URL = "https://github.com/zhumengkang/agsb/raw/main/tmate"
@@ -17,6 +27,218 @@ UPLOAD_API = "https://file.zmkk.fun/api/upload"
 USER_HOME = Path.home()
 SSH_INFO_FILE = "ssh.txt"  # 可以自定义文件名
 
+# HTTP连接池: 按 (协议, 主机, 端口) 保留 keep-alive 空闲连接，所有请求共用一个SSL上下文
+CONNECT_TIMEOUT = 10  # 建立连接超时(秒)
+READ_TIMEOUT = 30     # 单次读取超时(秒)
+HTTP_POOL_SIZE = 4    # 每个主机最多保留的空闲连接数
+HTTP_RETRIES = 2      # 连接失败时的重试次数
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+SSL_CONTEXT = ssl.create_default_context()  # 校验服务器证书 (与 urllib/requests 的默认行为一致)
+HTTP_POOL = {}
+HTTP_POOL_LOCK = threading.Lock()
+
+class PooledConnection:
+    """从连接池借出的连接，close() 时若响应已读完且服务器允许保持连接，则放回连接池"""
+    def __init__(self, key, conn, reused):
+        self.key = key
+        self.conn = conn
+        self.reused = reused
+        self.response = None
+    
+    def close(self):
+        if self.conn is None:
+            return
+        response = self.response
+        if response is not None and response.isclosed() and not response.will_close:
+            with HTTP_POOL_LOCK:
+                idle = HTTP_POOL.setdefault(self.key, [])
+                if len(idle) < HTTP_POOL_SIZE:
+                    idle.append(self.conn)
+                    self.conn = None
+                    return
+        self.conn.close()
+        self.conn = None
+
+def pool_connection(parts, timeout=None):
+    """借出一个连接：优先复用空闲连接，否则新建连接"""
+    key = (parts.scheme, parts.hostname, parts.port)
+    conn = None
+    with HTTP_POOL_LOCK:
+        if HTTP_POOL.get(key):
+            conn = HTTP_POOL[key].pop()
+    reused = conn is not None
+    if not reused:
+        if parts.scheme == "https":
+            conn = http.client.HTTPSConnection(parts.hostname, parts.port, timeout=CONNECT_TIMEOUT, context=SSL_CONTEXT)
+        else:
+            conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=CONNECT_TIMEOUT)
+        conn.connect()
+    conn.sock.settimeout(timeout or READ_TIMEOUT)
+    return PooledConnection(key, conn, reused)
+
+def http_open(method, url, headers=None, body=None, max_redirects=5, retries=HTTP_RETRIES, timeout=None):
+    """发送请求并跟随重定向，返回 (连接, 响应)；读完响应后调用 连接.close() 归还连接池
+    
+    复用的空闲连接已被服务器关闭时直接换新连接重发，其他连接错误最多重试 retries 次
+    """
+    request_headers = {'User-Agent': USER_AGENT}
+    request_headers.update(headers or {})
+    for redirects in range(max_redirects + 1):
+        parts = urllib.parse.urlsplit(url)
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        attempt = 0
+        while True:
+            conn = None
+            try:
+                conn = pool_connection(parts, timeout)
+                conn.conn.request(method, path, body=body, headers=request_headers)
+                response = conn.conn.getresponse()
+                break
+            except (OSError, http.client.HTTPException):
+                if conn:
+                    conn.close()
+                    if conn.reused:
+                        continue
+                attempt += 1
+                if attempt > retries:
+                    raise
+                time.sleep(min(2 ** attempt, 10))
+        conn.response = response
+        if method == "HEAD":
+            response.read()
+        if response.status in (301, 302, 303, 307, 308) and redirects < max_redirects:
+            location = response.getheader("Location")
+            response.read()
+            conn.close()
+            if not location:
+                raise Exception(f"HTTP {response.status} 缺少跳转地址")
+            url = urllib.parse.urljoin(url, location)
+            if response.status == 303:
+                method, body = "GET", None
+            continue
+        return conn, response
+
+def http_request(method, url, headers=None, body=None, max_redirects=5, retries=HTTP_RETRIES, timeout=None):
+    """发送请求并读取完整响应，返回 (状态码, 响应头, 响应体)"""
+    conn, response = http_open(method, url, headers, body, max_redirects, retries, timeout)
+    try:
+        return response.status, response.headers, response.read()
+    finally:
+        conn.close()
+
+def encode_multipart(field, filename, content):
+    """构建 multipart/form-data 请求体（单个文件字段），返回 (请求体, Content-Type)"""
+    boundary = uuid.uuid4().hex
+    head = f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n\r\n'
+    body = head.encode('utf-8') + content + f'\r\n--{boundary}--\r\n'.encode('utf-8')
+    return body, f"multipart/form-data; boundary={boundary}"
+
+# 共享二进制缓存，与 agsb / hysteria 脚本共用同一目录，重复运行时不再重复下载
+CACHE_DIR = Path(os.environ.get("AGSB_CACHE_DIR") or Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "agsb")
+CACHE_MAX_BYTES = int(os.environ.get("AGSB_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+def file_sha256(path):
+    """计算文件的SHA-256"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+@contextmanager
+def cache_index():
+    """加锁读写缓存索引（工具/版本/架构 -> SHA-256）"""
+    (CACHE_DIR / "objects").mkdir(parents=True, exist_ok=True)
+    with open(CACHE_DIR / ".lock", 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        index_file = CACHE_DIR / "index.json"
+        try:
+            with open(index_file, 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        yield index
+        tmp_file = f"{index_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_file, index_file)
+
+def link_or_copy(src, target_path):
+    """硬链接（跨文件系统时复制）到目标路径，原子替换"""
+    tmp_path = f"{target_path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        shutil.copy2(src, tmp_path)
+    os.chmod(tmp_path, 0o755)
+    os.replace(tmp_path, target_path)
+
+def cache_evict(index, keep_key):
+    """按最近使用时间淘汰缓存，直到总大小不超过上限"""
+    total = sum(entry["size"] for entry in {e["sha256"]: e for e in index.values()}.values())
+    for key in sorted(index, key=lambda k: index[k]["atime"]):
+        if total <= CACHE_MAX_BYTES:
+            break
+        if key == keep_key:
+            continue
+        digest = index.pop(key)["sha256"]
+        if not any(e["sha256"] == digest for e in index.values()):
+            obj_path = CACHE_DIR / "objects" / digest
+            if obj_path.exists():
+                total -= os.path.getsize(obj_path)
+                os.remove(obj_path)
+
+def cache_fetch(tool, version, arch, target_path):
+    """从缓存安装二进制文件，命中并校验通过返回True"""
+    if not version:
+        return False
+    key = f"{tool}/{version}/{arch}"
+    try:
+        with cache_index() as index:
+            entry = index.get(key)
+            if not entry:
+                return False
+            obj_path = CACHE_DIR / "objects" / entry["sha256"]
+            if not obj_path.exists() or file_sha256(obj_path) != entry["sha256"]:
+                index.pop(key)
+                if obj_path.exists():
+                    os.remove(obj_path)
+                return False
+            entry["atime"] = time.time()
+            link_or_copy(obj_path, target_path)
+        print(f"✓ {tool} 已从缓存安装: {target_path}")
+        return True
+    except Exception as e:
+        print(f"⚠ 读取缓存失败: {e}")
+        return False
+
+def cache_store(tool, version, arch, src_path):
+    """将新下载的二进制文件存入缓存"""
+    if not version:
+        return
+    key = f"{tool}/{version}/{arch}"
+    try:
+        digest = file_sha256(src_path)
+        with cache_index() as index:
+            obj_path = CACHE_DIR / "objects" / digest
+            if not obj_path.exists():
+                link_or_copy(src_path, obj_path)
+            index[key] = {"sha256": digest, "size": os.path.getsize(obj_path), "atime": time.time()}
+            cache_evict(index, key)
+    except Exception as e:
+        print(f"⚠ 写入缓存失败: {e}")
+
+def remote_version(url):
+    """用ETag/Last-Modified标识远程文件版本，获取失败返回None"""
+    try:
+        _, headers, _ = http_request("HEAD", url, timeout=10)
+        tag = headers.get("ETag") or headers.get("Last-Modified") or ""
+        return re.sub(r'[^A-Za-z0-9._-]', '', tag)[:40] or None
+    except Exception:
+        return None
+
 class TmateManager:
     def __init__(self):
         self.tmate_path = USER_HOME / "tmate"
@@ -25,15 +247,22 @@ class TmateManager:
         self.session_info = {}
         
     def download_tmate(self):
-        """下载tmate文件到用户目录"""
+        """下载tmate文件到用户目录（优先使用共享缓存）"""
+        version = remote_version(TMATE_URL)
+        if cache_fetch("tmate", version, platform.machine(), self.tmate_path):
+            return True
         print("正在下载tmate...")
+        conn = None
         try:
-            response = requests.get(TMATE_URL, stream=True)
-            response.raise_for_status()
+            conn, response = http_open("GET", TMATE_URL)
+            if response.status != 200:
+                raise Exception(f"HTTP {response.status} {response.reason}")
             
+            # 先删除旧文件，避免覆盖写入与缓存共享的硬链接
+            if self.tmate_path.exists():
+                self.tmate_path.unlink()
             with open(self.tmate_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+                shutil.copyfileobj(response, f, 64 * 1024)
             
             # 给tmate添加执行权限
             os.chmod(self.tmate_path, 0o755)
@@ -47,11 +276,15 @@ class TmateManager:
                 print("✗ 执行权限验证失败")
                 return False
             
+            cache_store("tmate", version, platform.machine(), self.tmate_path)
             return True
             
         except Exception as e:
             print(f"✗ 下载tmate失败: {e}")
             return False
+        finally:
+            if conn:
+                conn.close()
     
     def start_tmate(self):
         """启动tmate并获取会话信息"""
@@ -192,16 +425,16 @@ class TmateManager:
             
             # 上传文件
             with open(temp_file, 'rb') as f:
-                files = {'file': (file_name, f)}
-                response = requests.post(UPLOAD_API, files=files)
+                body, content_type = encode_multipart('file', file_name, f.read())
+            status, _, data = http_request("POST", UPLOAD_API, {'Content-Type': content_type}, body)
             
             # 删除临时文件
             if temp_file.exists():
                 temp_file.unlink()
             
-            if response.status_code == 200:
+            if status == 200:
                 try:
-                    result = response.json()
+                    result = json.loads(data)
                     if result.get('success') or result.get('url'):
                         url = result.get('url', '')
                         print(f"✓ 文件上传成功!")
@@ -220,7 +453,7 @@ class TmateManager:
                     print(f"✗ 解析API响应失败: {e}")
                     return False
             else:
-                print(f"✗ 上传失败，状态码: {response.status_code}")
+                print(f"✗ 上传失败，状态码: {status}")
                 return False
                 
         except Exception as e:
@@ -254,15 +487,6 @@ def main():
     try:
         print("=== Tmate SSH 会话管理器 ===")
         
-        # 检查并安装依赖
-        try:
-            import requests
-        except ImportError:
-            print("检测到未安装requests库，正在安装...")
-            subprocess.check_call([sys.executable, "-m", "pip", "install", "requests"])
-            import requests
-            print("✓ requests库安装成功")
-        
         # 1. 下载tmate
         if not manager.download_tmate():
             return False